@@ -1,7 +1,5 @@
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import JsonOutputParser
 from agents.state import AgentState
-from services.llm_service import get_llm
+from services.prompt_budget import get_budget, truncate_text
 
 def emotion_analyzer_agent(state:AgentState) -> AgentState:
     """
@@ -15,7 +13,46 @@ def emotion_analyzer_agent(state:AgentState) -> AgentState:
     - Desired emotional outcome
     """
     print("Analyzing your emotions...")
-    llm = get_llm()
+    chain = build_emotion_chain()
+    try:
+        return _emotion_update(chain.invoke(emotion_inputs(state)))
+    except Exception as e:
+        return _emotion_error(e)
+
+
+async def aemotion_analyzer_agent(state: AgentState) -> AgentState:
+    """Async emotion_analyzer_agent: awaits the LLM instead of holding a thread"""
+    print("Analyzing your emotions...")
+    chain = build_emotion_chain()
+    try:
+        return _emotion_update(await chain.ainvoke(emotion_inputs(state)))
+    except Exception as e:
+        return _emotion_error(e)
+
+
+def _emotion_update(emotion_analysis):
+    """State update for a finished analysis (shared by the sync and async agents)"""
+    print(f"   ✓ Identified: {emotion_analysis['primary_emotion']} (intensity: {emotion_analysis['intensity']}/10)")
+    
+    return {
+        "emotion_analysis": emotion_analysis
+    }
+
+
+def _emotion_error(e):
+    print(f"   ✗ Error: {e}")
+    return {
+        "errors": [f"Emotion analysis failed: {e}"]
+    }
+
+
+def build_emotion_chain():
+    """prompt | llm | parser for the emotion analysis (shared with batch mode)"""
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain_core.output_parsers import JsonOutputParser
+    from services.llm_service import get_llm
+    
+    llm = get_llm(agent="emotion_analyzer")
     prompt = ChatPromptTemplate.from_messages([
         ("system",
          """You are an empathetic emotional analyst. Your task is to deeply understand the user's emotional state based on their input.
@@ -42,22 +79,11 @@ def emotion_analyzer_agent(state:AgentState) -> AgentState:
         )
     ])
     parser = JsonOutputParser()
-    chain = prompt | llm | parser
-    try:
-        emotion_analysis = chain.invoke({
-            "user_input": state["user_input"]
-        })
-        
-        print(f"   ✓ Identified: {emotion_analysis['primary_emotion']} (intensity: {emotion_analysis['intensity']}/10)")
-        
-        return {
-            **state,
-            "emotion_analysis": emotion_analysis
-        }
-        
-    except Exception as e:
-        print(f"   ✗ Error: {e}")
-        return {
-            **state,
-            "errors": state.get("errors", []) + [f"Emotion analysis failed: {e}"]
-        }
\ No newline at end of file
+    return prompt | llm | parser
+
+
+def emotion_inputs(state):
+    """Prompt variables for one state, with the user input held to its budget"""
+    return {
+        "user_input": truncate_text(state["user_input"], get_budget("emotion_analyzer"))
+    }
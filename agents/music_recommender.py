@@ -1,9 +1,26 @@
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import JsonOutputParser
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from agents.state import AgentState
-from services.llm_service import get_llm
+from config.settings import (
+    HEARD_TRACKS_FILTER,
+    RECOMMENDER_STREAMING,
+    LYRICS_ENRICHMENT,
+    SPOTIFY_MAX_WORKERS,
+    SONG_INDEX_ENABLED,
+    SONG_INDEX_MAX_RETRIEVED,
+)
+from services.audio_features import describe_audio_profile
+from services import tracing
+from services.prompt_budget import get_budget, join_within_budget, truncate_text
 
-def music_recommender_agent(state: AgentState) -> AgentState:
+# Size of the candidate pool handed to the ranker
+UNIVERSE_SIZE = 25
+
+# Recent plays named in the prompt; with HEARD_TRACKS_FILTER the rest of the
+# user's history is filtered out locally instead
+PROMPT_RECENT_TRACKS = 5
+
+def music_recommender_agent(state: AgentState, config=None) -> AgentState:
     """
     Agent 3a: Discover therapeutic songs from the universe
     
@@ -15,20 +32,107 @@ def music_recommender_agent(state: AgentState) -> AgentState:
     - Similar lyrical themes/stories
     - Therapeutic value for their emotional state
     - Discovery potential (new to them)
+    
+    With RECOMMENDER_STREAMING, candidates are parsed from the token stream
+    and each one is resolved on Spotify as soon as it is complete, so the
+    lookups overlap with the rest of the generation.
+    
+    With SONG_INDEX_ENABLED, nearest neighbours from the local index of
+    previously resolved songs fill the pool first and the LLM only tops
+    it up to UNIVERSE_SIZE.
+    
+    With HEARD_TRACKS_FILTER, candidates the user already has in their
+    top or recent tracks are dropped here, before they cost a ranking
+    slot or a Spotify search.
     """
     
     print("🌍 Agent 3a: Discovering therapeutic music from the universe...")
     
-    llm = get_llm(temperature=0.9)  # High creativity for discovery
+    chain = build_recommender_chain()
     
-    emotion = state["emotion_analysis"]
-    taste = state["taste_profile"]
-    profile = state["spotify_profile"]
+    try:
+        heard = user_heard_tracks(state)
+        retrieved = retrieve_known_songs(state["emotion_analysis"]) if SONG_INDEX_ENABLED else []
+        inputs = recommender_inputs(state, retrieved)
+        
+        if inputs["num_songs"] == 0:
+            generated = []
+        elif RECOMMENDER_STREAMING:
+            generated = _stream_candidates(chain, inputs, config, heard)
+        else:
+            generated = chain.invoke(inputs)
+            if LYRICS_ENRICHMENT:
+                from services.lyrics_service import enrich_tracks_with_lyrics_context
+                enrich_tracks_with_lyrics_context(generated)
+        
+        return _discovery_update(retrieved, generated, heard)
+        
+    except Exception as e:
+        return _discovery_error(e)
+
+
+async def amusic_recommender_agent(state: AgentState, config=None) -> AgentState:
+    """
+    Async music_recommender_agent
+    
+    Streaming prefetches and lyrics lookups run as coroutines on the same
+    event loop; song index retrieval runs on a worker thread.
+    """
+    
+    print("🌍 Agent 3a: Discovering therapeutic music from the universe...")
+    
+    chain = build_recommender_chain()
+    
+    try:
+        heard = user_heard_tracks(state)
+        retrieved = (
+            await asyncio.to_thread(retrieve_known_songs, state["emotion_analysis"])
+            if SONG_INDEX_ENABLED else []
+        )
+        inputs = recommender_inputs(state, retrieved)
+        
+        if inputs["num_songs"] == 0:
+            generated = []
+        elif RECOMMENDER_STREAMING:
+            generated = await _astream_candidates(chain, inputs, config, heard)
+        else:
+            generated = await chain.ainvoke(inputs)
+            if LYRICS_ENRICHMENT:
+                from services.lyrics_service import aenrich_tracks_with_lyrics_context
+                await aenrich_tracks_with_lyrics_context(generated)
+        
+        return _discovery_update(retrieved, generated, heard)
+        
+    except Exception as e:
+        return _discovery_error(e)
+
+
+def _discovery_update(retrieved, generated, heard):
+    """Merge index hits and LLM candidates into the state update (sync and async agents)"""
+    universe_candidates = without_heard(retrieved + generated, heard)
+    
+    print(f"   ✓ Found {len(universe_candidates)} therapeutic candidates"
+          f" ({len(retrieved)} from song index)")
+    
+    return {
+        "universe_candidates": universe_candidates
+    }
+
+
+def _discovery_error(e):
+    print(f"   ✗ Error: {e}")
+    return {
+        "errors": [f"Music discovery failed: {e}"]
+    }
 
-    # print("THIS IS EMOTION",emotion)
-    # print("THIS IS TASTE",taste)
-    # print("THIS IS PROFILE",profile)
+
+def build_recommender_chain():
+    """prompt | llm | parser for universe discovery (shared with batch mode)"""
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain_core.output_parsers import JsonOutputParser
+    from services.llm_service import get_llm
     
+    llm = get_llm(temperature=0.9, agent="music_recommender")  # High creativity for discovery
     
     prompt = ChatPromptTemplate.from_messages([
         ("system", """You are a world-class music therapist with encyclopedic knowledge 
@@ -61,15 +165,18 @@ def music_recommender_agent(state: AgentState) -> AgentState:
         **Recent Listening (to avoid):**
         {recent_tracks}
         
+        **Already Selected (do not repeat):**
+        {already_selected}
+        
         **Mission:**
-        Recommend 25 songs from the music universe that:
+        Recommend {num_songs} songs from the music universe that:
         1. Have lyrical themes/stories similar to their emotional experience
         2. Will therapeutically guide them from {primary_emotion} → {desired_outcome}
         3. Match their taste DNA enough to resonate (but push boundaries!)
         4. Are likely NEW discoveries for them
         5. Span different progression stages (1-10) of their emotional journey
         
-        Return JSON array with 25 songs:
+        Return JSON array with {num_songs} songs:
         [
             {{
                 "track_name": "song title",
@@ -91,38 +198,200 @@ def music_recommender_agent(state: AgentState) -> AgentState:
     ])
     
     parser = JsonOutputParser()
-    chain = prompt | llm | parser
+    return prompt | llm | parser
+
+
+def recommender_inputs(state, retrieved=()):
+    """
+    Prompt variables for one state
+    
+    `retrieved` are candidates already taken from the song index; the LLM
+    is asked for the rest of UNIVERSE_SIZE and told not to repeat them.
+    """
+    emotion = state["emotion_analysis"]
+    taste = state["taste_profile"]
+    profile = state["spotify_profile"]
+    
+    # Format recent tracks to avoid; with the heard-tracks filter only a few
+    # are needed to steer the LLM, the rest are dropped after generation
+    budget = get_budget("music_recommender")
+    recent_limit = PROMPT_RECENT_TRACKS if HEARD_TRACKS_FILTER else 20
+    recent_tracks_str = join_within_budget([
+        f"{t['name']} by {t['artist']}" 
+        for t in profile["recent_tracks"][:recent_limit]
+    ], budget // 4)
+    
+    return {
+        "primary_emotion": emotion["primary_emotion"],
+        "intensity": emotion["intensity"],
+        "story_context": truncate_text(emotion["story_context"], budget // 2),
+        "desired_outcome": emotion["desired_outcome"],
+        # "therapeutic_approach": emotion["therapeutic_approach"],
+        "lyrical_themes": ", ".join(taste["lyrical_themes"]),
+        "sonic_preferences": _sonic_preferences(taste),
+        "genre_clusters": ", ".join(taste["genre_clusters"]),
+        "discovery_openness": taste["discovery_openness"],
+        "recent_tracks": recent_tracks_str,
+        "already_selected": join_within_budget([
+            f"{c['track_name']} by {c['artist']}" for c in retrieved
+        ], budget // 4) or "None",
+        "num_songs": max(0, UNIVERSE_SIZE - len(retrieved))
+    }
+
+
+def _sonic_preferences(taste):
+    """The LLM's sonic preferences plus, when known, the measured audio profile"""
+    sonic = str(taste["sonic_preferences"])
+    if taste.get("audio_features"):
+        sonic += f"; measured on their top tracks: {describe_audio_profile(taste['audio_features'])}"
+    return sonic
+
+
+def user_heard_tracks(state):
+    """
+    The user's heard-tracks index, or None when filtering is off
+    
+    Pass it to without_heard to drop songs from their listening history.
+    """
+    if not HEARD_TRACKS_FILTER:
+        return None
+    from services.heard_tracks import heard_tracks_for
+    
+    return heard_tracks_for(state["user_id"], state["spotify_profile"])
+
+
+def without_heard(candidates, heard):
+    """Drop candidates in `heard` (see user_heard_tracks); None keeps them all"""
+    if heard is None:
+        return candidates
+    
+    kept = heard.filter(candidates)
+    if len(kept) < len(candidates):
+        print(f"   ✓ Skipping {len(candidates) - len(kept)} songs already in your listening history")
+    return kept
+
+
+def retrieve_known_songs(emotion):
+    """
+    Songs from the local index that fit `emotion`, to seed the candidate pool
+    
+    Returns at most SONG_INDEX_MAX_RETRIEVED candidates; an unavailable
+    index is reported and yields none, so it never fails the caller.
+    """
+    from services.song_index import retrieve_candidates
     
     try:
-        # Format recent tracks to avoid
-        recent_tracks_str = ", ".join([
-            f"{t['name']} by {t['artist']}" 
-            for t in profile["recent_tracks"][:20]
-        ])
-        
-        universe_candidates = chain.invoke({
-            "primary_emotion": emotion["primary_emotion"],
-            "intensity": emotion["intensity"],
-            "story_context": emotion["story_context"],
-            "desired_outcome": emotion["desired_outcome"],
-            # "therapeutic_approach": emotion["therapeutic_approach"],
-            "lyrical_themes": ", ".join(taste["lyrical_themes"]),
-            "sonic_preferences": str(taste["sonic_preferences"]),
-            "genre_clusters": ", ".join(taste["genre_clusters"]),
-            "discovery_openness": taste["discovery_openness"],
-            "recent_tracks": recent_tracks_str
-        })
-        
-        print(f"   ✓ Found {len(universe_candidates)} therapeutic candidates")
-        
-        return {
-            **state,
-            "universe_candidates": universe_candidates
-        }
-        
+        return retrieve_candidates(emotion, SONG_INDEX_MAX_RETRIEVED)
+    except Exception as e:
+        print(f"   ✗ Song index unavailable: {e}")
+        return []
+
+
+def _stream_candidates(chain, inputs, config=None, heard=None):
+    """
+    Stream the candidate array and prefetch each song as it completes
+    
+    Songs in `heard` (the user's heard-tracks index) are dropped as they
+    arrive, without a prefetch. Returns the candidate list once generation
+    and all prefetches have finished.
+    """
+    from auth.spotify_auth import get_session_spotify_client
+    
+    spotify_client = get_session_spotify_client(config)
+    candidates = []
+    
+    with ThreadPoolExecutor(max_workers=SPOTIFY_MAX_WORKERS) as pool:
+        for candidate in iter_completed_items(chain.stream(inputs)):
+            if heard is not None and candidate in heard:
+                continue
+            candidates.append(candidate)
+            tracing.submit(pool, _prefetch_candidate, candidate, spotify_client)
+    
+    return candidates
+
+
+def _prefetch_candidate(candidate, spotify_client):
+    """Warm the track cache (and lyrics context) for one streamed candidate"""
+    from services.spotify_resolver import resolve_track
+    
+    try:
+        resolve_track(candidate, spotify_client)
+        if LYRICS_ENRICHMENT:
+            from services.lyrics_service import enrich_track_with_lyrics_context
+            enrich_track_with_lyrics_context(candidate)
+    except Exception as e:
+        print(f"   ✗ Prefetch failed for {candidate.get('track_name')}: {e}")
+
+
+async def _astream_candidates(chain, inputs, config=None, heard=None):
+    """Async _stream_candidates: each prefetch is a task on the running loop"""
+    from auth.spotify_auth import get_session_spotify_client
+    from services.spotify_async import as_async_spotify
+    
+    spotify_client = as_async_spotify(get_session_spotify_client(config))
+    candidates = []
+    prefetches = []
+    
+    async for candidate in aiter_completed_items(chain.astream(inputs)):
+        if heard is not None and candidate in heard:
+            continue
+        candidates.append(candidate)
+        prefetches.append(asyncio.create_task(_aprefetch_candidate(candidate, spotify_client)))
+    
+    await asyncio.gather(*prefetches)
+    return candidates
+
+
+async def _aprefetch_candidate(candidate, spotify_client):
+    """Async _prefetch_candidate"""
+    from services.spotify_resolver import aresolve_track
+    
+    try:
+        await aresolve_track(candidate, spotify_client)
+        if LYRICS_ENRICHMENT:
+            from services.lyrics_service import aenrich_track_with_lyrics_context
+            await aenrich_track_with_lyrics_context(candidate)
     except Exception as e:
-        print(f"   ✗ Error: {e}")
-        return {
-            **state,
-            "errors": state.get("errors", []) + [f"Music discovery failed: {e}"]
-        }
\ No newline at end of file
+        print(f"   ✗ Prefetch failed for {candidate.get('track_name')}: {e}")
+
+
+def iter_completed_items(partials):
+    """
+    Yield array elements from a stream of partially parsed JSON arrays
+    
+    JsonOutputParser streams the whole array parsed so far, with the last
+    element possibly still incomplete. An element is final once the next
+    one has started, or when the stream ends.
+    """
+    emitted = 0
+    latest = []
+    
+    for partial in partials:
+        if not isinstance(partial, list):
+            continue
+        latest = partial
+        while emitted < len(partial) - 1:
+            yield partial[emitted]
+            emitted += 1
+    
+    while emitted < len(latest):
+        yield latest[emitted]
+        emitted += 1
+
+
+async def aiter_completed_items(partials):
+    """Async iter_completed_items, for chain.astream"""
+    emitted = 0
+    latest = []
+    
+    async for partial in partials:
+        if not isinstance(partial, list):
+            continue
+        latest = partial
+        while emitted < len(partial) - 1:
+            yield partial[emitted]
+            emitted += 1
+    
+    while emitted < len(latest):
+        yield latest[emitted]
+        emitted += 1
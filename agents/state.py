@@ -3,7 +3,11 @@ from typing import Annotated, Any
 import operator
 
 class AgentState(TypedDict):
-    """State passed between agents in SoulSync workflow"""
+    """
+    State passed between agents in SoulSync workflow
+
+    Nodes return only the keys they own so parallel branches merge cleanly
+    """
     
     # User inputs
     user_input: str  # Raw emotional story
@@ -24,6 +28,9 @@ class AgentState(TypedDict):
     # Agent 3b outputs
     ranked_recommendations: list  # Top 10 with distance scores & reasoning
     
+    # Speculative resolution (runs alongside 3b)
+    speculative_tracks: dict  # Track cache key -> Spotify fields, or None if not on Spotify
+    
     # Final outputs
     spotify_tracks: list  # Resolved Spotify track objects
     playlist_url: str  # Created playlist URL
@@ -1,7 +1,17 @@
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import JsonOutputParser
+import hashlib
+import json
+import time
 from agents.state import AgentState
-from services.llm_service import get_llm
+from config.settings import TASTE_PROFILE_STALENESS_HOURS, TASTE_PROFILE_TTL_DAYS
+from services.cache import PersistentCache
+from services.audio_features import format_audio_profile
+from services.prompt_budget import get_budget, join_within_budget
+
+# user_id -> {"fingerprint", "taste_profile", "created_at"}
+taste_profile_cache = PersistentCache(
+    "taste_profiles",
+    ttl_seconds=TASTE_PROFILE_TTL_DAYS * 24 * 3600
+)
 
 def taste_profiler_agent(state: AgentState) -> AgentState:
     """
@@ -13,53 +23,90 @@ def taste_profiler_agent(state: AgentState) -> AgentState:
     - Genre clusters
     - Emotional range in music
     - Personality traits reflected in music taste
+    
+    The result is memoized per user under a fingerprint of the prompt
+    inputs, so returning users skip the LLM call.
     """
     
     print("🎸 Agent 2: Profiling your music taste DNA...")
     
-    llm = get_llm(temperature=0.5)
+    chain = build_taste_chain()
     
-    profile = state["spotify_profile"]
-
-    # prompt = ChatPromptTemplate.from_messages([
-    #     ("system", """You are a music psychologist who understands how music taste 
-    #     reflects personality, values, and emotional needs.
-        
-    #     Analyze the user's Spotify listening history to create a comprehensive 
-    #     "Taste DNA" profile that will guide therapeutic music recommendations.
-        
-    #     Be insightful and nuanced - go beyond surface-level genre labels."""),
+    try:
+        prompt_inputs, fingerprint, cached_update = _cached_taste_update(state)
+        if cached_update is not None:
+            return cached_update
         
-    #     ("user", """
-    #     User's Spotify Profile:
+        return _taste_update(state, fingerprint, chain.invoke(prompt_inputs))
         
-    #     **Top Artists:** {top_artists}
-    #     **Top Genres:** {top_genres}
-    #     **Recent Tracks:** {recent_tracks}
+    except Exception as e:
+        return _taste_error(e)
+
+
+async def ataste_profiler_agent(state: AgentState) -> AgentState:
+    """Async taste_profiler_agent: awaits the LLM instead of holding a thread"""
+    
+    print("🎸 Agent 2: Profiling your music taste DNA...")
+    
+    chain = build_taste_chain()
+    
+    try:
+        prompt_inputs, fingerprint, cached_update = _cached_taste_update(state)
+        if cached_update is not None:
+            return cached_update
         
-    #     **Audio Feature Preferences:**
-    #     - Average Tempo: {tempo} BPM
-    #     - Average Energy: {energy} (0-1 scale)
-    #     - Average Valence (positivity): {valence} (0-1 scale)
-    #     - Average Danceability: {danceability} (0-1 scale)
-    #     - Average Acousticness: {acousticness} (0-1 scale)
+        return _taste_update(state, fingerprint, await chain.ainvoke(prompt_inputs))
         
-    #     Create a "Taste DNA" profile. Return JSON:
-    #     {{
-    #         "lyrical_themes": ["theme1", "theme2", "theme3"],
-    #         "sonic_preferences": {{
-    #             "tempo_range": "slow/moderate/fast/varied",
-    #             "energy_preference": "low/medium/high/dynamic",
-    #             "emotional_range": "melancholic/balanced/upbeat"
-    #         }},
-    #         "genre_clusters": ["cluster1", "cluster2"],
-    #         "personality_traits": ["trait1", "trait2"],
-    #         "discovery_openness": 0.7,
-    #         "comfort_zone_description": "brief description of their musical comfort zone"
-    #     }}
-    #     """)
-    # ])
+    except Exception as e:
+        return _taste_error(e)
+
+
+def _cached_taste_update(state):
+    """
+    Prompt inputs and their fingerprint, plus the state update for a
+    memoized profile (None when the LLM has to run)
+    """
+    prompt_inputs = taste_prompt_inputs(state["spotify_profile"])
+    fingerprint = profile_fingerprint(prompt_inputs)
+    
+    cached_profile = get_cached_taste_profile(state["user_id"], fingerprint)
+    if cached_profile is None:
+        return prompt_inputs, fingerprint, None
+    
+    print(f"   ✓ Taste DNA reused: {', '.join(cached_profile['genre_clusters'])}")
+    return prompt_inputs, fingerprint, {
+        "taste_profile": cached_profile
+    }
+
+
+def _taste_update(state, fingerprint, llm_profile):
+    """Add audio features to a fresh LLM profile, memoize it and build the state update"""
+    taste_profile = with_audio_features(llm_profile, state["spotify_profile"])
+    
+    print(f"   ✓ Taste DNA created: {', '.join(taste_profile['genre_clusters'])}")
+    
+    remember_taste_profile(state["user_id"], fingerprint, taste_profile)
+    
+    return {
+        "taste_profile": taste_profile
+    }
+
+
+def _taste_error(e):
+    print(f"   ✗ Error: {e}")
+    return {
+        "errors": [f"Taste profiling failed: {e}"]
+    }
 
+
+def build_taste_chain():
+    """prompt | llm | parser for the Taste DNA (shared with batch mode)"""
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain_core.output_parsers import JsonOutputParser
+    from services.llm_service import get_llm
+    
+    llm = get_llm(temperature=0.5, agent="taste_profiler")
+    
     prompt = ChatPromptTemplate.from_messages([
         ("system", """You are a music psychologist who understands how music taste 
         reflects personality, values, and emotional needs.
@@ -76,6 +123,9 @@ def taste_profiler_agent(state: AgentState) -> AgentState:
         **Top Genres:** {top_genres}
         **Recent Tracks:** {recent_tracks}
         
+        **Audio Feature Preferences (top tracks):**
+        {audio_features}
+        
         Create a "Taste DNA" profile. Return JSON:
         {{
             "lyrical_themes": ["theme1", "theme2", "theme3"],
@@ -92,40 +142,69 @@ def taste_profiler_agent(state: AgentState) -> AgentState:
         """)
     ])
     parser = JsonOutputParser()
-    chain = prompt | llm | parser
+    return prompt | llm | parser
+
+
+def taste_prompt_inputs(profile):
+    """Prompt variables for a Spotify profile; each list gets a third of the budget"""
+    list_budget = get_budget("taste_profiler") // 3
+    top_artists_str = join_within_budget(
+        [a["name"] for a in profile["top_artists"][:10]], list_budget
+    )
+    top_genres_str = join_within_budget(profile["top_genres"][:10], list_budget)
+    recent_tracks_str = join_within_budget([
+        f"{t['name']} by {t['artist']}" 
+        for t in profile["recent_tracks"][:10]
+    ], list_budget)
     
-    try:
-        # Format data for prompt
-        top_artists_str = ", ".join([a["name"] for a in profile["top_artists"][:10]])
-        top_genres_str = ", ".join(profile["top_genres"][:10])
-        recent_tracks_str = ", ".join([
-            f"{t['name']} by {t['artist']}" 
-            for t in profile["recent_tracks"][:10]
-        ])
-        
-        # audio = profile["audio_features"]
-        
-        taste_profile = chain.invoke({
-            "top_artists": top_artists_str,
-            "top_genres": top_genres_str,
-            "recent_tracks": recent_tracks_str,
-            # "tempo": f"{audio.get('tempo', 120):.0f}",
-            # "energy": f"{audio.get('energy', 0.5):.2f}",
-            # "valence": f"{audio.get('valence', 0.5):.2f}",
-            # "danceability": f"{audio.get('danceability', 0.5):.2f}",
-            # "acousticness": f"{audio.get('acousticness', 0.5):.2f}"
-        })
-        
-        print(f"   ✓ Taste DNA created: {', '.join(taste_profile['genre_clusters'])}")
-        
-        return {
-            **state,
-            "taste_profile": taste_profile
-        }
-        
-    except Exception as e:
-        print(f"   ✗ Error: {e}")
-        return {
-            **state,
-            "errors": state.get("errors", []) + [f"Taste profiling failed: {e}"]
-        }
+    return {
+        "top_artists": top_artists_str,
+        "top_genres": top_genres_str,
+        "recent_tracks": recent_tracks_str,
+        "audio_features": format_audio_profile(profile.get("audio_features")),
+    }
+
+
+def with_audio_features(taste_profile, profile):
+    """
+    Taste DNA carrying the measured sonic summary of the user's top tracks
+    
+    Downstream prompts and the local ranker read it from here, next to the
+    LLM's own sonic_preferences.
+    """
+    if not profile.get("audio_features"):
+        return taste_profile
+    return {**taste_profile, "audio_features": profile["audio_features"]}
+
+
+def profile_fingerprint(prompt_inputs):
+    """Stable hash of exactly the profile data the prompt is built from"""
+    payload = json.dumps(prompt_inputs, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def get_cached_taste_profile(user_id, fingerprint):
+    """
+    Return the memoized Taste DNA for this user, if still usable
+    
+    A cached profile is reused when its fingerprint matches, or when it is
+    younger than TASTE_PROFILE_STALENESS_HOURS even though the listening
+    data has drifted (recent tracks change on every play).
+    """
+    entry = taste_profile_cache.get(user_id)
+    if entry is None:
+        return None
+    
+    age_hours = (time.time() - entry["created_at"]) / 3600
+    if entry["fingerprint"] == fingerprint or age_hours < TASTE_PROFILE_STALENESS_HOURS:
+        return entry["taste_profile"]
+    return None
+
+
+def remember_taste_profile(user_id, fingerprint, taste_profile):
+    """Memoize a freshly generated Taste DNA under its input fingerprint"""
+    taste_profile_cache.set(user_id, {
+        "fingerprint": fingerprint,
+        "taste_profile": taste_profile,
+        "created_at": time.time()
+    })
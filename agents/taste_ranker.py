@@ -1,10 +1,19 @@
 # ============================================================================
 # FILE: agents/taste_ranker.py
 # ============================================================================
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import JsonOutputParser
+import asyncio
 from agents.state import AgentState
-from services.llm_service import get_llm
+from config.settings import RANKER_MODE
+from services.audio_features import describe_audio_profile
+from services import tracing
+from services.prompt_budget import get_budget, fit_records, project
+
+# Candidate fields the ranking prompt needs; album, year, sonic_match and the
+# search query are restored from the candidate after ranking
+_RANKING_FIELDS = (
+    "id", "track_name", "artist", "lyrical_theme",
+    "therapeutic_reason", "discovery_score", "progression_stage"
+)
 
 def taste_ranker_agent(state: AgentState) -> AgentState:
     """
@@ -17,15 +26,87 @@ def taste_ranker_agent(state: AgentState) -> AgentState:
     4. Discovery balance (familiar vs. novel)
     
     Output: Top 10 ranked recommendations with reasoning
+    
+    With RANKER_MODE=local the distances are computed on CPU from
+    sentence embeddings instead of an LLM pass.
+    
+    Candidates the track cache already knows are not on Spotify are left
+    out, so they can't take a slot in the playlist.
+    """
+    
+    print("🎯 Agent 3b: Ranking recommendations by taste-distance...")
+    
+    emotion, taste, candidates = _ranking_inputs(state)
+    
+    if RANKER_MODE.lower() == "local":
+        return _rank_locally(emotion, taste, candidates)
+    
+    chain = build_ranker_chain()
+    
+    try:
+        ranked = chain.invoke(ranker_inputs(emotion, taste, candidates))
+        return _ranking_update(ranked, candidates)
+    except Exception as e:
+        return _ranking_error(e)
+
+
+async def ataste_ranker_agent(state: AgentState) -> AgentState:
+    """
+    Async taste_ranker_agent
+    
+    The LLM ranking is awaited; the local ranker is CPU work and runs on a
+    worker thread so the event loop stays free.
     """
     
     print("🎯 Agent 3b: Ranking recommendations by taste-distance...")
     
-    llm = get_llm(temperature=0.4)  # Moderate temp for balanced ranking
+    emotion, taste, candidates = _ranking_inputs(state)
+    
+    if RANKER_MODE.lower() == "local":
+        return await asyncio.to_thread(_rank_locally, emotion, taste, candidates)
+    
+    chain = build_ranker_chain()
+    
+    try:
+        ranked = await chain.ainvoke(ranker_inputs(emotion, taste, candidates))
+        return _ranking_update(ranked, candidates)
+    except Exception as e:
+        return _ranking_error(e)
+
+
+def _ranking_inputs(state):
+    """Emotion, taste and the rankable candidates (shared by the sync and async agents)"""
+    return (
+        state["emotion_analysis"],
+        state["taste_profile"],
+        _without_known_misses(state["universe_candidates"])
+    )
+
+
+def _ranking_update(ranked, candidates):
+    ranked_recommendations = restore_candidate_fields(ranked, candidates)
+    
+    print(f"   ✓ Selected top {len(ranked_recommendations)} recommendations")
+    
+    return {
+        "ranked_recommendations": ranked_recommendations
+    }
+
+
+def _ranking_error(e):
+    print(f"   ✗ Error: {e}")
+    return {
+        "errors": [f"Ranking failed: {e}"]
+    }
+
+
+def build_ranker_chain():
+    """prompt | llm | parser for the LLM ranking pass (shared with batch mode)"""
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain_core.output_parsers import JsonOutputParser
+    from services.llm_service import get_llm
     
-    emotion = state["emotion_analysis"]
-    taste = state["taste_profile"]
-    candidates = state["universe_candidates"]
+    llm = get_llm(temperature=0.4, agent="taste_ranker")  # Moderate temp for balanced ranking
     
     prompt = ChatPromptTemplate.from_messages([
         ("system", """You are a precision recommendation algorithm with deep understanding 
@@ -60,17 +141,15 @@ def taste_ranker_agent(state: AgentState) -> AgentState:
         Return JSON array of TOP 10:
         [
             {{
+                "id": 0,
                 "track_name": "...",
                 "artist": "...",
-                "album": "...",
-                "year": "...",
                 "therapeutic_reason": "comprehensive explanation of therapeutic value",
                 "taste_distance_score": 0.23,
                 "lyrical_match_score": 0.92,
                 "sonic_match_score": 0.85,
                 "discovery_score": 0.7,
                 "progression_stage": 5,
-                "spotify_search_query": "...",
                 "ranking_rationale": "why this made top 10"
             }},
             ...
@@ -81,31 +160,85 @@ def taste_ranker_agent(state: AgentState) -> AgentState:
     ])
     
     parser = JsonOutputParser()
-    chain = prompt | llm | parser
+    return prompt | llm | parser
+
+
+def ranker_inputs(emotion, taste, candidates):
+    """Prompt variables: short summaries plus the candidates that fit the budget"""
+    emotion_summary = f"{emotion['primary_emotion']} (intensity {emotion['intensity']}/10) → {emotion['desired_outcome']}"
+    taste_summary = f"Genres: {', '.join(taste['genre_clusters'][:3])}, Themes: {', '.join(taste['lyrical_themes'][:3])}"
+    if taste.get("audio_features"):
+        taste_summary += f", Sound: {describe_audio_profile(taste['audio_features'])}"
+    
+    candidates_json, num_sent = fit_records(
+        project([{**c, "id": i} for i, c in enumerate(candidates)], _RANKING_FIELDS),
+        get_budget("taste_ranker"),
+        text_fields=("lyrical_theme", "therapeutic_reason")
+    )
+    dropped = len(candidates) - num_sent
+    if dropped:
+        print(f"   ⚠️  {dropped} of {len(candidates)} candidates didn't fit the ranking prompt budget")
+        tracing.record("ranker_candidates_dropped", dropped)
+    
+    return {
+        "emotion_summary": emotion_summary,
+        "taste_summary": taste_summary,
+        "num_candidates": num_sent,
+        "candidates_json": candidates_json
+    }
+
+
+def _without_known_misses(candidates):
+    """Drop candidates that are cached as unresolvable on Spotify"""
+    from services.spotify_resolver import is_known_miss
+    
+    kept = [c for c in candidates if not is_known_miss(c)]
+    if len(kept) < len(candidates):
+        print(f"   ✓ Skipping {len(candidates) - len(kept)} songs known to be missing from Spotify")
+    return kept
+
+
+def restore_candidate_fields(ranked, candidates):
+    """
+    Merge the fields left out of the ranking prompt back in from the candidates
+    
+    Each ranked item is matched to its candidate by the `id` index the
+    prompt assigned (ranker_inputs); the id itself is removed.
+    """
+    restored = []
+    for rec in ranked:
+        index = rec.pop("id", None)
+        if isinstance(index, str) and index.strip().isdigit():
+            # Some models echo the id back as a string
+            index = int(index)
+        if isinstance(index, int) and 0 <= index < len(candidates):
+            candidate = candidates[index]
+            rec = {
+                **rec,
+                "album": candidate.get("album", ""),
+                "year": candidate.get("year", ""),
+                "sonic_match": candidate.get("sonic_match", ""),
+                "spotify_search_query": candidate.get(
+                    "spotify_search_query",
+                    f"track:{rec.get('track_name', '')} artist:{rec.get('artist', '')}"
+                )
+            }
+        restored.append(rec)
+    return restored
+
+
+def _rank_locally(emotion, taste, candidates):
+    """Local ranking engine: batched embeddings + NumPy scoring"""
+    from services.taste_ranking import rank_candidates_locally
     
     try:
-        import json
+        ranked_recommendations = rank_candidates_locally(emotion, taste, candidates, top_k=10)
         
-        emotion_summary = f"{emotion['primary_emotion']} (intensity {emotion['intensity']}/10) → {emotion['desired_outcome']}"
-        taste_summary = f"Genres: {', '.join(taste['genre_clusters'][:3])}, Themes: {', '.join(taste['lyrical_themes'][:3])}"
-        
-        ranked_recommendations = chain.invoke({
-            "emotion_summary": emotion_summary,
-            "taste_summary": taste_summary,
-            "num_candidates": len(candidates),
-            "candidates_json": json.dumps(candidates, indent=2)
-        })
-        
-        print(f"   ✓ Selected top {len(ranked_recommendations)} recommendations")
+        print(f"   ✓ Selected top {len(ranked_recommendations)} recommendations (local ranker)")
         
         return {
-            **state,
             "ranked_recommendations": ranked_recommendations
         }
         
     except Exception as e:
-        print(f"   ✗ Error: {e}")
-        return {
-            **state,
-            "errors": state.get("errors", []) + [f"Ranking failed: {e}"]
-        }
\ No newline at end of file
+        return _ranking_error(e)
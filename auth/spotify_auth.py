@@ -1,21 +1,168 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
 import spotipy
 from spotipy.oauth2 import SpotifyOAuth
-from config.settings import SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET, SPOTIFY_REDIRECT_URI
+from auth.token_store import SpotifyTokenStore
+from config.settings import (
+    SPOTIFY_CLIENT_ID,
+    SPOTIFY_CLIENT_SECRET,
+    SPOTIFY_REDIRECT_URI,
+    SPOTIFY_CLIENT_CACHE_SIZE,
+)
+
+SCOPE = "user-top-read user-read-recently-played playlist-modify-public playlist-modify-private"
+
+# Statuses the HTTP session retries itself: spotipy's defaults minus 429, which
+# must reach the shared token bucket (services.rate_limiter)
+RETRY_STATUSES = (500, 502, 503, 504)
+
+# Optional replacement for the OAuth client, e.g. an offline fake for benchmarks
+_client_factory = None
+
+token_store = SpotifyTokenStore()
+
+# user key -> authenticated spotipy.Spotify, so OAuth is set up once per user;
+# LRU-bounded by SPOTIFY_CLIENT_CACHE_SIZE (tokens stay in the token store)
+_clients = OrderedDict()
+_clients_lock = threading.Lock()
+
+
+class _SerializedOAuth(SpotifyOAuth):
+    """SpotifyOAuth whose token validation/refresh runs under a per-user lock"""
+    
+    def __init__(self, *args, user_key, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._user_lock = token_store.lock_for(user_key)
+    
+    def get_access_token(self, *args, **kwargs):
+        with self._user_lock:
+            return super().get_access_token(*args, **kwargs)
 
-def get_spotify_client():
+
+def set_spotify_client_factory(factory):
+    """Return `factory()` from get_spotify_client; pass None to restore OAuth"""
+    global _client_factory
+    _client_factory = factory
+
+
+def get_spotify_client(user_key="default", open_browser=True):
     """
     Initialize Spotify client with OAuth
     User will be prompted to authorize in browser
+    
+    Clients are cached per `user_key` and their tokens live in the shared
+    token store, so repeated calls never repeat the OAuth setup. Only the
+    SPOTIFY_CLIENT_CACHE_SIZE most recently used clients are kept; an
+    evicted user's next call rebuilds the client from the stored token.
+    """
+    if _client_factory is not None:
+        return _client_factory()
+    
+    with _clients_lock:
+        client = _clients.get(user_key)
+        if client is None:
+            client = _spotify(auth_manager=_oauth_manager(user_key, open_browser))
+            _clients[user_key] = client
+            while len(_clients) > SPOTIFY_CLIENT_CACHE_SIZE:
+                _clients.popitem(last=False)
+        else:
+            _clients.move_to_end(user_key)
+    return client
+
+
+def get_client_for_token(access_token, refresh_token=None, expires_in=3600):
+    """
+    Spotify client for a token obtained elsewhere (e.g. an API request)
+    
+    With a refresh token the token is kept in the store and refreshed
+    automatically; a bare access token gets a plain, uncached client.
     """
-    scope = "user-top-read user-read-recently-played playlist-modify-public playlist-modify-private"
+    if not refresh_token:
+        return _spotify(auth=access_token)
     
-    auth_manager = SpotifyOAuth(
+    user_key = "token:" + hashlib.sha256(refresh_token.encode("utf-8")).hexdigest()[:32]
+    stored = token_store.get(user_key)
+    if stored is None or stored.get("access_token") != access_token:
+        token_store.save(user_key, {
+            "access_token": access_token,
+            "refresh_token": refresh_token,
+            "token_type": "Bearer",
+            "expires_in": expires_in,
+            "expires_at": int(time.time()) + int(expires_in),
+            "scope": SCOPE,
+        })
+    return get_spotify_client(user_key, open_browser=False)
+
+
+def token_owner_key(spotify_client):
+    """
+    Stable key for the account behind a client's stored token, or None
+    
+    A refresh token belongs to exactly one Spotify account, so its hash can
+    stand in for the user id without a /me request. Clients without a
+    stored token (bare access tokens, fakes) return None.
+    """
+    cache_handler = getattr(getattr(spotify_client, "auth_manager", None), "cache_handler", None)
+    if cache_handler is None:
+        return None
+    refresh_token = (cache_handler.get_cached_token() or {}).get("refresh_token")
+    if not refresh_token:
+        return None
+    return hashlib.sha256(refresh_token.encode("utf-8")).hexdigest()[:32]
+
+
+def get_session_spotify_client(config=None):
+    """
+    Spotify client for the current workflow run
+    
+    Uses the client passed in config["configurable"]["spotify_client"]
+    (one per user session), falling back to the CLI's OAuth client.
+    """
+    client = ((config or {}).get("configurable") or {}).get("spotify_client")
+    if client is not None:
+        return client
+    return get_spotify_client()
+
+
+def _spotify(**kwargs):
+    """
+    spotipy client whose HTTP session never retries a 429
+    
+    spotipy's default session sleeps on 429s inside the calling thread
+    while every other worker keeps calling Spotify. Here the 429 surfaces
+    as a SpotifyException with its Retry-After header, so the resolver can
+    pause the shared token bucket; 5xx errors are still retried.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+    
+    retry = Retry(
+        total=3,
+        connect=None,
+        read=False,
+        status=3,
+        backoff_factor=0.3,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(["GET", "POST", "PUT", "DELETE"]),
+        respect_retry_after_header=False,
+        raise_on_status=False
+    )
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(max_retries=retry))
+    return spotipy.Spotify(requests_session=session, **kwargs)
+
+
+def _oauth_manager(user_key, open_browser):
+    return _SerializedOAuth(
             client_id=SPOTIFY_CLIENT_ID,
             client_secret=SPOTIFY_CLIENT_SECRET,
             redirect_uri=SPOTIFY_REDIRECT_URI,
-            scope=scope,
-            open_browser=True
+            scope=SCOPE,
+            open_browser=open_browser,
+            cache_handler=token_store.cache_handler(user_key),
+            user_key=user_key
         )
-    sp = spotipy.Spotify(auth_manager=auth_manager)
-    
-    return sp
\ No newline at end of file
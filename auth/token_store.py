@@ -0,0 +1,55 @@
+import threading
+
+from spotipy.cache_handler import CacheHandler
+
+from services.cache import PersistentCache
+
+
+class SpotifyTokenStore:
+    """
+    Token cache for many Spotify users
+    
+    Replaces spotipy's single `.cache` file with one row per user in a
+    local SQLite store, so concurrent users never share or overwrite each
+    other's tokens and restarts reuse (and refresh) what was stored.
+    """
+    
+    def __init__(self, namespace="spotify_tokens"):
+        self._tokens = PersistentCache(namespace)
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+    
+    def get(self, user_key):
+        return self._tokens.peek(user_key)
+    
+    def save(self, user_key, token_info):
+        self._tokens.set(user_key, token_info)
+    
+    def delete(self, user_key):
+        self._tokens.delete(user_key)
+    
+    def lock_for(self, user_key):
+        """Per-user lock so concurrent requests refresh a token only once"""
+        with self._locks_lock:
+            lock = self._locks.get(user_key)
+            if lock is None:
+                lock = threading.RLock()
+                self._locks[user_key] = lock
+            return lock
+    
+    def cache_handler(self, user_key):
+        return StoreCacheHandler(self, user_key)
+
+
+class StoreCacheHandler(CacheHandler):
+    """spotipy CacheHandler that reads and writes one user's row in the store"""
+    
+    def __init__(self, store, user_key):
+        self.store = store
+        self.user_key = user_key
+    
+    def get_cached_token(self):
+        return self.store.get(self.user_key)
+    
+    def save_token_to_cache(self, token_info):
+        self.store.save(self.user_key, token_info)
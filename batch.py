@@ -0,0 +1,51 @@
+import argparse
+
+from config.settings import BATCH_SIZE, BATCH_MAX_CONCURRENCY
+from workflows.batch_runner import run_batch
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="SoulSync batch mode - run a JSONL file of requests through the agents"
+    )
+    parser.add_argument("input", help="JSONL file, one {user_input, spotify_profile} request per line")
+    parser.add_argument("output", help="JSONL file results are appended to (re-run to resume and retry failures)")
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=BATCH_SIZE,
+        help="requests per batched LLM call and per checkpoint"
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=BATCH_MAX_CONCURRENCY,
+        help="upper bound on concurrent LLM calls per agent"
+    )
+    return parser.parse_args()
+
+
+def main():
+    """SoulSync batch entry point"""
+    
+    args = parse_args()
+    
+    print("=" * 60)
+    print("🎵 SoulSync batch mode")
+    print("=" * 60)
+    print()
+    
+    run_batch(args.input, args.output, args.batch_size, args.max_concurrency)
+    
+    # Imported late: a resumed run with nothing left to do never loads LangChain
+    from services.llm_service import get_llm_usage_by_node
+    
+    print()
+    print("📊 Tokens per agent:")
+    for node, usage in get_llm_usage_by_node().items():
+        print(f"   {node}: {usage['calls']} calls, "
+              f"{usage['input_tokens']} prompt + {usage['output_tokens']} completion tokens")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,416 @@
+"""
+Offline stand-ins for Spotify, Genius and the LLM providers
+
+Used by benchmarks/run_benchmarks.py to drive the real workflow and agents
+without credentials or network access.
+"""
+import asyncio
+import hashlib
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, List
+from urllib.parse import parse_qs, urlparse
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from spotipy.exceptions import SpotifyException
+
+
+# A fixed catalogue, so repeated sessions recommend overlapping songs
+# the way real LLM output does for common emotions
+CATALOGUE = [
+    (f"Song {i:03d}", f"Artist {i % 37:02d}") for i in range(120)
+]
+
+
+def _stable_hash(text):
+    return int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:12], 16)
+
+
+# ----------------------------------------------------------------------------
+# Spotify
+# ----------------------------------------------------------------------------
+
+class FakeSpotify:
+    """
+    spotipy.Spotify-compatible client for the endpoints SoulSync uses
+    
+    Args:
+        latency: Seconds slept per API call
+        miss_rate: Fraction of search queries that return no tracks
+        rate_limit_every: Raise a 429 on every Nth call (0 = never)
+        retry_after: Retry-After seconds reported with injected 429s
+        user_id: ID returned by current_user()
+    """
+    
+    def __init__(self, latency=0.05, miss_rate=0.1, rate_limit_every=0,
+                 retry_after=1, user_id="bench-user"):
+        self.latency = latency
+        self.miss_rate = miss_rate
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.user_id = user_id
+        self.calls = {}
+        self._count = 0
+        self._lock = threading.Lock()
+    
+    def as_async(self):
+        """Async view sharing these counters (used by the workflow.ainvoke path)"""
+        return AsyncFakeSpotify(self)
+    
+    def _call(self, endpoint):
+        count = self._count_call(endpoint)
+        time.sleep(self.latency)
+        self._maybe_rate_limit(count)
+    
+    def _count_call(self, endpoint):
+        with self._lock:
+            self._count += 1
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+            return self._count
+    
+    def _maybe_rate_limit(self, count):
+        if self.rate_limit_every and count % self.rate_limit_every == 0:
+            raise SpotifyException(
+                429, -1, "API rate limit exceeded",
+                headers={"Retry-After": str(self.retry_after)}
+            )
+    
+    def search(self, q, limit=10, offset=0, type="track", market=None):
+        self._call("search")
+        return self._search_result(q, limit)
+    
+    def _search_result(self, q, limit):
+        if _stable_hash(q) % 1000 < self.miss_rate * 1000:
+            return {"tracks": {"items": []}}
+        return {"tracks": {"items": [self._track(f"{q}#{i}") for i in range(limit)]}}
+    
+    def current_user(self):
+        self._call("current_user")
+        return {"id": self.user_id}
+    
+    def current_user_top_artists(self, limit=20, offset=0, time_range="medium_term"):
+        self._call("current_user_top_artists")
+        return {"items": [
+            {
+                "name": f"Artist {i:02d}",
+                "genres": [f"genre {i % 7}", f"genre {i % 5 + 7}"],
+                "popularity": 50 + i
+            }
+            for i in range(limit)
+        ]}
+    
+    def current_user_top_tracks(self, limit=20, offset=0, time_range="medium_term"):
+        self._call("current_user_top_tracks")
+        return {"items": [self._track(f"top-{i}") for i in range(limit)]}
+    
+    def current_user_recently_played(self, limit=50, after=None, before=None):
+        self._call("current_user_recently_played")
+        if after:
+            return {"items": [], "cursors": None}
+        return {
+            "items": [
+                {"track": self._track(f"recent-{i}"), "played_at": f"2025-01-01T00:{i:02d}:00Z"}
+                for i in range(limit)
+            ],
+            "cursors": {"after": "1735690000000", "before": "1735680000000"}
+        }
+    
+    def audio_features(self, tracks=[]):
+        self._call("audio_features")
+        return [
+            {
+                "id": track_id,
+                "tempo": 60 + _stable_hash(track_id) % 120,
+                "energy": (_stable_hash(track_id + "e") % 100) / 100,
+                "valence": (_stable_hash(track_id + "v") % 100) / 100,
+                "danceability": (_stable_hash(track_id + "d") % 100) / 100,
+                "acousticness": (_stable_hash(track_id + "a") % 100) / 100,
+                "instrumentalness": (_stable_hash(track_id + "i") % 100) / 100,
+            }
+            for track_id in tracks
+        ]
+    
+    def user_playlist_create(self, user, name, public=True, collaborative=False, description=""):
+        self._call("user_playlist_create")
+        return self._playlist(name)
+    
+    def _playlist(self, name):
+        playlist_id = f"pl{_stable_hash(name + str(time.time()))}"
+        return {"id": playlist_id, "external_urls": {"spotify": f"https://open.spotify.com/playlist/{playlist_id}"}}
+    
+    def playlist_add_items(self, playlist_id, items, position=None):
+        self._call("playlist_add_items")
+        return {"snapshot_id": "bench"}
+    
+    def _track(self, seed):
+        track_id = f"{_stable_hash(seed):022d}"[:22]
+        name, artist = CATALOGUE[_stable_hash(seed) % len(CATALOGUE)]
+        return {
+            "id": track_id,
+            "uri": f"spotify:track:{track_id}",
+            "name": name,
+            "artists": [{"name": artist}],
+            "album": {"name": f"Album of {name}"},
+            "preview_url": None,
+            "external_urls": {"spotify": f"https://open.spotify.com/track/{track_id}"},
+        }
+
+
+class AsyncFakeSpotify:
+    """
+    Async counterpart of FakeSpotify for the calls AsyncSpotify covers
+    
+    Latency is awaited instead of slept, so concurrent sessions on one
+    event loop overlap the way they would against the real Web API.
+    """
+    
+    def __init__(self, fake):
+        self.fake = fake
+    
+    async def _call(self, endpoint):
+        count = self.fake._count_call(endpoint)
+        await asyncio.sleep(self.fake.latency)
+        self.fake._maybe_rate_limit(count)
+    
+    async def search(self, q, limit=10, offset=0, type="track", market=None):
+        await self._call("search")
+        return self.fake._search_result(q, limit)
+    
+    async def user_playlist_create(self, user, name, public=True, collaborative=False, description=""):
+        await self._call("user_playlist_create")
+        return self.fake._playlist(name)
+    
+    async def playlist_add_items(self, playlist_id, items, position=None):
+        await self._call("playlist_add_items")
+        return {"snapshot_id": "bench"}
+
+
+# ----------------------------------------------------------------------------
+# Genius
+# ----------------------------------------------------------------------------
+
+class FakeGeniusServer:
+    """
+    Local HTTP stand-in for the Genius API (/search and /songs/<id>)
+    
+    Use as a context manager; `url` is the base URL to point
+    GENIUS_API_BASE_URL at.
+    """
+    
+    def __init__(self, latency=0.05, miss_rate=0.1):
+        latency_s = latency
+        miss = miss_rate
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                time.sleep(latency_s)
+                parsed = urlparse(self.path)
+                if parsed.path == "/search":
+                    query = parse_qs(parsed.query).get("q", [""])[0]
+                    hits = [] if _stable_hash(query) % 1000 < miss * 1000 else [{
+                        "result": {
+                            "id": _stable_hash(query) % 10_000_000,
+                            "title": query,
+                            "primary_artist": {"name": "Bench Artist"},
+                            "url": f"https://genius.com/bench-{_stable_hash(query)}",
+                            "annotation_count": 3,
+                        }
+                    }]
+                    self._json({"response": {"hits": hits}})
+                elif parsed.path.startswith("/songs/"):
+                    song_id = int(parsed.path.rsplit("/", 1)[-1])
+                    self._json({"response": {"song": {
+                        "id": song_id,
+                        "title": f"Song {song_id}",
+                        "primary_artist": {"name": "Bench Artist"},
+                        "url": f"https://genius.com/songs/{song_id}",
+                        "annotation_count": 3,
+                        "description": {"plain": "A song about letting go and starting again."},
+                        "tags": [{"name": "healing"}, {"name": "hope"}],
+                    }}})
+                else:
+                    self.send_error(404)
+            
+            def _json(self, payload):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, format, *args):
+                pass
+        
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+    
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+    
+    def __enter__(self):
+        self._thread.start()
+        return self
+    
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+# ----------------------------------------------------------------------------
+# LLM
+# ----------------------------------------------------------------------------
+
+def scripted_response(messages: List[BaseMessage]) -> str:
+    """Pick a plausible JSON answer for whichever agent sent the prompt"""
+    text = "\n".join(str(m.content) for m in messages)
+    seed = _stable_hash(text)
+    
+    if "emotional analyst" in text:
+        return json.dumps({
+            "primary_emotion": ["anxious", "sad", "lonely", "overwhelmed"][seed % 4],
+            "secondary_emotions": ["tired", "restless"],
+            "intensity": 4 + seed % 6,
+            "story_context": "A hard week at work and a falling out with a close friend.",
+            "desired_outcome": "calm and hopeful"
+        })
+    
+    if "music psychologist" in text:
+        return json.dumps({
+            "lyrical_themes": ["resilience", "nostalgia", "self-discovery"],
+            "sonic_preferences": {
+                "tempo_range": "moderate",
+                "energy_preference": "medium",
+                "emotional_range": "balanced"
+            },
+            "genre_clusters": ["indie folk", "alt pop"],
+            "personality_traits": ["introspective", "curious"],
+            "discovery_openness": 0.7,
+            "comfort_zone_description": "Warm, lyric-driven songs with acoustic textures."
+        })
+    
+    if "music therapist" in text:
+        match = re.search(r"Recommend (\d+) songs", text)
+        count = int(match.group(1)) if match else 25
+        return json.dumps([
+            {
+                "track_name": CATALOGUE[(seed + i * 7) % len(CATALOGUE)][0],
+                "artist": CATALOGUE[(seed + i * 7) % len(CATALOGUE)][1],
+                "album": "Bench Album",
+                "year": str(1990 + i),
+                "lyrical_theme": f"Finding light after a difficult chapter ({i})",
+                "therapeutic_reason": "Validates the feeling, then lifts it gently",
+                "sonic_match": "Acoustic warmth close to their favourites",
+                "discovery_score": round(0.4 + (i % 6) / 10, 2),
+                "progression_stage": 1 + i % 10,
+                "spotify_search_query": (
+                    f"track:{CATALOGUE[(seed + i * 7) % len(CATALOGUE)][0]} "
+                    f"artist:{CATALOGUE[(seed + i * 7) % len(CATALOGUE)][1]}"
+                )
+            }
+            for i in range(count)
+        ])
+    
+    if "precision recommendation algorithm" in text:
+        candidates = _embedded_json_array(text)
+        return json.dumps([
+            {
+                "id": c.get("id", i),
+                "track_name": c.get("track_name", ""),
+                "artist": c.get("artist", ""),
+                "therapeutic_reason": c.get("therapeutic_reason", ""),
+                "taste_distance_score": round(0.1 + i * 0.05, 2),
+                "lyrical_match_score": 0.9,
+                "sonic_match_score": 0.8,
+                "discovery_score": c.get("discovery_score", 0.5),
+                "progression_stage": c.get("progression_stage", 5),
+                "ranking_rationale": "Strong lyrical match"
+            }
+            for i, c in enumerate(candidates[:10])
+        ])
+    
+    if "alternative songs" in text:
+        failed = _embedded_json_array(text)
+        return json.dumps([
+            {
+                "track_name": CATALOGUE[(seed + i) % len(CATALOGUE)][0],
+                "artist": CATALOGUE[(seed + i) % len(CATALOGUE)][1],
+                "therapeutic_reason": "Same purpose, widely available",
+                "spotify_search_query": (
+                    f"track:{CATALOGUE[(seed + i) % len(CATALOGUE)][0]} "
+                    f"artist:{CATALOGUE[(seed + i) % len(CATALOGUE)][1]}"
+                )
+            }
+            for i, _ in enumerate(failed)
+        ])
+    
+    return "{}"
+
+
+def _embedded_json_array(text):
+    """First JSON array of objects embedded in a prompt"""
+    match = re.search(r"\[\s*\{.*?\}\s*\](?=\s*\n)", text, re.DOTALL)
+    if not match:
+        return []
+    try:
+        return json.loads(match.group(0))
+    except json.JSONDecodeError:
+        return []
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Fake chat model with configurable latency that answers every SoulSync
+    prompt with valid JSON; plugs into get_llm via set_chat_model_factory
+    """
+    
+    latency: float = 0.5
+    stream_chunk_chars: int = 64
+    
+    @property
+    def _llm_type(self) -> str:
+        return "soulsync-scripted"
+    
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency)
+        return self._result(messages)
+    
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return self._result(messages)
+    
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs: Any):
+        text = scripted_response(messages)
+        pieces = [text[i:i + self.stream_chunk_chars] for i in range(0, len(text), self.stream_chunk_chars)]
+        delay = self.latency / max(len(pieces), 1)
+        for piece in pieces:
+            time.sleep(delay)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=piece))
+    
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs: Any):
+        text = scripted_response(messages)
+        pieces = [text[i:i + self.stream_chunk_chars] for i in range(0, len(text), self.stream_chunk_chars)]
+        delay = self.latency / max(len(pieces), 1)
+        for piece in pieces:
+            await asyncio.sleep(delay)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=piece))
+    
+    def _result(self, messages):
+        text = scripted_response(messages)
+        prompt_chars = sum(len(str(m.content)) for m in messages)
+        message = AIMessage(
+            content=text,
+            usage_metadata={
+                "input_tokens": prompt_chars // 4,
+                "output_tokens": len(text) // 4,
+                "total_tokens": (prompt_chars + len(text)) // 4,
+            }
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
@@ -0,0 +1,132 @@
+"""
+Startup import-time benchmark for SoulSync
+
+Imports each entry point in a fresh interpreter with `python -X importtime`
+and reports the total import time (median of --repeat runs) and the
+heaviest modules. Two checks guard cold start:
+
+- none of HEAVY_PACKAGES (LangGraph, LangChain, spotipy, NumPy, ...) may be
+  imported at module load; they belong inside the functions that use them
+- the median import time must stay within --budget-ms
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --repeat 10 --budget-ms 150
+    python -m benchmarks.import_time --modules main batch
+
+Exits with status 1 when a check fails, so it can gate CI.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ENTRY_POINTS = ("main", "batch", "workflows.soulsync_graph", "workflows.batch_runner")
+
+# Third-party packages that must only load on first use
+HEAVY_PACKAGES = (
+    "langgraph",
+    "langchain",
+    "langchain_core",
+    "langchain_openai",
+    "langchain_google_genai",
+    "spotipy",
+    "numpy",
+    "httpx",
+    "requests",
+    "tiktoken",
+    "sentence_transformers",
+    "chromadb",
+)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="SoulSync startup import-time benchmark")
+    parser.add_argument("--modules", nargs="+", default=list(ENTRY_POINTS), help="modules to import")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per module")
+    parser.add_argument("--budget-ms", type=float, default=200.0, help="allowed median import time per module")
+    parser.add_argument("--top", type=int, default=5, help="slowest modules to list per entry point")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    
+    print("=" * 60)
+    print("SoulSync startup import time")
+    print("=" * 60)
+    
+    failures = []
+    for module in args.modules:
+        failures.extend(bench_module(module, args.repeat, args.budget_ms, args.top))
+    
+    if failures:
+        print(f"\n❌ {len(failures)} startup checks failed:")
+        for failure in failures:
+            print(f"   {failure}")
+        sys.exit(1)
+    print(f"\n✅ All entry points import within {args.budget_ms:.0f} ms without heavy dependencies")
+
+
+def bench_module(module, repeat, budget_ms, top):
+    """Import `module` `repeat` times; return the failed checks"""
+    runs = [measure_import(module) for _ in range(max(1, repeat))]
+    if any(run is None for run in runs):
+        return [f"{module}: import failed"]
+    
+    total_ms = statistics.median(sum(self_us for self_us, _ in run.values()) / 1000 for run in runs)
+    heavy = sorted({name for name in runs[0] if name.split(".")[0] in HEAVY_PACKAGES})
+    
+    flag = "❌" if total_ms > budget_ms or heavy else "  "
+    print(f"\n{flag} {module}: {total_ms:.1f} ms median over {len(runs)} runs, {len(runs[0])} modules")
+    slowest = sorted(runs[0].items(), key=lambda item: item[1][1], reverse=True)[:top]
+    for name, (_, cumulative_us) in slowest:
+        print(f"      {cumulative_us / 1000:7.1f} ms  {name}")
+    
+    failures = []
+    if total_ms > budget_ms:
+        failures.append(f"{module}: {total_ms:.1f} ms exceeds the {budget_ms:.0f} ms budget")
+    if heavy:
+        roots = sorted({name.split(".")[0] for name in heavy})
+        failures.append(f"{module}: imports {', '.join(roots)} at startup")
+    return failures
+
+
+def measure_import(module):
+    """
+    Per-module import times of `import module` in a fresh interpreter
+    
+    Returns:
+        Dict of module name -> (self µs, cumulative µs), or None if the import failed
+    """
+    env = dict(os.environ)
+    # Keep stray cache/database files out of the working tree
+    env.setdefault("SOULSYNC_CACHE_DIR", os.path.join(tempfile.gettempdir(), "soulsync-importtime"))
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        print(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"{module}: exit {proc.returncode}")
+        return None
+    return parse_importtime(proc.stderr)
+
+
+def parse_importtime(output):
+    """Parse `-X importtime` lines: 'import time: self | cumulative | name'"""
+    modules = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # the header line
+        modules[fields[2].strip()] = (int(fields[0]), int(fields[1]))
+    return modules
+
+
+if __name__ == "__main__":
+    main()
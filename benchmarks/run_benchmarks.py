@@ -0,0 +1,291 @@
+"""
+Offline end-to-end benchmarks for SoulSync
+
+Drives create_soulsync_workflow().invoke (or .ainvoke with --async) and the
+individual agents against
+the fakes in benchmarks/fakes.py, and reports p50/p95 latency, throughput at
+N concurrent sessions and peak memory.
+
+    python -m benchmarks.run_benchmarks
+    python -m benchmarks.run_benchmarks --sessions 40 --concurrency 1 8 32
+    python -m benchmarks.run_benchmarks --async --sessions 200 --concurrency 200
+    python -m benchmarks.run_benchmarks --save-baseline benchmarks/baselines/local.json
+    python -m benchmarks.run_benchmarks --compare benchmarks/baselines/local.json
+
+--compare exits with status 1 when any metric regresses by more than
+--tolerance, so it can gate CI.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Offline SoulSync benchmarks")
+    parser.add_argument("--sessions", type=int, default=20, help="workflow runs per concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--agent-iterations", type=int, default=10)
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds per fake LLM call")
+    parser.add_argument("--spotify-latency", type=float, default=0.05, help="seconds per fake Spotify call")
+    parser.add_argument("--genius-latency", type=float, default=0.05, help="seconds per fake Genius request")
+    parser.add_argument("--miss-rate", type=float, default=0.1, help="fraction of searches with no result")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="inject a 429 every N Spotify calls")
+    parser.add_argument("--lyrics", action="store_true", help="enable Genius lyrics enrichment")
+    parser.add_argument("--distinct-users", action="store_true", help="give every session its own user id")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="run sessions with workflow.ainvoke on one event loop instead of threads")
+    parser.add_argument("--save-baseline", metavar="PATH")
+    parser.add_argument("--compare", metavar="PATH")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    
+    # Isolate caches and point Genius at the local stand-in before any
+    # project module reads config.settings
+    workdir = tempfile.mkdtemp(prefix="soulsync-bench-")
+    os.environ["SOULSYNC_CACHE_DIR"] = os.path.join(workdir, "cache")
+    os.environ.setdefault("GENIUS_ACCESS_TOKEN", "bench")
+    if args.lyrics:
+        os.environ["LYRICS_ENRICHMENT"] = "true"
+    
+    from benchmarks.fakes import FakeGeniusServer
+    
+    with FakeGeniusServer(latency=args.genius_latency, miss_rate=args.miss_rate) as genius:
+        os.environ["GENIUS_API_BASE_URL"] = genius.url
+        results = run_suite(args)
+    
+    print_results(results)
+    
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.save_baseline) or ".", exist_ok=True)
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"\n💾 Baseline saved to {args.save_baseline}")
+    
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, results, args.tolerance)
+        if regressions:
+            sys.exit(1)
+
+
+def run_suite(args):
+    from auth.spotify_auth import set_spotify_client_factory
+    from benchmarks.fakes import FakeSpotify, ScriptedChatModel
+    from services.llm_service import set_chat_model_factory
+    from services.spotify_service import fetch_user_profile
+    from workflows.soulsync_graph import create_soulsync_workflow
+    
+    spotify = FakeSpotify(
+        latency=args.spotify_latency,
+        miss_rate=args.miss_rate,
+        rate_limit_every=args.rate_limit_every
+    )
+    set_spotify_client_factory(lambda: spotify)
+    set_chat_model_factory(lambda provider, model, temperature: ScriptedChatModel(latency=args.llm_latency))
+    
+    with contextlib.redirect_stdout(io.StringIO()):
+        profile = fetch_user_profile(spotify)
+    
+    # Compiled once, like a long-running server would
+    workflow = create_soulsync_workflow()
+    
+    results = {"config": _config_of(args), "workflow": {}, "agents": {}}
+    
+    for concurrency in args.concurrency:
+        # Every level starts cold, so later levels don't ride on earlier levels' caches
+        _clear_caches()
+        results["workflow"][f"concurrency_{concurrency}"] = bench_workflow(
+            workflow, profile, args.sessions, concurrency, args.distinct_users, args.use_async
+        )
+    
+    results["agents"] = bench_agents(workflow, profile, args.agent_iterations)
+    results["spotify_calls"] = dict(spotify.calls)
+    return results
+
+
+def bench_workflow(workflow, profile, sessions, concurrency, distinct_users, use_async=False):
+    """Run `sessions` workflow invocations, `concurrency` at a time"""
+    
+    def run_session(i):
+        start = time.perf_counter()
+        workflow.invoke(_initial_state(profile, i, distinct_users))
+        return time.perf_counter() - start
+    
+    async def run_sessions_async():
+        slots = asyncio.Semaphore(concurrency)
+        
+        async def run_async_session(i):
+            async with slots:
+                start = time.perf_counter()
+                await workflow.ainvoke(_initial_state(profile, i, distinct_users))
+                return time.perf_counter() - start
+        
+        return await asyncio.gather(*(run_async_session(i) for i in range(sessions)))
+    
+    tracemalloc.start()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if use_async:
+            from services.http_pool import run_async
+            latencies = run_async(run_sessions_async())
+        else:
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                latencies = list(pool.map(run_session, range(sessions)))
+    wall = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    return {
+        **_latency_summary(latencies),
+        "throughput_per_s": sessions / wall,
+        "peak_memory_mb": peak / (1024 * 1024),
+    }
+
+
+def bench_agents(workflow, profile, iterations):
+    """Time each agent on its own, with inputs taken from one full run"""
+    from agents.emotion_analyzer import emotion_analyzer_agent
+    from agents.taste_profiler import taste_profiler_agent
+    from agents.music_recommender import music_recommender_agent
+    from agents.taste_ranker import taste_ranker_agent
+    
+    with contextlib.redirect_stdout(io.StringIO()):
+        state = workflow.invoke(_initial_state(profile, 0, False))
+    
+    agents = {
+        "emotion_analyzer": emotion_analyzer_agent,
+        "taste_profiler": taste_profiler_agent,
+        "music_recommender": music_recommender_agent,
+        "taste_ranker": taste_ranker_agent,
+    }
+    
+    results = {}
+    for name, agent in agents.items():
+        latencies = []
+        with contextlib.redirect_stdout(io.StringIO()):
+            for i in range(iterations):
+                # Vary the input and the user so coalescing and the per-user
+                # taste profile memo don't hide the work
+                user_id = f"{state['user_id']}-agent-{i}"
+                run_state = {
+                    **state,
+                    "user_input": f"{state['user_input']} ({i})",
+                    "user_id": user_id,
+                    "spotify_profile": {**state["spotify_profile"], "user_id": user_id},
+                }
+                start = time.perf_counter()
+                agent(run_state)
+                latencies.append(time.perf_counter() - start)
+        results[name] = _latency_summary(latencies)
+    return results
+
+
+def compare(baseline, current, tolerance):
+    """Print metric deltas against a saved baseline; return the regressions"""
+    regressions = []
+    print("\n📈 Comparison with baseline:")
+    for section in ("workflow", "agents"):
+        for case, metrics in current.get(section, {}).items():
+            old_metrics = baseline.get(section, {}).get(case)
+            if not old_metrics:
+                continue
+            for metric, value in metrics.items():
+                old = old_metrics.get(metric)
+                if not old:
+                    continue
+                delta = (value - old) / old
+                # Throughput regresses downwards, everything else upwards
+                worse = -delta if metric.startswith("throughput") else delta
+                flag = "❌" if worse > tolerance else "  "
+                if worse > tolerance:
+                    regressions.append(f"{section}.{case}.{metric}")
+                print(f"   {flag} {section}.{case}.{metric}: {old:.3f} → {value:.3f} ({delta:+.1%})")
+    
+    if regressions:
+        print(f"\n❌ {len(regressions)} metrics regressed more than {tolerance:.0%}")
+    else:
+        print(f"\n✅ No regressions beyond {tolerance:.0%}")
+    return regressions
+
+
+def print_results(results):
+    print("=" * 60)
+    print("SoulSync offline benchmark")
+    print("=" * 60)
+    print("\nWorkflow:")
+    for case, m in results["workflow"].items():
+        print(f"   {case:<16} p50 {m['p50_s']:.3f}s  p95 {m['p95_s']:.3f}s  "
+              f"{m['throughput_per_s']:.2f} sessions/s  peak {m['peak_memory_mb']:.1f} MB")
+    print("\nAgents:")
+    for name, m in results["agents"].items():
+        print(f"   {name:<18} p50 {m['p50_s']:.3f}s  p95 {m['p95_s']:.3f}s")
+    print("\nSpotify calls:", results["spotify_calls"])
+
+
+def _clear_caches():
+    """Empty the persistent caches the workflow reads from"""
+    from agents.taste_profiler import taste_profile_cache
+    from services.audio_features import audio_feature_cache
+    from services.heard_tracks import heard_tracks_cache
+    from services.lyrics_service import lyrics_cache
+    from services.spotify_resolver import track_cache
+    
+    for cache in (taste_profile_cache, audio_feature_cache, heard_tracks_cache, lyrics_cache, track_cache):
+        cache.clear()
+
+
+def _latency_summary(latencies):
+    ordered = sorted(latencies)
+    return {
+        "p50_s": statistics.median(ordered),
+        "p95_s": ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))],
+        "mean_s": statistics.fmean(ordered),
+    }
+
+
+def _initial_state(profile, i, distinct_users):
+    user_id = f"{profile['user_id']}-{i}" if distinct_users else profile["user_id"]
+    return {
+        "user_input": f"Session {i}: I had a rough week, I feel drained and want to feel hopeful again.",
+        "user_id": user_id,
+        "spotify_profile": {**profile, "user_id": user_id},
+        "emotion_analysis": {},
+        "taste_profile": {},
+        "universe_candidates": [],
+        "ranked_recommendations": [],
+        "spotify_tracks": [],
+        "playlist_url": "",
+        "errors": []
+    }
+
+
+def _config_of(args):
+    return {
+        "sessions": args.sessions,
+        "llm_latency": args.llm_latency,
+        "spotify_latency": args.spotify_latency,
+        "genius_latency": args.genius_latency,
+        "miss_rate": args.miss_rate,
+        "rate_limit_every": args.rate_limit_every,
+        "distinct_users": args.distinct_users,
+        "lyrics": args.lyrics,
+        "async": args.use_async,
+    }
+
+
+if __name__ == "__main__":
+    main()
@@ -12,10 +12,135 @@ LLM_PROVIDER = os.getenv("LLM_PROVIDER", "openai")
 SPOTIFY_CLIENT_ID = os.getenv("SPOTIFY_CLIENT_ID")
 SPOTIFY_CLIENT_SECRET = os.getenv("SPOTIFY_CLIENT_SECRET")
 SPOTIFY_REDIRECT_URI = os.getenv("SPOTIFY_REDIRECT_URI")
+SPOTIFY_API_BASE_URL = os.getenv("SPOTIFY_API_BASE_URL", "https://api.spotify.com/v1")
 
 
 # LangChain
 LANGCHAIN_TRACING_V2 = os.getenv("LANGCHAIN_TRACING_V2", "true")
 LANGCHAIN_API_KEY = os.getenv("LANGCHAIN_API_KEY")
 
-GENIUS_ACCESS_TOKEN = os.getenv("GENIUS_ACCESS_TOKEN")
\ No newline at end of file
+GENIUS_ACCESS_TOKEN = os.getenv("GENIUS_ACCESS_TOKEN")
+GENIUS_API_BASE_URL = os.getenv("GENIUS_API_BASE_URL", "https://api.genius.com")
+
+# Spotify request throughput (shared by all resolver workers)
+SPOTIFY_MAX_WORKERS = int(os.getenv("SPOTIFY_MAX_WORKERS", "8"))
+SPOTIFY_REQUESTS_PER_SECOND = float(os.getenv("SPOTIFY_REQUESTS_PER_SECOND", "10"))
+SPOTIFY_MAX_RETRIES = int(os.getenv("SPOTIFY_MAX_RETRIES", "3"))
+# Authenticated clients kept in memory; the least recently used are dropped past this
+SPOTIFY_CLIENT_CACHE_SIZE = int(os.getenv("SPOTIFY_CLIENT_CACHE_SIZE", "256"))
+
+# Local persistent caches
+CACHE_DIR = os.getenv("SOULSYNC_CACHE_DIR", ".soulsync_cache")
+TRACK_CACHE_TTL_DAYS = float(os.getenv("TRACK_CACHE_TTL_DAYS", "30"))
+TRACK_CACHE_MAX_ENTRIES = int(os.getenv("TRACK_CACHE_MAX_ENTRIES", "50000"))
+
+# Taste DNA memoization: reuse while the profile fingerprint is unchanged,
+# or for this many hours even if it changed
+TASTE_PROFILE_STALENESS_HOURS = float(os.getenv("TASTE_PROFILE_STALENESS_HOURS", "24"))
+TASTE_PROFILE_TTL_DAYS = float(os.getenv("TASTE_PROFILE_TTL_DAYS", "30"))
+
+# Incremental profile fetch: top artists/tracks are refreshed after this many hours,
+# recent plays are always pulled as a delta
+PROFILE_TOP_ITEMS_REFRESH_HOURS = float(os.getenv("PROFILE_TOP_ITEMS_REFRESH_HOURS", "24"))
+
+# Audio features of the user's top tracks (tempo, energy, valence, ...) feed the
+# taste profile; apps without access to the endpoint can switch it off
+AUDIO_FEATURES_ENABLED = os.getenv("AUDIO_FEATURES_ENABLED", "true").lower() == "true"
+
+# Heard-tracks index: candidates already in the user's top/recent tracks are
+# dropped before ranking and resolving (hashes kept per user, oldest dropped first)
+HEARD_TRACKS_FILTER = os.getenv("HEARD_TRACKS_FILTER", "true").lower() == "true"
+HEARD_TRACKS_MAX_PER_USER = int(os.getenv("HEARD_TRACKS_MAX_PER_USER", "5000"))
+
+# Taste ranking: "llm" (prompted ranking pass) or "local" (embedding + NumPy scoring)
+RANKER_MODE = os.getenv("RANKER_MODE", "llm")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+
+# Stream the recommender's JSON array and start Spotify lookups (and lyrics
+# enrichment, if enabled) on each candidate as soon as it is complete
+RECOMMENDER_STREAMING = os.getenv("RECOMMENDER_STREAMING", "false").lower() == "true"
+LYRICS_ENRICHMENT = os.getenv("LYRICS_ENRICHMENT", "false").lower() == "true"
+# Resolve every universe candidate on Spotify while the ranker runs
+SPECULATIVE_RESOLUTION = os.getenv("SPECULATIVE_RESOLUTION", "false").lower() == "true"
+
+# LLM client layer
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "120"))
+# Per-provider cap on in-flight calls, process-wide (threads and event loops share it),
+# so a hedged secondary never queues behind the primary
+LLM_PROVIDER_MAX_CONCURRENCY = {
+    "openai": int(os.getenv("OPENAI_MAX_CONCURRENCY", str(LLM_MAX_CONCURRENCY))),
+    "google": int(os.getenv("GOOGLE_MAX_CONCURRENCY", str(LLM_MAX_CONCURRENCY))),
+}
+
+# Genius lyrics enrichment
+GENIUS_MAX_WORKERS = int(os.getenv("GENIUS_MAX_WORKERS", "8"))
+LYRICS_CACHE_TTL_DAYS = float(os.getenv("LYRICS_CACHE_TTL_DAYS", "90"))
+
+# Retrieval of previously resolved songs from the local ChromaDB index
+SONG_INDEX_ENABLED = os.getenv("SONG_INDEX_ENABLED", "false").lower() == "true"
+SONG_INDEX_MAX_RETRIEVED = int(os.getenv("SONG_INDEX_MAX_RETRIEVED", "15"))
+SONG_INDEX_MAX_DISTANCE = float(os.getenv("SONG_INDEX_MAX_DISTANCE", "0.6"))
+
+# Token budgets for the variable parts of each agent's prompt
+PROMPT_TOKEN_BUDGETS = {
+    "emotion_analyzer": int(os.getenv("EMOTION_PROMPT_BUDGET", "1500")),
+    "taste_profiler": int(os.getenv("TASTE_PROMPT_BUDGET", "400")),
+    "music_recommender": int(os.getenv("RECOMMENDER_PROMPT_BUDGET", "800")),
+    "taste_ranker": int(os.getenv("RANKER_PROMPT_BUDGET", "3000")),
+    "spotify_alternatives": int(os.getenv("ALTERNATIVES_PROMPT_BUDGET", "600")),
+}
+
+# Model routing: each agent uses a model tier; with a secondary provider set,
+# calls slower than the primary provider's rolling p90 are hedged to it
+LLM_MODEL_TIERS = {
+    "fast": {
+        "openai": os.getenv("OPENAI_FAST_MODEL", "gpt-4o-mini"),
+        "google": os.getenv("GOOGLE_FAST_MODEL", "models/gemini-2.5-flash"),
+    },
+    "strong": {
+        "openai": os.getenv("OPENAI_STRONG_MODEL", "gpt-4o"),
+        "google": os.getenv("GOOGLE_STRONG_MODEL", "models/gemini-2.5-pro"),
+    },
+}
+AGENT_MODEL_TIERS = {
+    "emotion_analyzer": os.getenv("EMOTION_MODEL_TIER", "fast"),
+    "taste_profiler": os.getenv("TASTE_MODEL_TIER", "fast"),
+    "music_recommender": os.getenv("RECOMMENDER_MODEL_TIER", "strong"),
+    "taste_ranker": os.getenv("RANKER_MODEL_TIER", "fast"),
+    "spotify_alternatives": os.getenv("ALTERNATIVES_MODEL_TIER", "fast"),
+}
+LLM_SECONDARY_PROVIDER = os.getenv("LLM_SECONDARY_PROVIDER", "")
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "0.9"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_HEDGE_DEFAULT_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY_SECONDS", "8"))
+
+# Tracing: finished spans are appended here as JSONL when set
+TRACE_FILE = os.getenv("SOULSYNC_TRACE_FILE")
+# Finished spans kept in memory for reports; the oldest are dropped past this
+TRACE_MAX_SPANS = int(os.getenv("SOULSYNC_TRACE_MAX_SPANS", "10000"))
+
+# API server
+API_HOST = os.getenv("API_HOST", "0.0.0.0")
+API_PORT = int(os.getenv("API_PORT", "5000"))
+# Sessions run concurrently as coroutines on one event loop; API_MAX_WORKERS
+# threads handle the blocking bits (profile fetch, token refresh, CPU ranking)
+API_MAX_CONCURRENT_SESSIONS = int(os.getenv("API_MAX_CONCURRENT_SESSIONS", "256"))
+API_MAX_WORKERS = int(os.getenv("API_MAX_WORKERS", "4"))
+API_MAX_QUEUED_JOBS = int(os.getenv("API_MAX_QUEUED_JOBS", "32"))
+API_JOB_TTL_SECONDS = float(os.getenv("API_JOB_TTL_SECONDS", "3600"))
+
+# Local matching of Spotify search results
+SPOTIFY_SEARCH_LIMIT = int(os.getenv("SPOTIFY_SEARCH_LIMIT", "5"))
+SPOTIFY_MATCH_THRESHOLD = float(os.getenv("SPOTIFY_MATCH_THRESHOLD", "0.75"))
+# Minimum similarity of the best-matching artist, whatever the combined score;
+# otherwise an exact title alone (0.6) lets covers by other artists through
+SPOTIFY_ARTIST_MATCH_FLOOR = float(os.getenv("SPOTIFY_ARTIST_MATCH_FLOOR", "0.8"))
+MAX_ALTERNATIVE_DEPTH = int(os.getenv("MAX_ALTERNATIVE_DEPTH", "1"))
+
+# Batch mode (batch.py)
+BATCH_SIZE = int(os.getenv("BATCH_SIZE", "32"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", str(LLM_MAX_CONCURRENCY)))
+
+# Workflow checkpoints (resume a failed run without repeating LLM work)
+CHECKPOINT_DB = os.getenv("SOULSYNC_CHECKPOINT_DB", os.path.join(CACHE_DIR, "checkpoints.sqlite3"))
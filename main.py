@@ -1,12 +1,53 @@
-from auth.spotify_auth import get_spotify_client
-from services.spotify_service import fetch_user_profile
-from workflows.soulsync_graph import create_soulsync_workflow
+import argparse
+import importlib
+import threading
 
+from services import tracing
+from services.http_pool import run_async
+from workflows.checkpoints import (
+    aresume_workflow,
+    get_async_checkpointer,
+    last_thread_id,
+    new_thread_id,
+    run_config,
+)
+
+# Loaded in the background while the user is typing (see preload_workflow)
+WORKFLOW_MODULES = (
+    "langgraph.graph",
+    "langgraph.checkpoint.sqlite.aio",
+    "agents.emotion_analyzer",
+    "agents.taste_profiler",
+    "agents.music_recommender",
+    "agents.taste_ranker",
+    "services.llm_service",
+    "services.spotify_resolver",
+    "workflows.soulsync_graph",
+)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="SoulSync - Your Music Therapy Companion")
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="print a per-stage latency breakdown at the end of the run"
+    )
+    parser.add_argument(
+        "--resume",
+        nargs="?",
+        const="last",
+        metavar="RUN_ID",
+        help="continue a failed run from its last successful step (default: the most recent run)"
+    )
+    return parser.parse_args()
 
 
 def main():
     """SoulSync CLI - Main entry point"""
     
+    args = parse_args()
+    
     print("=" * 60)
     print("🎵 Welcome to SoulSync - Your Music Therapy Companion")
     print("=" * 60)
@@ -17,6 +58,10 @@ def main():
     print("(A browser window will open for authorization)")
     print()
     
+    # spotipy is only imported once it's needed, so --help stays instant
+    from auth.spotify_auth import get_spotify_client
+    from services.spotify_service import fetch_user_profile
+    
     try:
         spotify_client = get_spotify_client()
         print("✅ Successfully connected to Spotify!\n")
@@ -24,9 +69,13 @@ def main():
         print(f"❌ Failed to connect to Spotify: {e}")
         return
     
+    if args.resume:
+        run_async(resume_run(args, spotify_client))
+        return
+    
     # Phase 2: Fetch user profile
     try:
-        user_profile = fetch_user_profile(spotify_client)
+        user_profile = fetch_user_profile(spotify_client, incremental=True)
         print()
     except Exception as e:
         print(f"❌ Failed to fetch profile: {e}")
@@ -40,6 +89,7 @@ def main():
     print("Share your emotions, what happened, and how you'd like to feel.")
     print("The more you share, the better I can help you.\n")
     
+    preload_workflow()
     user_input = input("💭 Tell me what you feel now:\n> ")
     print()
     
@@ -53,7 +103,8 @@ def main():
     print("=" * 60)
     print()
     
-    workflow = create_soulsync_workflow()
+    thread_id = new_thread_id()
+    print(f"🧾 Run id: {thread_id} (resume with --resume if anything fails)\n")
     
     initial_state = {
         "user_input": user_input,
@@ -68,52 +119,214 @@ def main():
         "errors": []
     }
     
-    try:
-        result = workflow.invoke(initial_state)
-        
-        # Display results
-        print("\n" + "=" * 60)
-        print("✨ Your Personalized Therapeutic Playlist")
-        print("=" * 60)
-        print()
+    run_async(run_workflow(initial_state, thread_id, args, spotify_client))
+
+
+def preload_workflow():
+    """
+    Import LangGraph, LangChain and the agents on a background thread
+    
+    Nothing heavy is imported at startup; this overlaps the remaining
+    imports with the time the user spends typing. Failures are ignored
+    here and surface normally when the workflow is built.
+    """
+    
+    def load():
+        for module in WORKFLOW_MODULES:
+            try:
+                importlib.import_module(module)
+            except Exception:
+                pass
+    
+    threading.Thread(target=load, name="soulsync-preload", daemon=True).start()
+
+
+async def run_workflow(initial_state, thread_id, args, spotify_client):
+    """
+    Run the graph on the event loop, checkpointing every step
+    
+    The run is streamed so each stage is shown as soon as it finishes
+    (emotion analysis, taste DNA, the ranked journey) and songs appear one
+    by one while they are resolved on Spotify, instead of everything at
+    the end.
+    """
+    
+    from workflows.soulsync_graph import create_soulsync_workflow
+    
+    async with get_async_checkpointer() as checkpointer:
+        workflow = create_soulsync_workflow(checkpointer=checkpointer)
+        # Reuse the client authenticated above for every node
+        config = run_config(thread_id, spotify_client)
         
-        display_results(result)
+        try:
+            with tracing.span("workflow", kind="workflow") as run_span:
+                async for mode, chunk in workflow.astream(
+                    initial_state, config=config, stream_mode=["updates", "custom"]
+                ):
+                    if mode == "custom":
+                        display_resolved_track(chunk)
+                    else:
+                        for update in chunk.values():
+                            display_stage(update)
+                
+                result = (await workflow.aget_state(config)).values
+            
+            show_summary(result, args, run_span)
+            
+            if result.get("errors"):
+                print(f"\n⚠️  Some steps failed. Run `python main.py --resume {thread_id}` to retry them "
+                      f"without redoing the completed ones.")
+            
+        except Exception as e:
+            print(f"❌ An error occurred: {e}")
+            print(f"   Run `python main.py --resume {thread_id}` to continue from the last completed step.")
+            import traceback
+            traceback.print_exc()
+
+
+async def resume_run(args, spotify_client):
+    """Continue a checkpointed run instead of starting a new one"""
+    
+    thread_id = last_thread_id() if args.resume == "last" else args.resume
+    if not thread_id:
+        print("❌ No previous run to resume.")
+        return
+    
+    print("=" * 60)
+    print(f"🔁 Resuming run {thread_id}")
+    print("=" * 60)
+    print()
+    
+    from workflows.soulsync_graph import create_soulsync_workflow
+    
+    async with get_async_checkpointer() as checkpointer:
+        workflow = create_soulsync_workflow(checkpointer=checkpointer)
         
-    except Exception as e:
-        print(f"❌ An error occurred: {e}")
-        import traceback
-        traceback.print_exc()
+        try:
+            with tracing.span("workflow", kind="workflow") as run_span:
+                result = await aresume_workflow(workflow, run_config(thread_id, spotify_client))
+            
+            show_run(result, args, run_span)
+            
+        except Exception as e:
+            print(f"❌ An error occurred: {e}")
+            import traceback
+            traceback.print_exc()
+
+
+def show_run(result, args, run_span):
+    """Results, token usage and (with --profile) the latency report"""
+    
+    print("\n" + "=" * 60)
+    print("✨ Your Personalized Therapeutic Playlist")
+    print("=" * 60)
+    print()
+    
+    display_results(result)
+    show_summary(result, args, run_span, playlist=False)
+
+
+def show_summary(result, args, run_span, playlist=True):
+    """What's left after a streamed run: playlist link, token usage, latency report"""
+    
+    if playlist:
+        print()
+        display_playlist(result)
+    display_token_usage()
+    
+    if args.profile:
+        print()
+        print(tracing.format_report(run_span.trace_id))
+    tracing.tracer.discard(run_span.trace_id)
+
+
+def display_stage(update):
+    """Show a node's result as soon as the stream delivers it (errors are printed by the nodes)"""
+    
+    if not update:
+        return
+    
+    if update.get("emotion_analysis"):
+        print()
+        display_emotion(update["emotion_analysis"])
+    elif update.get("taste_profile"):
+        print()
+        display_taste(update["taste_profile"])
+    elif update.get("ranked_recommendations"):
+        print()
+        display_recommendations(update["ranked_recommendations"])
+        print("🎧 Finding your songs on Spotify...")
+
+
+def display_resolved_track(event):
+    """One song found on Spotify, streamed while the rest are still resolving"""
+    track = event.get("resolved_track")
+    if track:
+        print(f"   🎶 {track['track_name']} - {track['artist']}  {track.get('external_url') or ''}".rstrip())
 
 
 def display_results(result):
     """Display final results to user"""
     
-    # Show emotion analysis
-    emotion = result["emotion_analysis"]
+    display_emotion(result["emotion_analysis"])
+    display_recommendations(result["ranked_recommendations"])
+    display_playlist(result)
+
+
+def display_emotion(emotion):
     print(f"🎭 Emotional Analysis:")
     print(f"   Primary emotion: {emotion.get('primary_emotion', 'N/A')}")
     print(f"   Intensity: {emotion.get('intensity', 'N/A')}/10")
     print(f"   Desired outcome: {emotion.get('desired_outcome', 'N/A')}")
     print()
-    
-    # Show recommendations
-    print(f"🎵 Your Therapeutic Journey ({len(result['ranked_recommendations'])} songs):")
+
+
+def display_taste(taste):
+    print(f"🧬 Your Music Taste DNA:")
+    print(f"   Genre clusters: {', '.join(taste.get('genre_clusters', [])) or 'N/A'}")
+    print(f"   Personality: {', '.join(taste.get('personality_traits', [])) or 'N/A'}")
+    print(f"   Comfort zone: {taste.get('comfort_zone_description', 'N/A')}")
+    print()
+
+
+def display_recommendations(recommendations):
+    print(f"🎵 Your Therapeutic Journey ({len(recommendations)} songs):")
     print()
     
-    for i, rec in enumerate(result["ranked_recommendations"], 1):
+    for i, rec in enumerate(recommendations, 1):
         print(f"{i}. {rec['track_name']} - {rec['artist']}")
         print(f"   💡 {rec['therapeutic_reason']}")
         print(f"   ✨ Discovery Score: {'🌟' * int(rec['discovery_score'] * 5)}")
         print(f"   🎭 Journey Stage: {rec['progression_stage']}/10")
         print()
-    
-    # Show playlist
-    if result["playlist_url"]:
+
+
+def display_playlist(result):
+    if result.get("playlist_url"):
         print("=" * 60)
         print(f"🎧 Your playlist is ready!")
         print(f"   {result['playlist_url']}")
         print("=" * 60)
 
 
+def display_token_usage():
+    """Prompt/completion tokens spent by each workflow stage, and provider latency"""
+    from services.llm_service import get_llm_usage_by_node, get_llm_latency_by_provider
+    
+    usage = get_llm_usage_by_node()
+    if not usage:
+        return
+    
+    print()
+    print("🧮 Token usage by stage:")
+    for node, entry in usage.items():
+        print(f"   {node}: {entry['input_tokens']} prompt / {entry['output_tokens']} completion "
+              f"({entry['calls']} calls)")
+    
+    for provider, latency in get_llm_latency_by_provider().items():
+        print(f"   ⏱️  {provider}: p50 {latency['p50']:.2f}s / p90 {latency['p90']:.2f}s / "
+              f"p99 {latency['p99']:.2f}s ({latency['samples']} calls)")
+
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
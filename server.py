@@ -0,0 +1,155 @@
+import asyncio
+
+from flask import Flask, jsonify, request, url_for
+from flask_cors import CORS
+
+from auth.spotify_auth import get_client_for_token
+from config.settings import (
+    API_HOST,
+    API_PORT,
+    API_MAX_CONCURRENT_SESSIONS,
+    API_MAX_WORKERS,
+    API_MAX_QUEUED_JOBS,
+    API_JOB_TTL_SECONDS,
+)
+from services.job_manager import JobManager, QueueFullError
+from services.spotify_service import fetch_user_profile
+from workflows.soulsync_graph import create_soulsync_workflow
+
+# State keys returned to API clients (the raw Spotify profile stays server-side)
+RESULT_KEYS = (
+    "emotion_analysis",
+    "taste_profile",
+    "ranked_recommendations",
+    "spotify_tracks",
+    "playlist_url",
+    "errors",
+)
+
+
+def create_app():
+    """
+    SoulSync HTTP API
+    
+    The workflow graph is compiled once here and shared by every job; each
+    request brings its own Spotify access token. Sessions run through
+    `workflow.ainvoke` as tasks on one background event loop, so waiting on
+    the LLM or Spotify doesn't hold a thread; concurrency and the queue in
+    front of it are both bounded.
+    
+    Endpoints:
+        POST /api/sessions             start a session, returns 202 + job id
+        GET  /api/jobs/<job_id>        job status
+        GET  /api/jobs/<job_id>/result job result once finished
+        GET  /api/health               queue and worker stats
+    """
+    app = Flask(__name__)
+    CORS(app)
+    
+    workflow = create_soulsync_workflow()
+    
+    async def run_session(payload):
+        spotify_client = get_client_for_token(
+            payload["spotify_access_token"],
+            refresh_token=payload.get("spotify_refresh_token"),
+            expires_in=payload.get("expires_in", 3600)
+        )
+        # spotipy is synchronous; the profile fetch runs on the job executor
+        user_profile = await asyncio.to_thread(fetch_user_profile, spotify_client, incremental=True)
+        
+        initial_state = {
+            "user_input": payload["user_input"],
+            "user_id": user_profile["user_id"],
+            "spotify_profile": user_profile,
+            "emotion_analysis": {},
+            "taste_profile": {},
+            "universe_candidates": [],
+            "ranked_recommendations": [],
+            "spotify_tracks": [],
+            "playlist_url": "",
+            "errors": []
+        }
+        
+        result = await workflow.ainvoke(
+            initial_state,
+            config={"configurable": {"spotify_client": spotify_client}}
+        )
+        return {key: result.get(key) for key in RESULT_KEYS}
+    
+    jobs = JobManager(
+        run_session,
+        max_workers=API_MAX_CONCURRENT_SESSIONS,
+        max_queued=API_MAX_QUEUED_JOBS,
+        job_ttl=API_JOB_TTL_SECONDS,
+        executor_workers=API_MAX_WORKERS
+    )
+    app.config["JOB_MANAGER"] = jobs
+    
+    @app.post("/api/sessions")
+    def start_session():
+        body = request.get_json(silent=True) or {}
+        user_input = (body.get("user_input") or "").strip()
+        token = body.get("spotify_access_token") or _bearer_token()
+        
+        if not user_input:
+            return jsonify({"error": "user_input is required"}), 400
+        if not token:
+            return jsonify({"error": "A Spotify access token is required"}), 401
+        
+        try:
+            job_id = jobs.submit({
+                "user_input": user_input,
+                "spotify_access_token": token,
+                "spotify_refresh_token": body.get("spotify_refresh_token"),
+                "expires_in": body.get("expires_in", 3600),
+            })
+        except QueueFullError as e:
+            response = jsonify({"error": str(e)})
+            response.headers["Retry-After"] = "5"
+            return response, 503
+        
+        return jsonify({
+            "job_id": job_id,
+            "status": "queued",
+            "status_url": url_for("job_status", job_id=job_id),
+            "result_url": url_for("job_result", job_id=job_id),
+        }), 202
+    
+    @app.get("/api/jobs/<job_id>")
+    def job_status(job_id):
+        job = jobs.get(job_id)
+        if job is None:
+            return jsonify({"error": "Unknown job"}), 404
+        
+        job.pop("result")
+        return jsonify(job)
+    
+    @app.get("/api/jobs/<job_id>/result")
+    def job_result(job_id):
+        job = jobs.get(job_id)
+        if job is None:
+            return jsonify({"error": "Unknown job"}), 404
+        
+        if job["status"] in ("queued", "running"):
+            return jsonify({"job_id": job_id, "status": job["status"]}), 202
+        if job["status"] == "failed":
+            return jsonify({"job_id": job_id, "status": "failed", "error": job["error"]}), 500
+        return jsonify({"job_id": job_id, "status": "succeeded", "result": job["result"]})
+    
+    @app.get("/api/health")
+    def health():
+        return jsonify({"status": "ok", **jobs.stats()})
+    
+    return app
+
+
+def _bearer_token():
+    header = request.headers.get("Authorization", "")
+    if header.lower().startswith("bearer "):
+        return header[7:].strip()
+    return None
+
+
+if __name__ == "__main__":
+    # Threaded so status polls are served while workers are busy
+    create_app().run(host=API_HOST, port=API_PORT, threaded=True)
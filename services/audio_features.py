@@ -0,0 +1,133 @@
+import threading
+
+from services.cache import PersistentCache
+from services import tracing
+
+# Features kept per track and aggregated into the profile
+FEATURE_KEYS = ("tempo", "energy", "valence", "danceability", "acousticness", "instrumentalness")
+
+# Spotify's per-request maximum for /audio-features
+BATCH_SIZE = 100
+
+PERCENTILES = (10, 50, 90)
+
+# track_id -> {feature: value}, or {} when Spotify has no features for it.
+# Audio features never change, so entries don't expire.
+audio_feature_cache = PersistentCache("audio_features")
+
+# Set once Spotify refuses the endpoint (it is unavailable to newer apps)
+_endpoint_unavailable = threading.Event()
+
+
+def fetch_audio_features(spotify_client, track_ids):
+    """
+    Audio features for `track_ids`, from the cache or in batches of 100
+    
+    Only uncached ids are requested. A 403 from Spotify means the app has
+    no access to the endpoint: it is reported once and later calls use
+    cached features only.
+    
+    Args:
+        spotify_client: Authenticated Spotify client
+        track_ids: Spotify track IDs (duplicates and None are ignored)
+    
+    Returns:
+        Dict of track_id -> {feature: value} for the tracks that have features
+    """
+    features = {}
+    missing = []
+    for track_id in dict.fromkeys(t for t in track_ids if t):
+        cached = audio_feature_cache.get(track_id)
+        if cached is None:
+            missing.append(track_id)
+        elif cached:
+            features[track_id] = cached
+    
+    if missing and not _endpoint_unavailable.is_set():
+        for start in range(0, len(missing), BATCH_SIZE):
+            batch = missing[start:start + BATCH_SIZE]
+            try:
+                with tracing.span("spotify.audio_features", kind="client", tracks=len(batch)):
+                    results = spotify_client.audio_features(batch)
+            except Exception as e:
+                if getattr(e, "http_status", None) == 403:
+                    _endpoint_unavailable.set()
+                    print("   ✗ Spotify audio features are not available to this app; continuing without them")
+                else:
+                    print(f"   ✗ Could not fetch audio features: {e}")
+                break
+            
+            for track_id, result in zip(batch, results or []):
+                values = {key: result[key] for key in FEATURE_KEYS if result and result.get(key) is not None}
+                audio_feature_cache.set(track_id, values)
+                if values:
+                    features[track_id] = values
+    
+    return features
+
+
+def summarize_audio_features(features):
+    """
+    Aggregate per-track features into the profile's sonic summary
+    
+    All tracks are stacked into one matrix and reduced column-wise.
+    
+    Returns:
+        {"track_count", "mean", "variance", "percentiles": {"p10", "p50", "p90"}},
+        each a {feature: value} dict; {} when there are no features
+    """
+    import numpy as np
+    
+    rows = [values for values in features.values() if all(key in values for key in FEATURE_KEYS)]
+    if not rows:
+        return {}
+    
+    matrix = np.array([[values[key] for key in FEATURE_KEYS] for values in rows], dtype=float)
+    
+    def by_feature(column):
+        return {key: round(float(value), 3) for key, value in zip(FEATURE_KEYS, column)}
+    
+    percentiles = np.percentile(matrix, PERCENTILES, axis=0)
+    return {
+        "track_count": len(rows),
+        "mean": by_feature(matrix.mean(axis=0)),
+        "variance": by_feature(matrix.var(axis=0)),
+        "percentiles": {f"p{q}": by_feature(row) for q, row in zip(PERCENTILES, percentiles)},
+    }
+
+
+def calculate_audio_profile(spotify_client, tracks):
+    """Sonic summary of a list of Spotify track dicts (e.g. the user's top tracks)"""
+    return summarize_audio_features(
+        fetch_audio_features(spotify_client, [track.get("id") for track in tracks])
+    )
+
+
+def describe_audio_profile(summary):
+    """One-line description of the average sound, for prompts and embeddings"""
+    if not summary:
+        return ""
+    mean = summary["mean"]
+    return (
+        f"{mean['tempo']:.0f} BPM, energy {mean['energy']:.2f}, valence {mean['valence']:.2f}, "
+        f"danceability {mean['danceability']:.2f}, acousticness {mean['acousticness']:.2f}, "
+        f"instrumentalness {mean['instrumentalness']:.2f}"
+    )
+
+
+def format_audio_profile(summary):
+    """Multi-line mean / spread / 10th-90th percentile block for the taste prompt"""
+    if not summary:
+        return "Not available"
+    
+    mean = summary["mean"]
+    variance = summary["variance"]
+    low = summary["percentiles"]["p10"]
+    high = summary["percentiles"]["p90"]
+    lines = [f"- Tempo: {mean['tempo']:.0f} BPM on average (most between {low['tempo']:.0f} and {high['tempo']:.0f})"]
+    for key in FEATURE_KEYS[1:]:
+        lines.append(
+            f"- {key.capitalize()}: {mean[key]:.2f} (0-1 scale, variance {variance[key]:.3f}, "
+            f"range {low[key]:.2f}-{high[key]:.2f})"
+        )
+    return "\n        ".join(lines)
@@ -0,0 +1,185 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Optional
+
+from config.settings import CACHE_DIR
+
+# Access times of hits are buffered and written in one batch once this many
+# are pending or the oldest is this old; they only order LRU eviction
+ACCESS_FLUSH_BATCH = 64
+ACCESS_FLUSH_SECONDS = 30.0
+
+# Writes between size checks; the table may exceed max_entries by up to this
+EVICTION_CHECK_INTERVAL = 256
+
+
+class PersistentCache:
+    """
+    Small SQLite-backed key/value cache with TTL and LRU eviction
+    
+    Values are stored as JSON. Each namespace gets its own database file
+    under CACHE_DIR so caches can be inspected or wiped independently.
+    
+    Reads stay reads: the access times that order LRU eviction are buffered
+    and written in batches, and the size limit is only checked every
+    EVICTION_CHECK_INTERVAL writes.
+    
+    Args:
+        namespace: Name of the cache (also the database file name)
+        ttl_seconds: Entries older than this are treated as misses (None = never expire)
+        max_entries: Least recently used entries are evicted past this size (None = unbounded)
+        path: Override the database location
+    """
+    
+    def __init__(self, namespace: str, ttl_seconds: Optional[float] = None,
+                 max_entries: Optional[int] = None, path: Optional[str] = None):
+        self.namespace = namespace
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.path = path or os.path.join(CACHE_DIR, f"{namespace}.sqlite3")
+        self.hits = 0
+        self.misses = 0
+        
+        self._lock = threading.Lock()
+        self._conn = None
+        self._accessed = {}
+        self._accessed_since = None
+        # Check the size on the first write, in case the limit was lowered
+        self._writes_until_eviction_check = 1
+    
+    def get(self, key: str, default: Any = None) -> Any:
+        """Return the cached value for `key`, or `default` on a miss"""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT value, created_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            
+            if row is None or self._expired(row[1], now):
+                if row is not None:
+                    conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                    conn.commit()
+                self.misses += 1
+                return default
+            
+            if self.max_entries is not None:
+                self._touch(key, now)
+            self.hits += 1
+            return json.loads(row[0])
+    
+    def peek(self, key: str, default: Any = None) -> Any:
+        """Like get(), but leaves hit/miss counters and LRU order untouched"""
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT value, created_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or self._expired(row[1], time.time()):
+            return default
+        return json.loads(row[0])
+    
+    def set(self, key: str, value: Any):
+        """Store `value` under `key`, evicting LRU entries if over capacity"""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now)
+            )
+            self._accessed.pop(key, None)
+            if self.max_entries is not None:
+                self._writes_until_eviction_check -= 1
+                if self._writes_until_eviction_check <= 0:
+                    self._writes_until_eviction_check = EVICTION_CHECK_INTERVAL
+                    self._evict(conn)
+            conn.commit()
+    
+    def delete(self, key: str):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            conn.commit()
+    
+    def clear(self):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM entries")
+            conn.commit()
+            self._accessed = {}
+            self._accessed_since = None
+            self.hits = 0
+            self.misses = 0
+    
+    def stats(self) -> dict:
+        """Hit/miss counters and current size, for sizing the cache"""
+        with self._lock:
+            size = self._connect().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "namespace": self.namespace,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": size,
+            "max_entries": self.max_entries,
+        }
+    
+    def _touch(self, key, now):
+        """Buffer a hit's access time; flush the buffer when it is full or old"""
+        self._accessed[key] = now
+        if self._accessed_since is None:
+            self._accessed_since = now
+        if len(self._accessed) >= ACCESS_FLUSH_BATCH or now - self._accessed_since >= ACCESS_FLUSH_SECONDS:
+            self._flush_accessed(self._conn)
+            self._conn.commit()
+    
+    def _flush_accessed(self, conn):
+        if self._accessed:
+            conn.executemany(
+                "UPDATE entries SET accessed_at = ? WHERE key = ?",
+                [(accessed_at, key) for key, accessed_at in self._accessed.items()]
+            )
+        self._accessed = {}
+        self._accessed_since = None
+    
+    def _evict(self, conn):
+        """Drop least recently used entries past max_entries (caller commits)"""
+        size = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        if size <= self.max_entries:
+            return
+        self._flush_accessed(conn)
+        conn.execute(
+            "DELETE FROM entries WHERE key IN ("
+            "  SELECT key FROM entries ORDER BY accessed_at ASC LIMIT ?"
+            ")",
+            (size - self.max_entries,)
+        )
+    
+    def _expired(self, created_at, now):
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+    
+    def _connect(self):
+        # Opened lazily so importing a module that declares a cache never touches disk
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "  key TEXT PRIMARY KEY,"
+                "  value TEXT NOT NULL,"
+                "  created_at REAL NOT NULL,"
+                "  accessed_at REAL NOT NULL"
+                ")"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)"
+            )
+            self._conn.commit()
+        return self._conn
@@ -0,0 +1,39 @@
+import threading
+
+from config.settings import EMBEDDING_MODEL
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_embedding_model():
+    """
+    Process-wide SentenceTransformer, loaded on first use
+    
+    Loading the model takes seconds, so it is shared by every caller.
+    """
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                from sentence_transformers import SentenceTransformer
+                _model = SentenceTransformer(EMBEDDING_MODEL)
+    return _model
+
+
+def embed_texts(texts):
+    """
+    Embed a batch of texts in one forward pass
+    
+    Returns:
+        numpy array of shape (len(texts), dim) with L2-normalized rows,
+        so a dot product is the cosine similarity
+    """
+    model = get_embedding_model()
+    return model.encode(
+        list(texts),
+        batch_size=64,
+        convert_to_numpy=True,
+        normalize_embeddings=True,
+        show_progress_bar=False
+    )
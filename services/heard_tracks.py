@@ -0,0 +1,106 @@
+import hashlib
+import unicodedata
+
+from config.settings import HEARD_TRACKS_MAX_PER_USER
+from services.cache import PersistentCache
+from services.track_matching import artist_key, normalize_title
+
+# user_id -> 64-bit hashes of every track seen in their profile fetches, oldest first
+heard_tracks_cache = PersistentCache("heard_tracks")
+
+
+class HeardTracks:
+    """
+    Tracks a user has already heard, as a set of 64-bit hashes
+    
+    A track is represented by the hash of its normalized "title|artist"
+    and, when known, of its Spotify ID, so a recommendation matches whether
+    it comes with an ID or only a name. Hashes keep the index to a few
+    bytes per track; collisions are negligible at a few thousand entries.
+    """
+    
+    def __init__(self, hashes=()):
+        self._hashes = set(hashes)
+    
+    def __len__(self):
+        return len(self._hashes)
+    
+    def __contains__(self, track):
+        return any(h in self._hashes for h in track_hashes(track))
+    
+    def add(self, track):
+        self._hashes.update(track_hashes(track))
+    
+    def filter(self, candidates):
+        """Candidates the user hasn't heard, in their original order"""
+        return [c for c in candidates if c not in self]
+
+
+def track_hashes(track):
+    """
+    Hashes identifying a track
+    
+    Accepts profile tracks ({"name", "artist", "id"}) as well as
+    recommendations and resolved tracks ({"track_name", "artist", "spotify_id"}).
+    """
+    hashes = []
+    title = track.get("track_name") or track.get("name")
+    artist = track.get("artist")
+    if title and artist:
+        hashes.append(_hash(f"t:{_fold(normalize_title(title))}|{_fold(artist_key(artist))}"))
+    spotify_id = track.get("spotify_id") or track.get("id")
+    if spotify_id:
+        hashes.append(_hash(f"id:{spotify_id}"))
+    return hashes
+
+
+def profile_tracks(profile):
+    """Every track in a Spotify profile the user is known to have heard"""
+    return list(profile.get("top_tracks", [])) + list(profile.get("recent_tracks", []))
+
+
+def remember_heard_tracks(user_id, tracks):
+    """
+    Add tracks from a profile fetch to the user's persistent index
+    
+    Only new hashes are appended; past HEARD_TRACKS_MAX_PER_USER the oldest
+    entries are dropped.
+    
+    Returns:
+        Number of hashes added
+    """
+    stored = heard_tracks_cache.get(user_id) or []
+    known = set(stored)
+    added = []
+    for track in tracks:
+        for h in track_hashes(track):
+            if h not in known:
+                known.add(h)
+                added.append(h)
+    
+    if added:
+        heard_tracks_cache.set(user_id, (stored + added)[-HEARD_TRACKS_MAX_PER_USER:])
+    return len(added)
+
+
+def heard_tracks_for(user_id, profile=None):
+    """
+    The user's heard-tracks index
+    
+    The persistent index is merged with the tracks of `profile`, so
+    profiles that never went through fetch_user_profile (batch mode) are
+    covered too.
+    """
+    heard = HeardTracks(heard_tracks_cache.get(user_id) or [])
+    for track in profile_tracks(profile or {}):
+        heard.add(track)
+    return heard
+
+
+def _fold(text):
+    """Drop accents, so Beyoncé on Spotify matches Beyonce from the LLM"""
+    return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+
+
+def _hash(text):
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big")
@@ -0,0 +1,53 @@
+import asyncio
+import threading
+import weakref
+
+# event loop -> {name: httpx.AsyncClient}; async clients can't be shared across loops
+_async_clients = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+def get_async_http_client(name, max_connections=16, timeout=10):
+    """
+    Keep-alive httpx.AsyncClient for one upstream API, pooled per event loop
+    
+    Every coroutine on the loop that talks to `name` shares the client and
+    its connection pool, like the requests.Session used by the sync path.
+    Loops started with run_async close their clients on the way out.
+    """
+    import httpx
+    
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _async_clients.setdefault(loop, {})
+        client = clients.get(name)
+        if client is None:
+            client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=max_connections
+                ),
+                timeout=timeout
+            )
+            clients[name] = client
+    return client
+
+
+async def aclose_async_http_clients():
+    """Close the running loop's pooled clients; call before the loop shuts down"""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _async_clients.pop(loop, {})
+    await asyncio.gather(*(client.aclose() for client in clients.values()), return_exceptions=True)
+
+
+def run_async(coro):
+    """asyncio.run that closes the loop's pooled HTTP clients before the loop ends"""
+    
+    async def run_then_close():
+        try:
+            return await coro
+        finally:
+            await aclose_async_http_clients()
+    
+    return asyncio.run(run_then_close())
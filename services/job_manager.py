@@ -0,0 +1,162 @@
+import asyncio
+import inspect
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from services.http_pool import aclose_async_http_clients
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue is at capacity (caller should retry later)"""
+
+
+class JobManager:
+    """
+    Bounded worker pool with a bounded queue in front of it
+    
+    At most `max_workers` jobs run at once and at most `max_queued` more
+    wait; beyond that submit() raises QueueFullError so the API can answer
+    503 instead of piling up work. Finished jobs are kept for `job_ttl`
+    seconds so clients can poll for their results.
+    
+    When `run_job` is a coroutine function, jobs run as tasks on one
+    background event loop instead of one thread each, so `max_workers`
+    can be in the hundreds; the loop's default executor gets
+    `executor_workers` threads for whatever blocking work jobs offload.
+    
+    Args:
+        run_job: Callable (or coroutine function) taking the job payload and returning its result
+        max_workers: Concurrent jobs
+        max_queued: Jobs allowed to wait for a worker
+        job_ttl: Seconds a finished job stays retrievable
+        executor_workers: Threads for asyncio.to_thread in async mode
+    """
+    
+    def __init__(self, run_job, max_workers, max_queued, job_ttl, executor_workers=None):
+        self.run_job = run_job
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.job_ttl = job_ttl
+        
+        self._capacity = threading.BoundedSemaphore(max_workers + max_queued)
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._is_async = inspect.iscoroutinefunction(run_job)
+        
+        if self._is_async:
+            self._loop = asyncio.new_event_loop()
+            self._loop.set_default_executor(
+                ThreadPoolExecutor(max_workers=executor_workers, thread_name_prefix="soulsync-io")
+            )
+            self._slots = asyncio.Semaphore(max_workers)
+            self._pending = set()
+            self._loop_thread = threading.Thread(
+                target=self._loop.run_forever, name="soulsync-loop", daemon=True
+            )
+            self._loop_thread.start()
+        else:
+            self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="soulsync-job")
+    
+    def submit(self, payload):
+        """Queue a job; returns its id or raises QueueFullError"""
+        if not self._capacity.acquire(blocking=False):
+            raise QueueFullError("SoulSync is at capacity, please retry shortly")
+        
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._prune()
+            self._jobs[job_id] = {
+                "job_id": job_id,
+                "status": "queued",
+                "submitted_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "result": None,
+                "error": None,
+            }
+        
+        try:
+            if self._is_async:
+                future = asyncio.run_coroutine_threadsafe(self._arun(job_id, payload), self._loop)
+                with self._lock:
+                    self._pending.add(future)
+                future.add_done_callback(self._forget)
+            else:
+                self._pool.submit(self._run, job_id, payload)
+        except Exception:
+            self._capacity.release()
+            raise
+        return job_id
+    
+    def get(self, job_id):
+        """Snapshot of a job, or None if unknown/expired"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+    
+    def stats(self):
+        with self._lock:
+            statuses = [job["status"] for job in self._jobs.values()]
+        return {
+            "queued": statuses.count("queued"),
+            "running": statuses.count("running"),
+            "max_workers": self.max_workers,
+            "max_queued": self.max_queued,
+        }
+    
+    def shutdown(self, wait=True):
+        if not self._is_async:
+            self._pool.shutdown(wait=wait)
+            return
+        
+        if wait:
+            with self._lock:
+                pending = list(self._pending)
+            for future in pending:
+                future.exception()
+            asyncio.run_coroutine_threadsafe(aclose_async_http_clients(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        if wait:
+            self._loop_thread.join()
+    
+    def _run(self, job_id, payload):
+        self._update(job_id, status="running", started_at=time.time())
+        try:
+            result = self.run_job(payload)
+            self._update(job_id, status="succeeded", result=result, finished_at=time.time())
+        except Exception as e:
+            self._update(job_id, status="failed", error=str(e), finished_at=time.time())
+        finally:
+            self._capacity.release()
+    
+    async def _arun(self, job_id, payload):
+        try:
+            async with self._slots:
+                self._update(job_id, status="running", started_at=time.time())
+                try:
+                    result = await self.run_job(payload)
+                    self._update(job_id, status="succeeded", result=result, finished_at=time.time())
+                except Exception as e:
+                    self._update(job_id, status="failed", error=str(e), finished_at=time.time())
+        finally:
+            self._capacity.release()
+    
+    def _forget(self, future):
+        with self._lock:
+            self._pending.discard(future)
+    
+    def _update(self, job_id, **fields):
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields)
+    
+    def _prune(self):
+        cutoff = time.time() - self.job_ttl
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job["finished_at"] is not None and job["finished_at"] < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
@@ -1,34 +1,217 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+import weakref
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 
+from langchain_core.language_models import LanguageModelInput
+from langchain_core.messages import BaseMessage
+from langchain_core.runnables import Runnable
+from langchain_core.runnables.config import ensure_config
+
+from services.tracing import record as record_trace, span as trace_span, submit as trace_submit, tracer
 from config.settings import (
     LLM_PROVIDER,
     OPENAI_API_KEY,
     GOOGLE_API_KEY,
+    LLM_PROVIDER_MAX_CONCURRENCY,
+    LLM_TIMEOUT_SECONDS,
+    LLM_MODEL_TIERS,
+    AGENT_MODEL_TIERS,
+    LLM_SECONDARY_PROVIDER,
+    LLM_HEDGE_PERCENTILE,
+    LLM_HEDGE_MIN_SAMPLES,
+    LLM_HEDGE_DEFAULT_DELAY_SECONDS,
 )
 
+SUPPORTED_PROVIDERS = ("openai", "google")
+
+
+# One pooled client per (provider, model, temperature), shared process-wide
+_clients = {}
+_clients_lock = threading.Lock()
+
 
-def get_llm(temperature=0.7, model=None):
+class CallSlots:
+    """
+    Counting semaphore shared by threads and every event loop in the process
+    
+    Sync callers use `with slots:`, coroutines `async with slots:`; both draw
+    on the same count, so the limit holds when the CLI/batch threads and the
+    JobManager's event loop run side by side. Waiters are served in order.
+    """
+    
+    def __init__(self, limit):
+        self._lock = threading.Lock()
+        self._free = limit
+        self._waiters = deque()
+    
+    def acquire(self):
+        with self._lock:
+            if self._free > 0 and not self._waiters:
+                self._free -= 1
+                return
+            handed_over = threading.Event()
+            self._waiters.append(handed_over)
+        handed_over.wait()
+    
+    async def aacquire(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._free > 0 and not self._waiters:
+                self._free -= 1
+                return
+            waiter = (loop, loop.create_future())
+            self._waiters.append(waiter)
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            with self._lock:
+                waiting = waiter in self._waiters
+                if waiting:
+                    self._waiters.remove(waiter)
+            if not waiting:
+                # The slot was handed over as the task was cancelled; pass it on
+                self.release()
+            raise
+    
+    def release(self):
+        """Hand the slot to the oldest waiter, or return it to the pool"""
+        with self._lock:
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                if isinstance(waiter, threading.Event):
+                    waiter.set()
+                    return
+                loop, future = waiter
+                if not loop.is_closed():
+                    loop.call_soon_threadsafe(_wake, future)
+                    return
+            self._free += 1
+    
+    def __enter__(self):
+        self.acquire()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.release()
+    
+    async def __aenter__(self):
+        await self.aacquire()
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        self.release()
+
+
+def _wake(future):
+    # A cancelled waiter releases the slot itself (see CallSlots.aacquire)
+    if not future.done():
+        future.set_result(None)
+
+
+# Per-provider cap on in-flight LLM calls, across threads and event loops
+_call_slots = {provider: CallSlots(limit) for provider, limit in LLM_PROVIDER_MAX_CONCURRENCY.items()}
+
+_http_clients = None
+
+# Threads that carry the primary call of a hedged sync request
+_hedge_pool = ThreadPoolExecutor(
+    max_workers=sum(LLM_PROVIDER_MAX_CONCURRENCY.values()) * 2, thread_name_prefix="soulsync-hedge"
+)
+
+# Optional replacement for the provider builders, e.g. a scripted fake model
+# for offline benchmarks: factory(provider, model, temperature) -> chat model
+_chat_model_factory = None
+
+
+def get_llm(temperature=0.7, model=None, agent=None):
+    """
+    Return the shared chat model for an agent
+    
+    Routing:
+    - `agent` picks a model tier from AGENT_MODEL_TIERS (e.g. a fast model
+      for emotion analysis, a stronger one for discovery); without an agent
+      or an explicit `model` the "fast" tier is used.
+    - With LLM_SECONDARY_PROVIDER set, the result is a HedgedChatModel: a
+      call the primary hasn't answered within the primary provider's
+      rolling p90 latency is also sent to the secondary provider, and the
+      first answer wins.
+    
+    Clients are pooled per (provider, model, temperature) and wrapped in a
+    ManagedChatModel, which enforces the provider's concurrency limit,
+    coalesces identical in-flight requests and records latency/tokens.
+    """
     
     provider = LLM_PROVIDER.lower()
+    tier = AGENT_MODEL_TIERS.get(agent, "fast")
+    primary = _managed_client(provider, model or _tier_model(provider, tier), temperature)
     
-    if provider == "openai":
-        return _get_openai_llm(temperature, model)
-    elif provider == "google":
-        return _get_google_llm(temperature, model)
-    else:
+    secondary_provider = LLM_SECONDARY_PROVIDER.lower()
+    if not secondary_provider or secondary_provider == provider:
+        return primary
+    
+    key = ("hedged", primary.label, secondary_provider, tier, temperature)
+    with _clients_lock:
+        client = _clients.get(key)
+    if client is None:
+        secondary = _managed_client(secondary_provider, _tier_model(secondary_provider, tier), temperature)
+        with _clients_lock:
+            client = _clients.setdefault(key, HedgedChatModel(primary, secondary))
+    return client
+
+
+def _tier_model(provider, tier):
+    if provider not in SUPPORTED_PROVIDERS:
         raise ValueError(f"Unsupported LLM provider: {provider}. Use: openai, google")
+    return LLM_MODEL_TIERS.get(tier, LLM_MODEL_TIERS["fast"])[provider]
+
+
+def _managed_client(provider, model, temperature):
+    """Pooled ManagedChatModel for one (provider, model, temperature)"""
+    key = (provider, model, temperature)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            if _chat_model_factory is not None:
+                chat_model = _chat_model_factory(provider, model, temperature)
+            elif provider == "openai":
+                chat_model = _get_openai_llm(temperature, model)
+            else:
+                chat_model = _get_google_llm(temperature, model)
+            client = ManagedChatModel(chat_model, provider=provider, model=model)
+            _clients[key] = client
+    return client
+
+
+def set_chat_model_factory(factory):
+    """
+    Build chat models with `factory` instead of the provider SDKs
+    
+    Clears the client pool; pass None to go back to the real providers.
+    """
+    global _chat_model_factory
+    with _clients_lock:
+        _chat_model_factory = factory
+        _clients.clear()
 
 
 def _get_openai_llm(temperature, model):
     """OpenAI GPT models"""
     from langchain_openai import ChatOpenAI
     
-    if model is None:
-        model = "gpt-4o-mini"  # Cheaper default
+    http_client, http_async_client = _get_http_clients()
     
     return ChatOpenAI(
         model=model,
         temperature=temperature,
-        api_key=OPENAI_API_KEY
+        api_key=OPENAI_API_KEY,
+        http_client=http_client,
+        http_async_client=http_async_client,
+        stream_usage=True
     )
 
 def _get_google_llm(temperature, model):
@@ -37,12 +220,478 @@ def _get_google_llm(temperature, model):
     """
     from langchain_google_genai import ChatGoogleGenerativeAI
     
-    if model is None:
-        model = "models/gemini-2.5-flash"  # FREE and fast
-    
     return ChatGoogleGenerativeAI(
         model=model,
         temperature=temperature,
         google_api_key=GOOGLE_API_KEY,
         convert_system_message_to_human=True
-    )
\ No newline at end of file
+    )
+
+
+def _get_http_clients():
+    """Keep-alive httpx pools shared by every OpenAI client in the process"""
+    global _http_clients
+    if _http_clients is None:
+        import httpx
+        
+        concurrency = LLM_PROVIDER_MAX_CONCURRENCY["openai"]
+        limits = httpx.Limits(
+            max_connections=concurrency * 2,
+            max_keepalive_connections=concurrency,
+            keepalive_expiry=60
+        )
+        _http_clients = (
+            httpx.Client(limits=limits, timeout=LLM_TIMEOUT_SECONDS),
+            httpx.AsyncClient(limits=limits, timeout=LLM_TIMEOUT_SECONDS),
+        )
+    return _http_clients
+
+
+class LLMUsageStats:
+    """Per-client and per-graph-node call counts, latency and token accounting"""
+    
+    def __init__(self, window=200):
+        self._lock = threading.Lock()
+        self._window = window
+        self._stats = {}
+        self._by_node = {}
+        self._by_provider = {}
+    
+    def record(self, label, latency, input_tokens=0, output_tokens=0, error=False, node=None):
+        with self._lock:
+            entry = self._entry(label)
+            entry["calls"] += 1
+            entry["errors"] += int(error)
+            entry["total_latency"] += latency
+            entry["input_tokens"] += input_tokens
+            entry["output_tokens"] += output_tokens
+            if not error:
+                # Percentiles drive hedging, so only completed answers count
+                self._by_provider.setdefault(
+                    label.split(":", 1)[0], deque(maxlen=self._window)
+                ).append(latency)
+            
+            node_entry = self._by_node.setdefault(
+                node or "unknown",
+                {"calls": 0, "input_tokens": 0, "output_tokens": 0, "total_latency": 0.0}
+            )
+            node_entry["calls"] += 1
+            node_entry["input_tokens"] += input_tokens
+            node_entry["output_tokens"] += output_tokens
+            node_entry["total_latency"] += latency
+    
+    def latency_percentile(self, provider, q, min_samples=1):
+        """Rolling latency percentile of one provider; None with too few samples"""
+        with self._lock:
+            samples = sorted(self._by_provider.get(provider, ()))
+        if len(samples) < max(1, min_samples):
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+    
+    def snapshot_by_provider(self):
+        """Rolling p50/p90/p99 of successful calls per provider"""
+        with self._lock:
+            windows = {provider: sorted(latencies) for provider, latencies in self._by_provider.items()}
+        return {
+            provider: {
+                "samples": len(samples),
+                **{
+                    f"p{int(q * 100)}": samples[min(len(samples) - 1, int(q * len(samples)))]
+                    for q in (0.5, 0.9, 0.99)
+                },
+            }
+            for provider, samples in windows.items() if samples
+        }
+    
+    def record_coalesced(self, label):
+        with self._lock:
+            self._entry(label)["coalesced"] += 1
+    
+    def snapshot(self):
+        """Plain-dict copy of the counters, with mean latency per client"""
+        with self._lock:
+            return {
+                label: {
+                    "calls": entry["calls"],
+                    "errors": entry["errors"],
+                    "coalesced": entry["coalesced"],
+                    "input_tokens": entry["input_tokens"],
+                    "output_tokens": entry["output_tokens"],
+                    "total_latency": entry["total_latency"],
+                    "mean_latency": entry["total_latency"] / entry["calls"] if entry["calls"] else 0.0,
+                }
+                for label, entry in self._stats.items()
+            }
+    
+    def snapshot_by_node(self):
+        """Prompt/completion tokens and latency per workflow node"""
+        with self._lock:
+            return {node: dict(entry) for node, entry in self._by_node.items()}
+    
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+            self._by_node = {}
+            self._by_provider = {}
+    
+    def _entry(self, label):
+        if label not in self._stats:
+            self._stats[label] = {
+                "calls": 0, "errors": 0, "coalesced": 0,
+                "input_tokens": 0, "output_tokens": 0,
+                "total_latency": 0.0,
+            }
+        return self._stats[label]
+
+
+llm_usage = LLMUsageStats()
+
+
+def get_llm_usage():
+    """Snapshot of latency/token accounting for every pooled client"""
+    return llm_usage.snapshot()
+
+
+def get_llm_usage_by_node():
+    """Prompt and completion tokens per workflow node (e.g. 'discover_music')"""
+    return llm_usage.snapshot_by_node()
+
+
+def get_llm_latency_by_provider():
+    """Rolling latency percentiles per provider (what hedging decisions use)"""
+    return llm_usage.snapshot_by_provider()
+
+
+def reset_llm_usage():
+    llm_usage.reset()
+
+
+class ManagedChatModel(Runnable[LanguageModelInput, BaseMessage]):
+    """
+    Drop-in wrapper around a LangChain chat model
+    
+    Behaves like the wrapped model inside `prompt | llm | parser` chains,
+    and adds:
+    - the provider's concurrency limit (LLM_PROVIDER_MAX_CONCURRENCY)
+    - coalescing: identical requests already in flight share one call
+    - per-call latency and token accounting (see get_llm_usage)
+    
+    invoke_signalling/ainvoke_signalling also set an event once the call
+    holds a slot, so callers can time the call without its queueing.
+    """
+    
+    def __init__(self, chat_model, provider, model):
+        self.chat_model = chat_model
+        self.provider = provider
+        self.model = model
+        self.label = f"{provider}:{model}"
+        
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        self._async_inflight = weakref.WeakKeyDictionary()
+    
+    def __getattr__(self, name):
+        # Expose the wrapped model's attributes (model_name, temperature, ...)
+        chat_model = self.__dict__.get("chat_model")
+        if chat_model is None:
+            raise AttributeError(name)
+        return getattr(chat_model, name)
+    
+    def invoke(self, input, config=None, **kwargs):
+        return self.invoke_signalling(input, config, threading.Event(), **kwargs)
+    
+    async def ainvoke(self, input, config=None, **kwargs):
+        return await self.ainvoke_signalling(input, config, asyncio.Event(), **kwargs)
+    
+    def invoke_signalling(self, input, config, started, **kwargs):
+        """
+        invoke, setting the threading.Event `started` once the call holds a slot
+        
+        A coalesced request counts as started when the call it joined does.
+        `started` is also set if the call fails before getting a slot.
+        """
+        key = _request_key(input, kwargs)
+        
+        with self._inflight_lock:
+            inflight = self._inflight.get(key)
+            leader = inflight is None
+            if leader:
+                inflight = (Future(), started)
+                self._inflight[key] = inflight
+        future, leader_started = inflight
+        
+        if not leader:
+            llm_usage.record_coalesced(self.label)
+            record_trace("llm_coalesced")
+            leader_started.wait()
+            started.set()
+            return future.result()
+        
+        try:
+            result = self._call(input, config, started, **kwargs)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            started.set()
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+    
+    async def ainvoke_signalling(self, input, config, started, **kwargs):
+        """ainvoke, setting the asyncio.Event `started` once the call holds a slot"""
+        key = _request_key(input, kwargs)
+        loop = asyncio.get_running_loop()
+        inflight = self._async_inflight.setdefault(loop, {})
+        
+        if key in inflight:
+            future, leader_started = inflight[key]
+            llm_usage.record_coalesced(self.label)
+            record_trace("llm_coalesced")
+            await leader_started.wait()
+            started.set()
+            return await asyncio.shield(future)
+        
+        future = loop.create_future()
+        inflight[key] = (future, started)
+        try:
+            result = await self._acall(input, config, started, **kwargs)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            # Nobody else may be waiting; don't warn about an unretrieved exception
+            future.exception()
+            raise
+        finally:
+            started.set()
+            inflight.pop(key, None)
+    
+    def stream(self, input, config=None, **kwargs):
+        node = _node_of(config)
+        span = tracer.start_span("llm.stream", kind="client", provider=self.provider, model=self.model)
+        with _call_slots[self.provider]:
+            start = time.perf_counter()
+            usage = {}
+            content = []
+            try:
+                for chunk in self.chat_model.stream(input, config, **kwargs):
+                    _add_usage(usage, chunk)
+                    content.append(_text_of(chunk))
+                    yield chunk
+            except BaseException as e:
+                llm_usage.record(self.label, time.perf_counter() - start, error=True, node=node)
+                tracer.end_span(span, error=e)
+                raise
+            usage = usage or _estimate_usage(input, "".join(content))
+            llm_usage.record(self.label, time.perf_counter() - start, node=node, **usage)
+            _end_llm_span(span, usage)
+    
+    async def astream(self, input, config=None, **kwargs):
+        node = _node_of(config)
+        span = tracer.start_span("llm.stream", kind="client", provider=self.provider, model=self.model)
+        async with _call_slots[self.provider]:
+            start = time.perf_counter()
+            usage = {}
+            content = []
+            try:
+                async for chunk in self.chat_model.astream(input, config, **kwargs):
+                    _add_usage(usage, chunk)
+                    content.append(_text_of(chunk))
+                    yield chunk
+            except BaseException as e:
+                llm_usage.record(self.label, time.perf_counter() - start, error=True, node=node)
+                tracer.end_span(span, error=e)
+                raise
+            usage = usage or _estimate_usage(input, "".join(content))
+            llm_usage.record(self.label, time.perf_counter() - start, node=node, **usage)
+            _end_llm_span(span, usage)
+    
+    def _call(self, input, config, started, **kwargs):
+        node = _node_of(config)
+        with trace_span("llm.invoke", kind="client", provider=self.provider, model=self.model) as span:
+            with _call_slots[self.provider]:
+                started.set()
+                start = time.perf_counter()
+                try:
+                    result = self.chat_model.invoke(input, config, **kwargs)
+                except BaseException:
+                    llm_usage.record(self.label, time.perf_counter() - start, error=True, node=node)
+                    raise
+            usage = _usage_of(result) or _estimate_usage(input, _text_of(result))
+            llm_usage.record(self.label, time.perf_counter() - start, node=node, **usage)
+            _set_span_usage(span, usage)
+        return result
+    
+    async def _acall(self, input, config, started, **kwargs):
+        node = _node_of(config)
+        with trace_span("llm.invoke", kind="client", provider=self.provider, model=self.model) as span:
+            async with _call_slots[self.provider]:
+                started.set()
+                start = time.perf_counter()
+                try:
+                    result = await self.chat_model.ainvoke(input, config, **kwargs)
+                except BaseException:
+                    llm_usage.record(self.label, time.perf_counter() - start, error=True, node=node)
+                    raise
+            usage = _usage_of(result) or _estimate_usage(input, _text_of(result))
+            llm_usage.record(self.label, time.perf_counter() - start, node=node, **usage)
+            _set_span_usage(span, usage)
+        return result
+
+
+class HedgedChatModel(Runnable[LanguageModelInput, BaseMessage]):
+    """
+    Primary/secondary pair of ManagedChatModels with hedged requests
+    
+    A request goes to the primary. If no answer has arrived after the
+    primary provider's rolling LLM_HEDGE_PERCENTILE latency
+    (LLM_HEDGE_DEFAULT_DELAY_SECONDS until enough samples exist), or the primary fails, the same request is
+    sent to the secondary and whichever answers first is returned. Async
+    losers are cancelled; sync losers finish in the background.
+    
+    The hedge clock starts once the primary holds one of its provider's
+    slots: waiting in the primary's queue is not a sign of a slow answer,
+    and the secondary draws on its own provider's slots anyway.
+    
+    Streaming goes to the primary only.
+    """
+    
+    def __init__(self, primary, secondary):
+        self.primary = primary
+        self.secondary = secondary
+        self.label = f"{primary.label}|{secondary.label}"
+    
+    def __getattr__(self, name):
+        primary = self.__dict__.get("primary")
+        if primary is None:
+            raise AttributeError(name)
+        return getattr(primary, name)
+    
+    def hedge_delay(self):
+        """Seconds to wait for the primary before hedging"""
+        delay = llm_usage.latency_percentile(
+            self.primary.provider, LLM_HEDGE_PERCENTILE, min_samples=LLM_HEDGE_MIN_SAMPLES
+        )
+        return LLM_HEDGE_DEFAULT_DELAY_SECONDS if delay is None else delay
+    
+    def invoke(self, input, config=None, **kwargs):
+        started = threading.Event()
+        first = trace_submit(_hedge_pool, self.primary.invoke_signalling, input, config, started, **kwargs)
+        first.add_done_callback(lambda _: started.set())
+        started.wait()
+        wait([first], timeout=self.hedge_delay())
+        if first.done() and first.exception() is None:
+            return first.result()
+        
+        record_trace("llm_hedged")
+        pending = {first, trace_submit(_hedge_pool, self.secondary.invoke, input, config, **kwargs)}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = error or future.exception()
+        raise error
+    
+    async def ainvoke(self, input, config=None, **kwargs):
+        started = asyncio.Event()
+        first = asyncio.ensure_future(self.primary.ainvoke_signalling(input, config, started, **kwargs))
+        first.add_done_callback(lambda _: started.set())
+        try:
+            await started.wait()
+        except BaseException:
+            first.cancel()
+            raise
+        await asyncio.wait({first}, timeout=self.hedge_delay())
+        if first.done() and first.exception() is None:
+            return first.result()
+        
+        record_trace("llm_hedged")
+        pending = {first, asyncio.ensure_future(self.secondary.ainvoke(input, config, **kwargs))}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+    
+    def stream(self, input, config=None, **kwargs):
+        yield from self.primary.stream(input, config, **kwargs)
+    
+    async def astream(self, input, config=None, **kwargs):
+        async for chunk in self.primary.astream(input, config, **kwargs):
+            yield chunk
+
+
+def _messages_of(input):
+    if hasattr(input, "to_messages"):
+        return input.to_messages()
+    if isinstance(input, str):
+        return [input]
+    return list(input)
+
+
+def _request_key(input, kwargs):
+    """Hash of the rendered messages and call options, for coalescing"""
+    payload = [
+        (getattr(m, "type", None), getattr(m, "content", m))
+        for m in _messages_of(input)
+    ]
+    raw = json.dumps([payload, kwargs], default=str, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _node_of(config):
+    """Name of the LangGraph node this call runs under, if any"""
+    return ensure_config(config).get("metadata", {}).get("langgraph_node")
+
+
+def _text_of(message):
+    content = getattr(message, "content", message)
+    return content if isinstance(content, str) else json.dumps(content, default=str)
+
+
+def _usage_of(message):
+    """Provider-reported token usage; empty when the provider sent none"""
+    usage = getattr(message, "usage_metadata", None)
+    if not usage:
+        return {}
+    return {
+        "input_tokens": usage.get("input_tokens", 0),
+        "output_tokens": usage.get("output_tokens", 0),
+    }
+
+
+def _estimate_usage(input, output_text):
+    """tiktoken estimate for providers that don't report usage"""
+    from services.prompt_budget import count_tokens
+    
+    prompt_text = "\n".join(_text_of(m) for m in _messages_of(input))
+    return {
+        "input_tokens": count_tokens(prompt_text),
+        "output_tokens": count_tokens(output_text),
+    }
+
+
+def _set_span_usage(span, usage):
+    span.set("input_tokens", usage.get("input_tokens", 0))
+    span.set("output_tokens", usage.get("output_tokens", 0))
+
+
+def _end_llm_span(span, usage):
+    _set_span_usage(span, usage)
+    tracer.end_span(span)
+
+
+def _add_usage(totals, chunk):
+    for name, value in _usage_of(chunk).items():
+        totals[name] = totals.get(name, 0) + value
@@ -1,58 +1,129 @@
+import asyncio
 import requests
-from typing import Optional, Dict
-from config.settings import GENIUS_ACCESS_TOKEN
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from typing import Optional, Dict, List
+from config.settings import (
+    GENIUS_ACCESS_TOKEN,
+    GENIUS_API_BASE_URL,
+    GENIUS_MAX_WORKERS,
+    LYRICS_CACHE_TTL_DAYS,
+)
+from services.cache import PersistentCache
+from services.http_pool import get_async_http_client
+from services import tracing
+
+# Normalized (title, artist) -> lyrics_context (including Genius ID)
+lyrics_cache = PersistentCache(
+    "genius_lyrics",
+    ttl_seconds=LYRICS_CACHE_TTL_DAYS * 24 * 3600
+)
+
+NO_LYRICS_CONTEXT = {
+    "genius_id": None,
+    "song_meaning": "No lyrics context available",
+    "themes": [],
+    "genius_url": ""
+}
+
+_session = None
+
+
+def get_genius_session() -> requests.Session:
+    """Process-wide keep-alive session sized for the enrichment worker pool"""
+    global _session
+    if _session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=GENIUS_MAX_WORKERS)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _session = session
+    return _session
+
 
 class LyricsService:
     """fetches lyrics and song meanings from Genius API"""
-    def __init__(self):
-        self.base_url = "https://api.genius.com"
+    def __init__(self, session: Optional[requests.Session] = None):
+        self.base_url = GENIUS_API_BASE_URL
         self.headers = {
             "Authorization": f"Bearer {GENIUS_ACCESS_TOKEN}"
         }
+        self.session = session or get_genius_session()
     def search_song(self, track_name:str, artist_name: str) -> Optional[Dict]:
         try:
-            search_url = f"{self.base_url}/search"
-            params = {"q": f"{track_name} {artist_name}"}
-            response = requests.get(search_url, headers=self.headers, params=params)
-            response.raise_for_status()
-            results = response.json()["response"]["hits"]
-            if results:
-                song = results[0]["result"]
-                return {
-                    "genius_id": song["id"],
-                    "title": song["title"],
-                    "artist": song["primary_artist"]["name"],
-                    "url": song["url"],
-                    "annotation_count": song.get("annotation_count", 0),
-                    "description": song.get("description", {}).get("plain", "")
-                }
+            return self._search(track_name, artist_name)
         except Exception as e:
             print(f"Error searching song on Genius: {e}")
             return None
     def get_song_details(self, genius_id: int) -> Optional[Dict]:
         try:
-            song_url = f"{self.base_url}/songs/{genius_id}"
-            response = requests.get(song_url, headers=self.headers)
-            response.raise_for_status()
-            song = response.json()["response"]["song"]
-            return {
-                "genius_id": song["id"],
-                "title": song["title"],
-                "artist": song["primary_artist"]["name"],
-                "url": song["url"],
-                "annotation_count": song.get("annotation_count", 0),
-                "description": song.get("description", {}).get("plain", "")
-            }
+            return self._details(genius_id)
         except Exception as e:
             print(f"Error fetching song details from Genius: {e}")
             return None
+    def _search(self, track_name: str, artist_name: str) -> Optional[Dict]:
+        """Search without swallowing errors; None only when Genius has no hit"""
+        search_url = f"{self.base_url}/search"
+        params = {"q": f"{track_name} {artist_name}"}
+        with tracing.span("genius.search", kind="client"):
+            response = self.session.get(search_url, headers=self.headers, params=params, timeout=10)
+        response.raise_for_status()
+        return self._parse_search(response.json())
+    async def _asearch(self, track_name: str, artist_name: str) -> Optional[Dict]:
+        """Async _search over the event loop's pooled httpx client"""
+        client = get_async_http_client("genius", max_connections=GENIUS_MAX_WORKERS)
+        params = {"q": f"{track_name} {artist_name}"}
+        with tracing.span("genius.search", kind="client"):
+            response = await client.get(f"{self.base_url}/search", headers=self.headers, params=params)
+        response.raise_for_status()
+        return self._parse_search(response.json())
+    def _parse_search(self, payload: Dict) -> Optional[Dict]:
+        results = payload["response"]["hits"]
+        if not results:
+            return None
+        song = results[0]["result"]
+        return {
+            "genius_id": song["id"],
+            "title": song["title"],
+            "artist": song["primary_artist"]["name"],
+            "url": song["url"],
+            "annotation_count": song.get("annotation_count", 0),
+            "description": self._extract_song_meaning(song)
+        }
+    def _details(self, genius_id: int) -> Dict:
+        song_url = f"{self.base_url}/songs/{genius_id}"
+        with tracing.span("genius.song_details", kind="client"):
+            response = self.session.get(
+                song_url, headers=self.headers, params={"text_format": "plain"}, timeout=10
+            )
+        response.raise_for_status()
+        return self._parse_details(response.json())
+    async def _adetails(self, genius_id: int) -> Dict:
+        client = get_async_http_client("genius", max_connections=GENIUS_MAX_WORKERS)
+        with tracing.span("genius.song_details", kind="client"):
+            response = await client.get(
+                f"{self.base_url}/songs/{genius_id}", headers=self.headers, params={"text_format": "plain"}
+            )
+        response.raise_for_status()
+        return self._parse_details(response.json())
+    def _parse_details(self, payload: Dict) -> Dict:
+        song = payload["response"]["song"]
+        return {
+            "genius_id": song["id"],
+            "title": song["title"],
+            "artist": song["primary_artist"]["name"],
+            "url": song["url"],
+            "annotation_count": song.get("annotation_count", 0),
+            "description": self._extract_song_meaning(song),
+            "themes": self._extract_themes(song)
+        }
     def _extract_song_meaning(self, song_data: Dict) -> str:
         """Extract song meaning/story from description"""
         description = song_data.get("description", {})
         
         if isinstance(description, dict):
             return description.get("plain", "")
-        return str(description)
+        return str(description or "")
     
     def _extract_themes(self, song_data: Dict) -> list:
         """Extract thematic tags/topics from song"""
@@ -64,14 +135,93 @@ class LyricsService:
             themes.extend([tag["name"] for tag in song_data.get("tags", [])])
         
         return themes[:5]  # Return top 5 themes
+    
+    def lookup_lyrics_context(self, track_name: str, artist_name: str) -> Dict:
+        """
+        Lyrics context for one song, served from the on-disk cache when possible
+        
+        Only the search request is made. Search hits carry the Genius ID and
+        URL but never a description or tags, so song_meaning and themes are
+        left as None until load_song_details fetches them for a song that
+        needs them. Songs Genius doesn't know are cached as well; request
+        errors are not.
+        """
+        key = _lyrics_cache_key(track_name, artist_name)
+        cached = lyrics_cache.get(key)
+        tracing.record("cache_hits" if cached is not None else "cache_misses")
+        if cached is not None:
+            return cached
+        
+        context = _lyrics_context(self._search(track_name, artist_name))
+        lyrics_cache.set(key, context)
+        return context
+    
+    async def alookup_lyrics_context(self, track_name: str, artist_name: str) -> Dict:
+        """Async lookup_lyrics_context"""
+        key = _lyrics_cache_key(track_name, artist_name)
+        cached = lyrics_cache.get(key)
+        tracing.record("cache_hits" if cached is not None else "cache_misses")
+        if cached is not None:
+            return cached
+        
+        context = _lyrics_context(await self._asearch(track_name, artist_name))
+        lyrics_cache.set(key, context)
+        return context
+    
+    def load_song_details(self, track_name: str, artist_name: str) -> Dict:
+        """
+        lookup_lyrics_context with song_meaning and themes filled in
+        
+        The /songs request is made at most once per song; its result is
+        cached with the rest of the context.
+        """
+        context = self.lookup_lyrics_context(track_name, artist_name)
+        if context["song_meaning"] is not None or not context["genius_id"]:
+            return context
+        
+        context = _with_details(context, self._details(context["genius_id"]))
+        lyrics_cache.set(_lyrics_cache_key(track_name, artist_name), context)
+        return context
+    
+    async def aload_song_details(self, track_name: str, artist_name: str) -> Dict:
+        """Async load_song_details"""
+        context = await self.alookup_lyrics_context(track_name, artist_name)
+        if context["song_meaning"] is not None or not context["genius_id"]:
+            return context
+        
+        context = _with_details(context, await self._adetails(context["genius_id"]))
+        lyrics_cache.set(_lyrics_cache_key(track_name, artist_name), context)
+        return context
+
+
+def _lyrics_context(song_data):
+    """Cacheable lyrics context from a search hit; details are loaded on demand"""
+    if not song_data or not song_data["genius_id"]:
+        return dict(NO_LYRICS_CONTEXT)
+    
+    return {
+        "genius_id": song_data["genius_id"],
+        "song_meaning": None,
+        "themes": None,
+        "genius_url": song_data.get("url", "")
+    }
+
+
+def _with_details(context, details):
+    return {**context, "song_meaning": details["description"], "themes": details["themes"]}
 
 
+def _lyrics_cache_key(track_name, artist_name):
+    return "|".join(" ".join(str(p).casefold().split()) for p in (track_name, artist_name))
 
 
 def enrich_track_with_lyrics_context(track_info: Dict) -> Dict:
     """
     Enrich a track with lyrics context from Genius
     
+    One search request (or a cache hit) per track; song_meaning and themes
+    stay None until load_song_meaning is called for the track.
+    
     Args:
         track_info: Dict with 'track_name' and 'artist' keys
     
@@ -80,24 +230,111 @@ def enrich_track_with_lyrics_context(track_info: Dict) -> Dict:
     """
     lyrics_service = LyricsService()
     
-    song_data = lyrics_service.search_song(
-        track_info["track_name"],
-        track_info["artist"]
-    )
+    try:
+        context = lyrics_service.lookup_lyrics_context(
+            track_info["track_name"],
+            track_info["artist"]
+        )
+    except Exception as e:
+        print(f"Error enriching {track_info.get('track_name')} from Genius: {e}")
+        context = NO_LYRICS_CONTEXT
     
-    if song_data and song_data["genius_id"]:
-        details = lyrics_service.get_song_details(song_data["genius_id"])
-        
-        track_info["lyrics_context"] = {
-            "song_meaning": details.get("song_meaning", ""),
-            "themes": details.get("themes", []),
-            "genius_url": song_data.get("url", "")
-        }
-    else:
-        track_info["lyrics_context"] = {
-            "song_meaning": "No lyrics context available",
-            "themes": [],
-            "genius_url": ""
-        }
+    return _attach_lyrics_context(track_info, context)
+
+
+async def aenrich_track_with_lyrics_context(track_info: Dict) -> Dict:
+    """Async enrich_track_with_lyrics_context"""
+    try:
+        context = await LyricsService().alookup_lyrics_context(
+            track_info["track_name"],
+            track_info["artist"]
+        )
+    except Exception as e:
+        print(f"Error enriching {track_info.get('track_name')} from Genius: {e}")
+        context = NO_LYRICS_CONTEXT
+    
+    return _attach_lyrics_context(track_info, context)
+
+
+def _attach_lyrics_context(track_info, context):
+    track_info["lyrics_context"] = {
+        "song_meaning": context["song_meaning"],
+        "themes": context["themes"],
+        "genius_url": context["genius_url"]
+    }
+    return track_info
+
+
+def load_song_meaning(track_info: Dict) -> Dict:
+    """
+    Fill in song_meaning and themes of an enriched track from Genius
+    
+    Enrichment only searches Genius; call this for the tracks whose
+    meaning is actually shown or prompted on.
+    
+    Args:
+        track_info: Dict with 'track_name' and 'artist' keys
+    
+    Returns:
+        The same dict, with a complete lyrics_context
+    """
+    try:
+        context = LyricsService().load_song_details(track_info["track_name"], track_info["artist"])
+    except Exception as e:
+        print(f"Error loading song details for {track_info.get('track_name')} from Genius: {e}")
+        context = NO_LYRICS_CONTEXT
+    
+    return _attach_lyrics_context(track_info, context)
+
+
+async def aload_song_meaning(track_info: Dict) -> Dict:
+    """Async load_song_meaning"""
+    try:
+        context = await LyricsService().aload_song_details(track_info["track_name"], track_info["artist"])
+    except Exception as e:
+        print(f"Error loading song details for {track_info.get('track_name')} from Genius: {e}")
+        context = NO_LYRICS_CONTEXT
+    
+    return _attach_lyrics_context(track_info, context)
+
+
+def enrich_tracks_with_lyrics_context(tracks: List[Dict], max_workers: int = GENIUS_MAX_WORKERS) -> List[Dict]:
+    """
+    Batch version of enrich_track_with_lyrics_context
+    
+    Lookups run concurrently over the shared session, so enriching a whole
+    candidate list takes about as long as the slowest single lookup.
+    
+    Args:
+        tracks: List of dicts with 'track_name' and 'artist' keys
+        max_workers: Upper bound on concurrent Genius lookups
+    
+    Returns:
+        The same list, each dict with lyrics_context added
+    """
+    if not tracks:
+        return tracks
+    
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(tracks)))) as pool:
+        futures = [tracing.submit(pool, enrich_track_with_lyrics_context, t) for t in tracks]
+        for future in futures:
+            future.result()
+    
+    return tracks
+
+
+async def aenrich_tracks_with_lyrics_context(tracks: List[Dict], max_concurrency: int = GENIUS_MAX_WORKERS) -> List[Dict]:
+    """
+    Async enrich_tracks_with_lyrics_context
+    
+    Lookups run as coroutines on the caller's event loop, at most
+    `max_concurrency` at a time.
+    """
+    slots = asyncio.Semaphore(max_concurrency)
+    
+    async def enrich(track):
+        async with slots:
+            return await aenrich_track_with_lyrics_context(track)
     
-    return track_info
\ No newline at end of file
+    await asyncio.gather(*(enrich(t) for t in tracks))
+    return tracks
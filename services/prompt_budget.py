@@ -0,0 +1,101 @@
+import json
+import threading
+
+from config.settings import PROMPT_TOKEN_BUDGETS
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def get_budget(agent):
+    """Token budget for an agent's variable prompt inputs"""
+    return PROMPT_TOKEN_BUDGETS[agent]
+
+
+def count_tokens(text):
+    """Count tokens with tiktoken (cl100k_base), ~4 chars/token if unavailable"""
+    encoding = _get_encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_text(text, budget):
+    """Cut `text` to at most `budget` tokens"""
+    text = text or ""
+    encoding = _get_encoding()
+    if encoding is None:
+        return text[:budget * 4]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= budget:
+        return text
+    return encoding.decode(tokens[:budget])
+
+
+def project(records, fields):
+    """Keep only the fields a prompt actually needs from each record"""
+    return [{field: record[field] for field in fields if field in record} for record in records]
+
+
+def compact_json(obj):
+    """JSON without indentation or padding"""
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+
+
+def join_within_budget(items, budget, separator=", "):
+    """Join as many leading items as fit in `budget` tokens"""
+    kept = []
+    used = 0
+    for item in items:
+        cost = count_tokens(f"{separator}{item}" if kept else item)
+        if used + cost > budget:
+            break
+        kept.append(item)
+        used += cost
+    return separator.join(kept)
+
+
+def fit_records(records, budget, text_fields=(), max_field_tokens=60, min_field_tokens=15):
+    """
+    Serialize records compactly within `budget` tokens
+    
+    Long free-text fields are clipped to `max_field_tokens`, then clipped
+    harder (halving down to `min_field_tokens`) while the list doesn't fit.
+    Only if it still doesn't fit are trailing records dropped.
+    
+    Returns:
+        (compact JSON string, number of records kept)
+    """
+    field_tokens = max_field_tokens
+    while True:
+        clipped = [
+            {
+                key: truncate_text(value, field_tokens) if key in text_fields and isinstance(value, str) else value
+                for key, value in record.items()
+            }
+            for record in records
+        ]
+        serialized = compact_json(clipped)
+        if not text_fields or field_tokens <= min_field_tokens or count_tokens(serialized) <= budget:
+            break
+        field_tokens = max(min_field_tokens, field_tokens // 2)
+    
+    kept = len(clipped)
+    while kept > 0 and count_tokens(serialized) > budget:
+        kept -= 1
+        serialized = compact_json(clipped[:kept])
+    return serialized, kept
+
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None:
+        with _encoding_lock:
+            if _encoding is None:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding("cl100k_base")
+                except Exception:
+                    # e.g. tiktoken missing or its BPE file can't be downloaded
+                    _encoding = False
+    return _encoding or None
@@ -0,0 +1,62 @@
+import asyncio
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by every worker talking to one API
+
+    Tokens refill at `rate` per second up to `capacity`. When the API answers
+    429, `pause()` empties the bucket until the Retry-After window has passed,
+    so all workers back off together instead of each one retrying on its own.
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then take it"""
+        while True:
+            wait = self._try_take()
+            if wait == 0:
+                return
+            time.sleep(wait)
+
+    async def aacquire(self):
+        """Async acquire: waits on the event loop instead of blocking a thread"""
+        while True:
+            wait = self._try_take()
+            if wait == 0:
+                return
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Stop handing out tokens for `seconds` (e.g. a 429 Retry-After)"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0
+            self._updated_at = self._paused_until
+
+    def _try_take(self):
+        """Take a token and return 0, or return the seconds to wait for one"""
+        with self._lock:
+            now = time.monotonic()
+            if now >= self._paused_until:
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return 0
+                return (1 - self._tokens) / self.rate
+            return self._paused_until - now
+
+    def _refill(self, now):
+        elapsed = now - self._updated_at
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._updated_at = now
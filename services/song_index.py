@@ -0,0 +1,125 @@
+import os
+import threading
+
+from config.settings import CACHE_DIR, SONG_INDEX_MAX_DISTANCE
+from services.embedding_service import embed_texts
+
+_collection = None
+_collection_lock = threading.Lock()
+
+# Recommender fields stored alongside each indexed song
+_CANDIDATE_FIELDS = (
+    "track_name", "artist", "album", "year", "lyrical_theme",
+    "therapeutic_reason", "sonic_match", "spotify_search_query"
+)
+
+
+def get_song_collection():
+    """Persistent ChromaDB collection of songs that resolved on Spotify"""
+    global _collection
+    if _collection is None:
+        with _collection_lock:
+            if _collection is None:
+                import chromadb
+                
+                client = chromadb.PersistentClient(path=os.path.join(CACHE_DIR, "song_index"))
+                _collection = client.get_or_create_collection(
+                    "resolved_songs",
+                    metadata={"hnsw:space": "cosine"}
+                )
+    return _collection
+
+
+def index_resolved_songs(candidates, emotion):
+    """
+    Add candidates that are known to resolve to the song index
+    
+    Args:
+        candidates: Recommender candidates (lyrical_theme, therapeutic_reason, ...)
+        emotion: emotion_analysis the candidates were generated for
+    
+    Returns:
+        Number of songs upserted
+    """
+    from services.spotify_resolver import track_cache, track_cache_key
+    
+    ids, documents, metadatas = [], [], []
+    for candidate in candidates:
+        entry = track_cache.peek(track_cache_key(candidate))
+        if not entry or not entry["track"]:
+            continue
+        
+        ids.append(entry["track"]["spotify_id"])
+        documents.append(_song_document(candidate, emotion))
+        metadatas.append({
+            **{field: str(candidate.get(field) or "") for field in _CANDIDATE_FIELDS},
+            "discovery_score": float(candidate.get("discovery_score") or 0.5),
+            "progression_stage": int(candidate.get("progression_stage") or 5),
+            "primary_emotion": emotion.get("primary_emotion", ""),
+        })
+    
+    if not ids:
+        return 0
+    
+    # Candidates may repeat a song; keep the last occurrence per Spotify ID
+    unique = {song_id: i for i, song_id in enumerate(ids)}
+    keep = sorted(unique.values())
+    ids = [ids[i] for i in keep]
+    documents = [documents[i] for i in keep]
+    metadatas = [metadatas[i] for i in keep]
+    
+    get_song_collection().upsert(
+        ids=ids,
+        embeddings=embed_texts(documents).tolist(),
+        documents=documents,
+        metadatas=metadatas
+    )
+    return len(ids)
+
+
+def retrieve_candidates(emotion, max_results):
+    """
+    Nearest-neighbour candidates for the user's emotion and story
+    
+    Returns:
+        List of candidate dicts in the recommender's output format, closest
+        first, limited to SONG_INDEX_MAX_DISTANCE
+    """
+    collection = get_song_collection()
+    count = collection.count()
+    if count == 0 or max_results <= 0:
+        return []
+    
+    query = embed_texts([_emotion_query(emotion)])[0]
+    results = collection.query(
+        query_embeddings=[query.tolist()],
+        n_results=min(max_results, count),
+        include=["metadatas", "distances"]
+    )
+    
+    candidates = []
+    for metadata, distance in zip(results["metadatas"][0], results["distances"][0]):
+        if distance > SONG_INDEX_MAX_DISTANCE:
+            continue
+        candidates.append({
+            **{field: metadata.get(field, "") for field in _CANDIDATE_FIELDS},
+            "discovery_score": metadata.get("discovery_score", 0.5),
+            "progression_stage": metadata.get("progression_stage", 5),
+        })
+    return candidates
+
+
+def _song_document(candidate, emotion):
+    return (
+        f"For feeling {emotion.get('primary_emotion', '')} "
+        f"toward {emotion.get('desired_outcome', '')}. "
+        f"{candidate.get('lyrical_theme', '')} {candidate.get('therapeutic_reason', '')}"
+    )
+
+
+def _emotion_query(emotion):
+    return (
+        f"For feeling {emotion.get('primary_emotion', '')} "
+        f"toward {emotion.get('desired_outcome', '')}. "
+        f"{emotion.get('story_context', '')}"
+    )
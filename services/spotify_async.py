@@ -0,0 +1,81 @@
+import asyncio
+
+from spotipy.exceptions import SpotifyException
+
+from config.settings import SPOTIFY_API_BASE_URL, SPOTIFY_MAX_WORKERS
+from services.http_pool import get_async_http_client
+
+
+class AsyncSpotify:
+    """
+    Async counterpart of spotipy.Spotify for the calls on the request path
+    
+    Covers search and playlist creation with the same signatures and
+    response shapes as spotipy. Access tokens come from the wrapped spotipy
+    client, so refreshes and the shared token store work exactly as in the
+    sync path. Errors are raised as spotipy's SpotifyException (with
+    http_status and headers), so 429 handling is shared too.
+    
+    Args:
+        spotify_client: Authenticated spotipy.Spotify
+        base_url: Web API root (overridable for tests and benchmarks)
+    """
+    
+    def __init__(self, spotify_client, base_url=SPOTIFY_API_BASE_URL):
+        self.spotify_client = spotify_client
+        self.base_url = base_url.rstrip("/")
+    
+    async def search(self, q, limit=10, offset=0, type="track", market=None):
+        params = {"q": q, "limit": limit, "offset": offset, "type": type}
+        if market:
+            params["market"] = market
+        return await self._request("GET", "/search", params=params)
+    
+    async def user_playlist_create(self, user, name, public=True, collaborative=False, description=""):
+        return await self._request("POST", f"/users/{user}/playlists", json={
+            "name": name,
+            "public": public,
+            "collaborative": collaborative,
+            "description": description,
+        })
+    
+    async def playlist_add_items(self, playlist_id, items, position=None):
+        payload = {"uris": list(items)}
+        if position is not None:
+            payload["position"] = position
+        return await self._request("POST", f"/playlists/{playlist_id}/tracks", json=payload)
+    
+    async def _request(self, method, path, params=None, json=None):
+        # Token validation may refresh over the network; keep it off the loop
+        headers = await asyncio.to_thread(self.spotify_client._auth_headers)
+        
+        client = get_async_http_client("spotify", max_connections=SPOTIFY_MAX_WORKERS * 2)
+        response = await client.request(
+            method, self.base_url + path, params=params, json=json, headers=headers
+        )
+        
+        if response.status_code >= 400:
+            try:
+                message = response.json()["error"]["message"]
+            except Exception:
+                message = response.text
+            raise SpotifyException(
+                response.status_code, -1,
+                f"{response.request.url}:\n {message}",
+                headers=dict(response.headers)
+            )
+        return response.json() if response.content else None
+
+
+def as_async_spotify(spotify_client):
+    """
+    Async client for a session's Spotify client
+    
+    Clients that already provide an async view (e.g. the benchmark fakes)
+    supply it through `as_async()`.
+    """
+    if isinstance(spotify_client, AsyncSpotify):
+        return spotify_client
+    if hasattr(spotify_client, "as_async"):
+        return spotify_client.as_async()
+    return AsyncSpotify(spotify_client)
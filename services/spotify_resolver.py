@@ -1,13 +1,66 @@
 # ============================================================================
 # FILE: services/spotify_resolver.py
 # ============================================================================
-def resolve_recommendations_to_spotify(recommendations, spotify_client):
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from config.settings import (
+    SPOTIFY_MAX_WORKERS,
+    SPOTIFY_REQUESTS_PER_SECOND,
+    SPOTIFY_MAX_RETRIES,
+    TRACK_CACHE_TTL_DAYS,
+    TRACK_CACHE_MAX_ENTRIES,
+    SPOTIFY_SEARCH_LIMIT,
+    SPOTIFY_MATCH_THRESHOLD,
+    SPOTIFY_ARTIST_MATCH_FLOOR,
+    MAX_ALTERNATIVE_DEPTH,
+)
+from services.cache import PersistentCache
+from services.rate_limiter import TokenBucket
+from services.track_matching import artist_key, best_match, normalize_title, query_variants
+from services import tracing
+
+# One bucket per process: every resolver worker draws from the same budget
+spotify_rate_limiter = TokenBucket(rate=SPOTIFY_REQUESTS_PER_SECOND)
+
+# (title, artist) -> {"track": spotify fields | None, "substitute": resolved alternative | None}
+track_cache = PersistentCache(
+    "spotify_tracks",
+    ttl_seconds=TRACK_CACHE_TTL_DAYS * 24 * 3600,
+    max_entries=TRACK_CACHE_MAX_ENTRIES
+)
+
+# Returned by _resolve_one for cached misses that have no known substitute
+_KNOWN_MISS = object()
+
+# Returned by _known_outcome when the song has to be searched
+_UNKNOWN = object()
+
+_SPOTIFY_FIELDS = (
+    "spotify_id", "spotify_uri", "track_name", "artist",
+    "album", "preview_url", "external_url"
+)
+
+
+def resolve_recommendations_to_spotify(recommendations, spotify_client, depth=0, speculative=None, on_resolved=None):
     """
     Resolve GPT's universe recommendations to actual Spotify tracks
     
+    Searches run concurrently on a bounded worker pool; results keep the
+    order of `recommendations`. Lookups go through the persistent track
+    cache first, so known hits skip the search and known misses skip both
+    the search and the alternatives LLM call. Search results are scored
+    locally against the recommended title/artist, and relaxed queries are
+    tried before a song counts as not found.
+    
     Args:
         recommendations: List of dicts with 'spotify_search_query' field
         spotify_client: Authenticated Spotify client
+        depth: Alternatives rounds already taken (capped at MAX_ALTERNATIVE_DEPTH)
+        speculative: Results of prefetch_candidates() for this run, consumed
+            before the cache
+        on_resolved: Optional callback, called with each track as soon as it
+            is found (completion order, alternatives included)
     
     Returns:
         List of resolved Spotify track objects
@@ -15,68 +68,452 @@ def resolve_recommendations_to_spotify(recommendations, spotify_client):
     
     print("🔍 Resolving songs on Spotify...")
     
-    resolved_tracks = []
-    failed_tracks = []
-    
-    for i, rec in enumerate(recommendations, 1):
-        search_query = rec.get("spotify_search_query", 
-                               f"track:{rec['track_name']} artist:{rec['artist']}")
-        
-        try:
-            # Search Spotify
-            results = spotify_client.search(
-                q=search_query,
-                type="track",
-                limit=3
-            )
-            
-            if results["tracks"]["items"]:
-                # Take best match
-                track = results["tracks"]["items"][0]
-                
-                resolved_tracks.append({
-                    "spotify_id": track["id"],
-                    "spotify_uri": track["uri"],
-                    "track_name": track["name"],
-                    "artist": track["artists"][0]["name"],
-                    "album": track["album"]["name"],
-                    "preview_url": track.get("preview_url"),
-                    "external_url": track["external_urls"]["spotify"],
-                    # Preserve GPT metadata
-                    "therapeutic_reason": rec.get("therapeutic_reason", ""),
-                    "discovery_score": rec.get("discovery_score", 0.5),
-                    "progression_stage": rec.get("progression_stage", 5),
-                    "taste_distance_score": rec.get("taste_distance_score", 0.5)
-                })
-                
-                print(f"   ✓ [{i}/{len(recommendations)}] Found: {track['name']} - {track['artists'][0]['name']}")
-            else:
-                print(f"   ✗ [{i}/{len(recommendations)}] Not found: {rec['track_name']} - {rec['artist']}")
-                failed_tracks.append(rec)
-                
-        except Exception as e:
-            print(f"   ✗ [{i}/{len(recommendations)}] Error searching: {e}")
-            failed_tracks.append(rec)
+    outcomes = _resolve_concurrently(recommendations, spotify_client, speculative, on_resolved)
+    resolved_tracks, failed_tracks = _split_outcomes(recommendations, outcomes, announce_found=on_resolved is None)
     
     # Handle failed tracks with GPT alternatives
-    if failed_tracks:
+    if failed_tracks and depth < MAX_ALTERNATIVE_DEPTH:
+        print(f"\n⚠️  {len(failed_tracks)} songs not found, getting alternatives...")
+        alternatives = get_spotify_alternatives(failed_tracks, spotify_client, depth=depth, on_resolved=on_resolved)
+        resolved_tracks.extend(alternatives)
+    elif failed_tracks:
+        print(f"\n⚠️  {len(failed_tracks)} songs not found, no more alternative rounds")
+    
+    _print_summary(resolved_tracks)
+    return resolved_tracks
+
+
+async def aresolve_recommendations_to_spotify(recommendations, spotify_client, depth=0, speculative=None,
+                                              on_resolved=None):
+    """
+    Async resolve_recommendations_to_spotify
+    
+    Searches run as coroutines on the caller's event loop (at most
+    SPOTIFY_MAX_WORKERS at a time) instead of on a thread pool.
+    
+    Args:
+        recommendations: List of dicts with 'spotify_search_query' field
+        spotify_client: Async Spotify client (see services.spotify_async)
+        depth: Alternatives rounds already taken (capped at MAX_ALTERNATIVE_DEPTH)
+        speculative: Results of prefetch_candidates() for this run
+        on_resolved: Optional callback, called with each track as soon as it is found
+    
+    Returns:
+        List of resolved Spotify track objects
+    """
+    
+    print("🔍 Resolving songs on Spotify...")
+    
+    outcomes = await _aresolve_concurrently(recommendations, spotify_client, speculative, on_resolved)
+    resolved_tracks, failed_tracks = _split_outcomes(recommendations, outcomes, announce_found=on_resolved is None)
+    
+    if failed_tracks and depth < MAX_ALTERNATIVE_DEPTH:
         print(f"\n⚠️  {len(failed_tracks)} songs not found, getting alternatives...")
-        alternatives = get_spotify_alternatives(failed_tracks, spotify_client)
+        alternatives = await aget_spotify_alternatives(failed_tracks, spotify_client, depth=depth,
+                                                       on_resolved=on_resolved)
         resolved_tracks.extend(alternatives)
+    elif failed_tracks:
+        print(f"\n⚠️  {len(failed_tracks)} songs not found, no more alternative rounds")
     
-    print(f"\n✅ Successfully resolved {len(resolved_tracks)} tracks")
+    _print_summary(resolved_tracks)
     return resolved_tracks
 
 
-def get_spotify_alternatives(failed_tracks, spotify_client):
+def _split_outcomes(recommendations, outcomes, announce_found=True):
+    """
+    Found tracks, and the recommendations that need an alternative
+    
+    With announce_found=False found tracks aren't printed, because an
+    on_resolved callback has already shown them.
+    """
+    total = len(recommendations)
+    resolved_tracks = []
+    failed_tracks = []
+    
+    for i, (rec, track) in enumerate(zip(recommendations, outcomes), 1):
+        if track is _KNOWN_MISS:
+            print(f"   ✗ [{i}/{total}] Known miss: {rec['track_name']} - {rec['artist']}")
+        elif track is not None:
+            resolved_tracks.append(track)
+            if announce_found:
+                print(f"   ✓ [{i}/{total}] Found: {track['track_name']} - {track['artist']}")
+        else:
+            failed_tracks.append(rec)
+    
+    return resolved_tracks, failed_tracks
+
+
+def _print_summary(resolved_tracks):
+    stats = track_cache.stats()
+    print(f"\n✅ Successfully resolved {len(resolved_tracks)} tracks "
+          f"(cache: {stats['hits']} hits, {stats['misses']} misses)")
+
+
+def track_cache_key(rec):
+    """Normalized (title, artist) key, falling back to the search query"""
+    if rec.get("track_name") and rec.get("artist"):
+        return f"{normalize_title(rec['track_name'])}|{artist_key(rec['artist'])}"
+    return " ".join(rec.get("spotify_search_query", "").casefold().split())
+
+
+def _resolve_concurrently(recommendations, spotify_client, speculative=None, on_resolved=None):
+    """Resolve each recommendation on the worker pool, preserving order"""
+    if not recommendations:
+        return []
+    
+    total = len(recommendations)
+    workers = max(1, min(SPOTIFY_MAX_WORKERS, total))
+    
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            tracing.submit(pool, _resolve_one, rec, spotify_client, f"[{i}/{total}] ", speculative)
+            for i, rec in enumerate(recommendations, 1)
+        ]
+        if on_resolved is not None:
+            # Report tracks on the calling thread, in the order they complete
+            for future in as_completed(futures):
+                _report_resolved(future.result(), on_resolved)
+        return [future.result() for future in futures]
+
+
+async def _aresolve_concurrently(recommendations, spotify_client, speculative=None, on_resolved=None):
+    """Resolve each recommendation as a coroutine, preserving order"""
+    total = len(recommendations)
+    slots = asyncio.Semaphore(SPOTIFY_MAX_WORKERS)
+    
+    async def resolve(i, rec):
+        async with slots:
+            track = await _aresolve_one(rec, spotify_client, f"[{i}/{total}] ", speculative)
+        if on_resolved is not None:
+            _report_resolved(track, on_resolved)
+        return track
+    
+    return await asyncio.gather(*(resolve(i, rec) for i, rec in enumerate(recommendations, 1)))
+
+
+def _report_resolved(track, on_resolved):
+    """Pass a found track to the caller's callback; its failures never fail resolution"""
+    if track is None or track is _KNOWN_MISS:
+        return
+    try:
+        on_resolved(track)
+    except Exception as e:
+        print(f"   ✗ Progress callback failed: {e}")
+
+
+def prefetch_candidates(candidates, spotify_client):
+    """
+    Resolve every candidate ahead of ranking (speculative resolution)
+    
+    Candidates the track cache already knows are skipped; the final node
+    gets them from the cache as usual. Fresh lookups are returned so the
+    final node can consume them directly, with None marking a song that
+    is not on Spotify (it still gets the alternatives fallback then).
+    
+    Returns:
+        Dict of track cache key -> Spotify fields or None
+    """
+    fresh = _uncached(candidates)
+    return _speculative_results(fresh, _resolve_concurrently(fresh, spotify_client))
+
+
+async def aprefetch_candidates(candidates, spotify_client):
+    """Async prefetch_candidates, for an async Spotify client"""
+    fresh = _uncached(candidates)
+    return _speculative_results(fresh, await _aresolve_concurrently(fresh, spotify_client))
+
+
+def _uncached(candidates):
+    return [c for c in candidates if track_cache.peek(track_cache_key(c)) is None]
+
+
+def _speculative_results(fresh, outcomes):
+    speculative = {}
+    for rec, track in zip(fresh, outcomes):
+        key = track_cache_key(rec)
+        if track is not None:
+            speculative[key] = {field: track.get(field) for field in _SPOTIFY_FIELDS}
+        elif track_cache.peek(key) is not None:
+            # Cached as a miss just now; search errors are left for the final node
+            speculative[key] = None
+    return speculative
+
+
+def is_known_miss(rec):
+    """True when the cache knows the song isn't on Spotify and has no substitute"""
+    entry = track_cache.peek(track_cache_key(rec))
+    return entry is not None and not entry["track"] and not entry.get("substitute")
+
+
+def resolve_track(rec, spotify_client):
+    """
+    Resolve a single recommendation without the alternatives fallback
+    
+    Used to warm the track cache early (e.g. while the recommender is
+    still streaming); returns the track dict or None.
+    """
+    track = _resolve_one(rec, spotify_client)
+    return None if track is _KNOWN_MISS else track
+
+
+async def aresolve_track(rec, spotify_client):
+    """Async resolve_track, for an async Spotify client"""
+    track = await _aresolve_one(rec, spotify_client)
+    return None if track is _KNOWN_MISS else track
+
+
+def _resolve_one(rec, spotify_client, label="", speculative=None):
+    """
+    Resolve one recommendation
+    
+    Returns the track dict, None when a fresh lookup failed, or _KNOWN_MISS
+    when the cache already knows the song isn't on Spotify.
+    """
+    key = track_cache_key(rec)
+    known = _known_outcome(key, rec, speculative)
+    if known is not _UNKNOWN:
+        return known
+    
+    try:
+        track = _search_best_match(rec, spotify_client)
+    except Exception as e:
+        # Transient failures are not cached
+        print(f"   ✗ {label}Error searching: {e}")
+        return None
+    
+    return _remember_search_result(key, rec, track, label)
+
+
+async def _aresolve_one(rec, spotify_client, label="", speculative=None):
+    """Async _resolve_one"""
+    key = track_cache_key(rec)
+    known = _known_outcome(key, rec, speculative)
+    if known is not _UNKNOWN:
+        return known
+    
+    try:
+        track = await _asearch_best_match(rec, spotify_client)
+    except Exception as e:
+        print(f"   ✗ {label}Error searching: {e}")
+        return None
+    
+    return _remember_search_result(key, rec, track, label)
+
+
+def _known_outcome(key, rec, speculative):
+    """Outcome from this run's prefetch or the track cache, else _UNKNOWN"""
+    if speculative and key in speculative:
+        tracing.record("speculative_hits")
+        if speculative[key] is None:
+            return None
+        return _with_recommendation_metadata(speculative[key], rec)
+    
+    cached = track_cache.get(key)
+    tracing.record("cache_hits" if cached is not None else "cache_misses")
+    
+    if cached is None:
+        return _UNKNOWN
+    if cached["track"]:
+        return _with_recommendation_metadata(cached["track"], rec)
+    if cached.get("substitute"):
+        substitute = _with_recommendation_metadata(cached["substitute"], rec)
+        substitute["therapeutic_reason"] = cached["substitute"].get("therapeutic_reason", "")
+        return substitute
+    return _KNOWN_MISS
+
+
+def _remember_search_result(key, rec, track, label):
+    """Cache a finished search (hit or miss) and return the track dict or None"""
+    if track is None:
+        print(f"   ✗ {label}Not found: {rec['track_name']} - {rec['artist']}")
+        track_cache.set(key, {"track": None, "substitute": None})
+        return None
+    
+    spotify_fields = {
+        "spotify_id": track["id"],
+        "spotify_uri": track["uri"],
+        "track_name": track["name"],
+        "artist": track["artists"][0]["name"],
+        "album": track["album"]["name"],
+        "preview_url": track.get("preview_url"),
+        "external_url": track["external_urls"]["spotify"],
+    }
+    track_cache.set(key, {"track": spotify_fields, "substitute": None})
+    
+    return _with_recommendation_metadata(spotify_fields, rec)
+
+
+def _search_best_match(rec, spotify_client):
+    """
+    Try the query variants in order and return the first good match
+    
+    Every returned item is scored against the recommended title/artist, so
+    a wrong top hit is skipped instead of accepted.
+    """
+    for query in query_variants(rec):
+        results = search_with_rate_limit(spotify_client, query, limit=SPOTIFY_SEARCH_LIMIT)
+        tracing.record("query_variants_tried")
+        match = _pick_match(results["tracks"]["items"], rec)
+        if match is not None:
+            return match
+    return None
+
+
+async def _asearch_best_match(rec, spotify_client):
+    """Async _search_best_match"""
+    for query in query_variants(rec):
+        results = await asearch_with_rate_limit(spotify_client, query, limit=SPOTIFY_SEARCH_LIMIT)
+        tracing.record("query_variants_tried")
+        match = _pick_match(results["tracks"]["items"], rec)
+        if match is not None:
+            return match
+    return None
+
+
+def _pick_match(items, rec):
+    """Best-scoring search result for `rec`, or None if none is close enough"""
+    if not items:
+        return None
+    if not (rec.get("track_name") and rec.get("artist")):
+        # Nothing to score against; trust the search engine
+        return items[0]
+    return best_match(
+        items, rec["track_name"], rec["artist"], SPOTIFY_MATCH_THRESHOLD, SPOTIFY_ARTIST_MATCH_FLOOR
+    )
+
+
+def _with_recommendation_metadata(spotify_fields, rec):
+    """Combine cached Spotify fields with the GPT metadata of this request"""
+    return {
+        **{field: spotify_fields.get(field) for field in _SPOTIFY_FIELDS},
+        # Preserve GPT metadata
+        "therapeutic_reason": rec.get("therapeutic_reason", ""),
+        "discovery_score": rec.get("discovery_score", 0.5),
+        "progression_stage": rec.get("progression_stage", 5),
+        "taste_distance_score": rec.get("taste_distance_score", 0.5)
+    }
+
+
+def _remember_substitutes(failed_tracks, alternatives):
+    """
+    Link each cached miss to the alternative that replaced it
+    
+    The alternatives prompt asks for one replacement per failed song, in
+    order, so pairs are only recorded when the counts line up.
+    """
+    if len(alternatives) != len(failed_tracks):
+        return
+    
+    for original, alternative in zip(failed_tracks, alternatives):
+        original_key = track_cache_key(original)
+        original_entry = track_cache.peek(original_key)
+        alternative_entry = track_cache.peek(track_cache_key(alternative))
+        
+        if original_entry is None or original_entry["track"]:
+            continue
+        if not alternative_entry or not alternative_entry["track"]:
+            continue
+        
+        track_cache.set(original_key, {
+            "track": None,
+            "substitute": {
+                **alternative_entry["track"],
+                "therapeutic_reason": alternative.get("therapeutic_reason", "")
+            }
+        })
+
+
+def search_with_rate_limit(spotify_client, query, limit=3):
+    """
+    Run spotify_client.search through the shared token bucket
+    
+    A 429 pauses the bucket for the server's Retry-After so every worker
+    backs off, then the search is retried up to SPOTIFY_MAX_RETRIES times.
+    """
+    with tracing.span("spotify.search", kind="client") as span:
+        attempt = 0
+        while True:
+            spotify_rate_limiter.acquire()
+            try:
+                return spotify_client.search(q=query, type="track", limit=limit)
+            except Exception as e:
+                if getattr(e, "http_status", None) != 429 or attempt >= SPOTIFY_MAX_RETRIES:
+                    raise
+                attempt += 1
+                span.add("retries")
+                spotify_rate_limiter.pause(_retry_after_seconds(e))
+
+
+async def asearch_with_rate_limit(spotify_client, query, limit=3):
+    """Async search_with_rate_limit; waits for tokens without blocking the loop"""
+    with tracing.span("spotify.search", kind="client") as span:
+        attempt = 0
+        while True:
+            await spotify_rate_limiter.aacquire()
+            try:
+                return await spotify_client.search(q=query, type="track", limit=limit)
+            except Exception as e:
+                if getattr(e, "http_status", None) != 429 or attempt >= SPOTIFY_MAX_RETRIES:
+                    raise
+                attempt += 1
+                span.add("retries")
+                spotify_rate_limiter.pause(_retry_after_seconds(e))
+
+
+def _retry_after_seconds(error, default=1.0):
+    """Read Retry-After from a spotipy SpotifyException, if present"""
+    headers = getattr(error, "headers", None) or {}
+    try:
+        return float(headers.get("Retry-After", default))
+    except (TypeError, ValueError):
+        return default
+
+
+def get_spotify_alternatives(failed_tracks, spotify_client, depth=0, on_resolved=None):
     """
     Use GPT to suggest Spotify-available alternatives for failed tracks
     """
+    chain = _alternatives_chain()
+    
+    try:
+        alternatives = chain.invoke(_alternatives_inputs(failed_tracks))
+        
+        # Resolve alternatives
+        resolved = resolve_recommendations_to_spotify(
+            alternatives, spotify_client, depth=depth + 1, on_resolved=on_resolved
+        )
+        _remember_substitutes(failed_tracks, alternatives)
+        return resolved
+        
+    except Exception as e:
+        print(f"   ✗ Failed to get alternatives: {e}")
+        return []
+
+
+async def aget_spotify_alternatives(failed_tracks, spotify_client, depth=0, on_resolved=None):
+    """Async get_spotify_alternatives"""
+    chain = _alternatives_chain()
+    
+    try:
+        alternatives = await chain.ainvoke(_alternatives_inputs(failed_tracks))
+        
+        resolved = await aresolve_recommendations_to_spotify(
+            alternatives, spotify_client, depth=depth + 1, on_resolved=on_resolved
+        )
+        _remember_substitutes(failed_tracks, alternatives)
+        return resolved
+        
+    except Exception as e:
+        print(f"   ✗ Failed to get alternatives: {e}")
+        return []
+
+
+def _alternatives_chain():
     from langchain_core.prompts import ChatPromptTemplate
     from langchain_core.output_parsers import JsonOutputParser
     from services.llm_service import get_llm
     
-    llm = get_llm(temperature=0.7)
+    llm = get_llm(temperature=0.7, agent="spotify_alternatives")
     
     prompt = ChatPromptTemplate.from_messages([
         ("system", """You are a music expert helping find alternative songs 
@@ -105,23 +542,18 @@ def get_spotify_alternatives(failed_tracks, spotify_client):
     ])
     
     parser = JsonOutputParser()
-    chain = prompt | llm | parser
+    return prompt | llm | parser
+
+
+def _alternatives_inputs(failed_tracks):
+    from services.prompt_budget import get_budget, fit_records
     
-    try:
-        import json
-        failed_json = json.dumps([
-            {
-                "original": f"{t['track_name']} - {t['artist']}",
-                "purpose": t.get("therapeutic_reason", "therapeutic value")
-            }
-            for t in failed_tracks
-        ], indent=2)
-        
-        alternatives = chain.invoke({"failed_tracks": failed_json})
-        
-        # Resolve alternatives
-        return resolve_recommendations_to_spotify(alternatives, spotify_client)
-        
-    except Exception as e:
-        print(f"   ✗ Failed to get alternatives: {e}")
-        return []
+    failed_json, _ = fit_records([
+        {
+            "original": f"{t['track_name']} - {t['artist']}",
+            "purpose": t.get("therapeutic_reason", "therapeutic value")
+        }
+        for t in failed_tracks
+    ], get_budget("spotify_alternatives"), text_fields=("purpose",), max_field_tokens=30)
+    
+    return {"failed_tracks": failed_json}
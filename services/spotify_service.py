@@ -1,21 +1,103 @@
-def fetch_user_profile(spotify_client):
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config.settings import AUDIO_FEATURES_ENABLED, PROFILE_TOP_ITEMS_REFRESH_HOURS
+from services.audio_features import calculate_audio_profile
+from services.cache import PersistentCache
+from services.heard_tracks import profile_tracks, remember_heard_tracks
+from services import tracing
+
+# user_id -> {"profile", "recent_cursor", "fetched_at"}
+profile_cache = PersistentCache("spotify_profiles")
+
+# token owner key (see auth.spotify_auth.token_owner_key) -> Spotify user id
+token_owner_cache = PersistentCache("spotify_token_owners")
+
+RECENT_TRACKS_LIMIT = 50
+
+
+def fetch_user_profile(spotify_client, incremental=False):
     """
     Fetch comprehensive user profile from Spotify
+    
+    The independent API calls are issued concurrently. With `incremental`,
+    the last profile is loaded from the local store and only plays newer
+    than its recently-played cursor are fetched; top artists/tracks are
+    reused until PROFILE_TOP_ITEMS_REFRESH_HOURS have passed. The stored
+    profile is found through the client's token, so a returning session
+    makes just the one recently-played request. Fetched
+    tracks are added to the user's heard-tracks index as they come in.
+    
     Returns: dict with top artists, genres, audio features, recent tracks
     """
     print("📊 Fetching your Spotify profile...")
     
-    # Top artists (long term)
-    top_artists = spotify_client.current_user_top_artists(limit=20, time_range='long_term')
-    # Top tracks (for audio feature analysis)
-    top_tracks = spotify_client.current_user_top_tracks(limit=50, time_range='long_term')
+    if incremental:
+        user_id = _user_id_of(spotify_client)
+        stored = profile_cache.get(user_id)
+        if stored is not None and _top_items_fresh(stored):
+            if "audio_features" not in stored["profile"]:
+                # Stored before audio features were collected
+                stored["profile"]["audio_features"] = calculate_avg_audio_features(
+                    spotify_client, stored["profile"]["top_tracks"]
+                )
+            profile = _refresh_recent_tracks(spotify_client, stored)
+            print(f"✅ Profile updated: {len(profile['top_artists'])} artists, {len(profile['top_genres'])} genres")
+            return profile
+        profile, cursor = _fetch_full_profile(spotify_client, user_id=user_id)
+    else:
+        profile, cursor = _fetch_full_profile(spotify_client)
     
-    # Recently played
-    recent = spotify_client.current_user_recently_played(limit=50)
+    remember_heard_tracks(profile["user_id"], profile_tracks(profile))
+    profile_cache.set(profile["user_id"], {
+        "profile": profile,
+        "recent_cursor": cursor,
+        "fetched_at": time.time()
+    })
+    
+    print(f"✅ Profile loaded: {len(profile['top_artists'])} artists, {len(profile['top_genres'])} genres")
+    return profile
+
+
+def _user_id_of(spotify_client):
+    """Spotify user id of the client's account; /me is only asked once per token"""
+    from auth.spotify_auth import token_owner_key
+    
+    owner = token_owner_key(spotify_client)
+    user_id = token_owner_cache.get(owner) if owner else None
+    if user_id is None:
+        user_id = spotify_client.current_user()["id"]
+        if owner:
+            token_owner_cache.set(owner, user_id)
+    return user_id
+
+
+def _fetch_full_profile(spotify_client, user_id=None):
+    """Fetch every profile endpoint concurrently; returns (profile, recent cursor)"""
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        # Top artists (long term)
+        top_artists_future = pool.submit(
+            spotify_client.current_user_top_artists, limit=20, time_range='long_term'
+        )
+        # Top tracks (for audio feature analysis)
+        top_tracks_future = pool.submit(
+            spotify_client.current_user_top_tracks, limit=50, time_range='long_term'
+        )
+        # Recently played
+        recent_future = pool.submit(
+            spotify_client.current_user_recently_played, limit=RECENT_TRACKS_LIMIT
+        )
+        user_future = pool.submit(spotify_client.current_user) if user_id is None else None
+        
+        top_artists = top_artists_future.result()
+        top_tracks = top_tracks_future.result()
+        recent = recent_future.result()
+        if user_future is not None:
+            user_id = user_future.result()["id"]
     
     # Extract data
     profile = {
-        "user_id": spotify_client.current_user()["id"],
+        "user_id": user_id,
         "top_artists": [
             {"name": artist["name"], "genres": artist["genres"], "popularity": artist["popularity"]}
             for artist in top_artists["items"]
@@ -29,21 +111,65 @@ def fetch_user_profile(spotify_client):
             }
             for track in top_tracks["items"]
         ],
-        "recent_tracks": [
-            {
-                "name": item["track"]["name"],
-                "artist": item["track"]["artists"][0]["name"],
-                "played_at": item["played_at"]
-            }
-            for item in recent["items"]
-        ],
-        # "audio_features": calculate_avg_audio_features(spotify_client, top_tracks["items"])
+        "recent_tracks": _extract_recent_tracks(recent["items"]),
+        "audio_features": calculate_avg_audio_features(spotify_client, top_tracks["items"])
     }
+    return profile, _recent_cursor(recent)
+
+
+def _refresh_recent_tracks(spotify_client, stored):
+    """Pull only plays newer than the stored cursor and merge them in"""
+    profile = stored["profile"]
+    cursor = stored.get("recent_cursor")
     
-    print(f"✅ Profile loaded: {len(profile['top_artists'])} artists, {len(profile['top_genres'])} genres")
+    if cursor:
+        recent = spotify_client.current_user_recently_played(
+            limit=RECENT_TRACKS_LIMIT, after=cursor
+        )
+    else:
+        recent = spotify_client.current_user_recently_played(limit=RECENT_TRACKS_LIMIT)
+    
+    new_tracks = _extract_recent_tracks(recent["items"])
+    if new_tracks:
+        remember_heard_tracks(profile["user_id"], new_tracks)
+        seen = {t["played_at"] for t in new_tracks}
+        profile["recent_tracks"] = (
+            new_tracks + [t for t in profile["recent_tracks"] if t["played_at"] not in seen]
+        )[:RECENT_TRACKS_LIMIT]
+        
+        profile_cache.set(profile["user_id"], {
+            **stored,
+            "profile": profile,
+            "recent_cursor": _recent_cursor(recent) or cursor
+        })
+    
+    print(f"   ✓ {len(new_tracks)} new plays since last session")
     return profile
 
 
+def _extract_recent_tracks(items):
+    return [
+        {
+            "name": item["track"]["name"],
+            "artist": item["track"]["artists"][0]["name"],
+            "id": item["track"].get("id"),
+            "played_at": item["played_at"]
+        }
+        for item in items
+    ]
+
+
+def _recent_cursor(recent):
+    """The recently-played `after` cursor (ms timestamp of the newest play)"""
+    cursors = recent.get("cursors") or {}
+    return cursors.get("after")
+
+
+def _top_items_fresh(stored):
+    age_hours = (time.time() - stored["fetched_at"]) / 3600
+    return age_hours < PROFILE_TOP_ITEMS_REFRESH_HOURS
+
+
 
 
 def extract_top_genres(artists, top_n=10):
@@ -60,27 +186,16 @@ def extract_top_genres(artists, top_n=10):
 
 
 
-# def calculate_avg_audio_features(spotify_client, tracks):
-#     """Calculate average audio features from user's top tracks"""
-#     track_ids = [track["id"] for track in tracks]
-#     features = spotify_client.audio_features(track_ids)
-    
-#     # Filter out None values
-#     valid_features = [f for f in features if f is not None]
-    
-#     if not valid_features:
-#         return {}
+def calculate_avg_audio_features(spotify_client, tracks):
+    """
+    Sonic summary (mean, variance, percentiles) of the user's top tracks
     
-#     avg = {
-#         "tempo": sum(f["tempo"] for f in valid_features) / len(valid_features),
-#         "energy": sum(f["energy"] for f in valid_features) / len(valid_features),
-#         "valence": sum(f["valence"] for f in valid_features) / len(valid_features),
-#         "danceability": sum(f["danceability"] for f in valid_features) / len(valid_features),
-#         "acousticness": sum(f["acousticness"] for f in valid_features) / len(valid_features),
-#         "instrumentalness": sum(f["instrumentalness"] for f in valid_features) / len(valid_features),
-#     }
-#     return avg
-
+    Features are cached per track forever and fetched in batches of 100;
+    see services.audio_features. Returns {} when disabled or unavailable.
+    """
+    if not AUDIO_FEATURES_ENABLED:
+        return {}
+    return calculate_audio_profile(spotify_client, tracks)
 
 
 def create_spotify_playlist(spotify_client, user_id, tracks, emotion_context):
@@ -96,6 +211,56 @@ def create_spotify_playlist(spotify_client, user_id, tracks, emotion_context):
     Returns:
         Playlist URL
     """
+    playlist_name, description, track_uris = _playlist_request(tracks, emotion_context)
+    
+    # Create playlist
+    with tracing.span("spotify.user_playlist_create", kind="client"):
+        playlist = spotify_client.user_playlist_create(
+            user=user_id,
+            name=playlist_name,
+            public=False,
+            description=description
+        )
+    
+    with tracing.span("spotify.playlist_add_items", kind="client", tracks=len(track_uris)):
+        spotify_client.playlist_add_items(playlist["id"], track_uris)
+    
+    print(f"✅ Playlist created: {playlist['external_urls']['spotify']}")
+    return playlist["external_urls"]["spotify"]
+
+
+async def acreate_spotify_playlist(spotify_client, user_id, tracks, emotion_context):
+    """
+    Async create_spotify_playlist
+    
+    Args:
+        spotify_client: Async Spotify client (see services.spotify_async)
+        user_id: Spotify user ID
+        tracks: List of track URIs or IDs
+        emotion_context: Dict with emotion info for playlist description
+    
+    Returns:
+        Playlist URL
+    """
+    playlist_name, description, track_uris = _playlist_request(tracks, emotion_context)
+    
+    with tracing.span("spotify.user_playlist_create", kind="client"):
+        playlist = await spotify_client.user_playlist_create(
+            user=user_id,
+            name=playlist_name,
+            public=False,
+            description=description
+        )
+    
+    with tracing.span("spotify.playlist_add_items", kind="client", tracks=len(track_uris)):
+        await spotify_client.playlist_add_items(playlist["id"], track_uris)
+    
+    print(f"✅ Playlist created: {playlist['external_urls']['spotify']}")
+    return playlist["external_urls"]["spotify"]
+
+
+def _playlist_request(tracks, emotion_context):
+    """Playlist name, description and track URIs for a session"""
     from datetime import datetime
     
     timestamp = datetime.now().strftime("%B %d, %Y")
@@ -103,21 +268,10 @@ def create_spotify_playlist(spotify_client, user_id, tracks, emotion_context):
     
     description = f"Therapeutic playlist curated by SoulSync for your {emotion_context.get('primary_emotion', 'emotional')} state. {emotion_context.get('description', '')}"
     
-    # Create playlist
-    playlist = spotify_client.user_playlist_create(
-        user=user_id,
-        name=playlist_name,
-        public=False,
-        description=description[:300]  # Spotify has 300 char limit
-    )
-    
     # Add tracks (ensure they're URIs)
     track_uris = [
         f"spotify:track:{t}" if not t.startswith("spotify:") else t
         for t in tracks
     ]
     
-    spotify_client.playlist_add_items(playlist["id"], track_uris)
-    
-    print(f"✅ Playlist created: {playlist['external_urls']['spotify']}")
-    return playlist["external_urls"]["spotify"]
\ No newline at end of file
+    return playlist_name, description[:300], track_uris  # Spotify has a 300 char description limit
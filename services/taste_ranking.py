@@ -0,0 +1,130 @@
+import numpy as np
+
+from services.audio_features import describe_audio_profile
+from services.embedding_service import embed_texts
+
+# Weights of each factor in the overall match score
+LYRICAL_WEIGHT = 0.35
+THERAPEUTIC_WEIGHT = 0.30
+SONIC_WEIGHT = 0.20
+DISCOVERY_WEIGHT = 0.15
+
+# Score penalty per already-selected song at the same progression stage,
+# so the top 10 spans the emotional journey instead of clustering
+PROGRESSION_PENALTY = 0.05
+
+
+def rank_candidates_locally(emotion, taste, candidates, top_k=10):
+    """
+    Rank universe candidates without an LLM call
+    
+    All candidate texts and both user summaries are embedded in one batch,
+    then scored with vectorized cosine similarity:
+    1. Lyrical resonance: lyrical_theme vs. the user's emotional story
+    2. Therapeutic fit: therapeutic_reason vs. the user's emotional story
+    3. Sonic compatibility: sonic_match vs. the user's taste summary
+    4. Discovery balance: discovery_score vs. their discovery openness
+    Selection is greedy with a penalty for repeating a progression stage.
+    
+    Args:
+        emotion: emotion_analysis dict
+        taste: taste_profile dict
+        candidates: universe_candidates from the recommender
+        top_k: Number of songs to return
+    
+    Returns:
+        List of ranked recommendations with the same fields the LLM ranker returns
+    """
+    if not candidates:
+        return []
+    
+    n = len(candidates)
+    texts = [_emotion_query(emotion), _taste_query(taste)]
+    texts += [c.get("lyrical_theme", "") or c.get("track_name", "") for c in candidates]
+    texts += [c.get("therapeutic_reason", "") or c.get("track_name", "") for c in candidates]
+    texts += [c.get("sonic_match", "") or c.get("artist", "") for c in candidates]
+    
+    vectors = embed_texts(texts)
+    emotion_vec, taste_vec = vectors[0], vectors[1]
+    lyrical_vecs = vectors[2:2 + n]
+    therapeutic_vecs = vectors[2 + n:2 + 2 * n]
+    sonic_vecs = vectors[2 + 2 * n:]
+    
+    lyrical = np.clip(lyrical_vecs @ emotion_vec, 0.0, 1.0)
+    therapeutic = np.clip(therapeutic_vecs @ emotion_vec, 0.0, 1.0)
+    sonic = np.clip(sonic_vecs @ taste_vec, 0.0, 1.0)
+    
+    openness = float(taste.get("discovery_openness", 0.5))
+    discovery = np.array([_as_float(c.get("discovery_score"), 0.5) for c in candidates])
+    discovery_fit = 1.0 - np.abs(discovery - openness)
+    
+    scores = (
+        LYRICAL_WEIGHT * lyrical
+        + THERAPEUTIC_WEIGHT * therapeutic
+        + SONIC_WEIGHT * sonic
+        + DISCOVERY_WEIGHT * discovery_fit
+    )
+    
+    stages = np.array([int(_as_float(c.get("progression_stage"), 5)) for c in candidates])
+    selected = _select_with_progression(scores, stages, min(top_k, n))
+    
+    return [
+        {
+            "track_name": candidates[i].get("track_name", ""),
+            "artist": candidates[i].get("artist", ""),
+            "album": candidates[i].get("album", ""),
+            "year": candidates[i].get("year", ""),
+            "therapeutic_reason": candidates[i].get("therapeutic_reason", ""),
+            "taste_distance_score": round(float(1.0 - scores[i]), 3),
+            "lyrical_match_score": round(float(lyrical[i]), 3),
+            "sonic_match_score": round(float(sonic[i]), 3),
+            "discovery_score": round(float(discovery[i]), 3),
+            "progression_stage": int(stages[i]),
+            "spotify_search_query": candidates[i].get("spotify_search_query", ""),
+            "ranking_rationale": (
+                f"Lyrical {lyrical[i]:.2f}, therapeutic {therapeutic[i]:.2f}, "
+                f"sonic {sonic[i]:.2f}, discovery fit {discovery_fit[i]:.2f}"
+            )
+        }
+        for i in selected
+    ]
+
+
+def _select_with_progression(scores, stages, k):
+    """Greedy top-k where each pick lowers the score of its progression stage"""
+    adjusted = scores.astype(float).copy()
+    available = np.ones(len(scores), dtype=bool)
+    selected = []
+    
+    for _ in range(k):
+        i = int(np.argmax(np.where(available, adjusted, -np.inf)))
+        selected.append(i)
+        available[i] = False
+        adjusted[stages == stages[i]] -= PROGRESSION_PENALTY
+    
+    return selected
+
+
+def _emotion_query(emotion):
+    return (
+        f"Feeling {emotion.get('primary_emotion', '')}. "
+        f"{emotion.get('story_context', '')} "
+        f"Wants to feel {emotion.get('desired_outcome', '')}."
+    )
+
+
+def _taste_query(taste):
+    return (
+        f"Genres: {', '.join(taste.get('genre_clusters', []))}. "
+        f"Themes: {', '.join(taste.get('lyrical_themes', []))}. "
+        f"Sound: {taste.get('sonic_preferences', '')}. "
+        f"{describe_audio_profile(taste.get('audio_features'))} "
+        f"{taste.get('comfort_zone_description', '')}"
+    )
+
+
+def _as_float(value, default):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
@@ -0,0 +1,251 @@
+import contextvars
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+from config.settings import TRACE_FILE, TRACE_MAX_SPANS
+
+_current_span = contextvars.ContextVar("soulsync_current_span", default=None)
+
+
+class Span:
+    """
+    One timed operation: a workflow node or an external call
+    
+    Field names follow the OpenTelemetry span data model so exported JSONL
+    can be converted or ingested without reshaping.
+    """
+    
+    def __init__(self, name, kind, parent=None, attributes=None):
+        self.name = name
+        self.kind = kind
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_span_id = parent.span_id if parent else None
+        self.attributes = dict(attributes or {})
+        self.status = "OK"
+        self.start_time = time.time()
+        self.end_time = None
+        self._start = time.perf_counter()
+        self.duration = None
+        self._lock = threading.Lock()
+    
+    def set(self, key, value):
+        with self._lock:
+            self.attributes[key] = value
+    
+    def add(self, key, amount=1):
+        """Increment a counter attribute (calls, retries, cache hits, tokens)"""
+        with self._lock:
+            self.attributes[key] = self.attributes.get(key, 0) + amount
+    
+    def finish(self, error=None):
+        self.duration = time.perf_counter() - self._start
+        self.end_time = self.start_time + self.duration
+        if error is not None:
+            self.status = "ERROR"
+            self.attributes["error"] = repr(error)
+    
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start_time_unix_nano": int(self.start_time * 1e9),
+            "end_time_unix_nano": int((self.end_time or self.start_time) * 1e9),
+            "duration_ms": round((self.duration or 0.0) * 1000, 3),
+            "status": self.status,
+            "attributes": dict(self.attributes),
+        }
+
+
+class Tracer:
+    """
+    Collects finished spans in memory and optionally appends them to JSONL
+    
+    At most `max_spans` are kept, oldest dropped first; callers that are
+    done with a trace release its spans with discard().
+    """
+    
+    def __init__(self, export_path=None, max_spans=TRACE_MAX_SPANS):
+        self.export_path = export_path
+        self._spans = deque(maxlen=max_spans)
+        self._lock = threading.Lock()
+    
+    @contextmanager
+    def span(self, name, kind="internal", **attributes):
+        current = self.start_span(name, kind, **attributes)
+        token = _current_span.set(current)
+        try:
+            yield current
+        except BaseException as e:
+            _current_span.reset(token)
+            self.end_span(current, error=e)
+            raise
+        _current_span.reset(token)
+        self.end_span(current)
+    
+    def start_span(self, name, kind="internal", **attributes):
+        """
+        Start a child of the current span without making it current
+        
+        For generators, where a context variable can't be held across yields.
+        """
+        return Span(name, kind, parent=_current_span.get(), attributes=attributes)
+    
+    def end_span(self, finished, error=None):
+        finished.finish(error=error)
+        self._record(finished)
+    
+    def finished_spans(self, trace_id=None):
+        with self._lock:
+            spans = list(self._spans)
+        if trace_id is not None:
+            spans = [s for s in spans if s.trace_id == trace_id]
+        return spans
+    
+    def discard(self, trace_id):
+        """Drop the spans of a trace that has been reported or exported"""
+        with self._lock:
+            kept = [s for s in self._spans if s.trace_id != trace_id]
+            self._spans.clear()
+            self._spans.extend(kept)
+    
+    def reset(self):
+        with self._lock:
+            self._spans.clear()
+    
+    def export_jsonl(self, path, spans=None):
+        spans = self.finished_spans() if spans is None else spans
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            for s in spans:
+                f.write(json.dumps(s.to_dict(), default=str) + "\n")
+    
+    def _record(self, finished):
+        with self._lock:
+            self._spans.append(finished)
+        if self.export_path:
+            self.export_jsonl(self.export_path, [finished])
+
+
+tracer = Tracer(export_path=TRACE_FILE)
+
+
+def span(name, kind="internal", **attributes):
+    """Context manager timing `name` as a child of the current span"""
+    return tracer.span(name, kind, **attributes)
+
+
+def current_span():
+    return _current_span.get()
+
+
+def record(key, amount=1):
+    """Increment a counter on the current span, if one is active"""
+    active = _current_span.get()
+    if active is not None:
+        active.add(key, amount)
+
+
+def submit(pool, fn, *args, **kwargs):
+    """pool.submit that carries the current span into the worker thread"""
+    return pool.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def traced_node(name, node):
+    """Wrap a LangGraph node function (sync or async) in a 'node' span"""
+    accepts_config = "config" in inspect.signature(node).parameters
+    
+    if inspect.iscoroutinefunction(node):
+        if accepts_config:
+            @functools.wraps(node)
+            async def async_wrapper(state, config):
+                with span(name, kind="node"):
+                    return await node(state, config)
+        else:
+            @functools.wraps(node)
+            async def async_wrapper(state):
+                with span(name, kind="node"):
+                    return await node(state)
+        return async_wrapper
+    
+    if accepts_config:
+        @functools.wraps(node)
+        def wrapper(state, config):
+            with span(name, kind="node"):
+                return node(state, config)
+    else:
+        @functools.wraps(node)
+        def wrapper(state):
+            with span(name, kind="node"):
+                return node(state)
+    return wrapper
+
+
+def format_report(trace_id=None):
+    """
+    Per-stage latency breakdown of a finished run
+    
+    Each node line shows its wall time plus the external calls made inside
+    it (LLM, Spotify, Genius) with counts, time, tokens and cache hits.
+    """
+    spans = tracer.finished_spans(trace_id)
+    by_id = {s.span_id: s for s in spans}
+    nodes = sorted((s for s in spans if s.kind == "node"), key=lambda s: s.start_time)
+    if not nodes:
+        return "No workflow spans recorded."
+    
+    calls = {n.span_id: {} for n in nodes}
+    for s in spans:
+        if s.kind != "client":
+            continue
+        owner = _enclosing_node(s, by_id)
+        if owner is None:
+            continue
+        entry = calls[owner.span_id].setdefault(
+            s.name, {"count": 0, "time": 0.0, "retries": 0, "input_tokens": 0, "output_tokens": 0}
+        )
+        entry["count"] += 1
+        entry["time"] += s.duration or 0.0
+        for key in ("retries", "input_tokens", "output_tokens"):
+            entry[key] += s.attributes.get(key, 0)
+    
+    lines = ["⏱️  Per-stage latency breakdown:"]
+    for n in nodes:
+        lines.append(f"   {n.name:<24} {n.duration or 0.0:7.2f}s")
+        for call_name, entry in sorted(calls[n.span_id].items()):
+            detail = f"{entry['count']} calls, {entry['time']:.2f}s"
+            if entry["input_tokens"] or entry["output_tokens"]:
+                detail += f", {entry['input_tokens']}→{entry['output_tokens']} tokens"
+            if entry["retries"]:
+                detail += f", {entry['retries']} retries"
+            lines.append(f"      {call_name:<21} {detail}")
+        hits = n.attributes.get("cache_hits", 0)
+        misses = n.attributes.get("cache_misses", 0)
+        if hits or misses:
+            lines.append(f"      {'cache':<21} {hits} hits, {misses} misses")
+    
+    start = min(n.start_time for n in nodes)
+    end = max(n.end_time for n in nodes)
+    lines.append(f"   {'total (wall)':<24} {end - start:7.2f}s")
+    return "\n".join(lines)
+
+
+def _enclosing_node(s, by_id):
+    parent = by_id.get(s.parent_span_id)
+    while parent is not None:
+        if parent.kind == "node":
+            return parent
+        parent = by_id.get(parent.parent_span_id)
+    return None
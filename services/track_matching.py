@@ -0,0 +1,140 @@
+import re
+import unicodedata
+from difflib import SequenceMatcher
+
+from config.settings import SPOTIFY_ARTIST_MATCH_FLOOR
+
+# "(feat. X)", "[Remastered 2011]", "(Live)", "(Live at ...)", ...
+# but not titles that merely contain "with" or "live", like "(With Me)"
+_BRACKETED_NOISE = re.compile(
+    r"\s*[\(\[](?:"
+    r"(?:feat\.?|ft\.?|featuring)\s[^\)\]]*"
+    r"|live(?:\s+(?:at|from|in|on)\b[^\)\]]*)?"
+    r"|[^\)\]]*\b(?:remaster(?:ed)?|version|edit|mix|mono|stereo|deluxe|bonus|acoustic|demo)\b[^\)\]]*"
+    r")[\)\]]",
+    re.IGNORECASE
+)
+# "Song - Remastered 2009", "Song - Live", "Song - Live at ...", "Song - Radio Edit"
+_DASH_NOISE = re.compile(
+    r"\s+-\s+(?:live(?:\s+(?:at|from|in|on)\b.*)?"
+    r"|.*\b(?:remaster(?:ed)?|version|edit|mix|mono|stereo|deluxe|acoustic|demo)\b.*)$",
+    re.IGNORECASE
+)
+_FEATURING = re.compile(r"\s+(feat\.?|ft\.?|featuring)\s+.*$", re.IGNORECASE)
+# "A, B", "A & B", "A and B", "A x B", "A with B"; "x" only as a spaced
+# token, so "Malcolm X" stays whole
+_ARTIST_SEPARATORS = re.compile(r"\s*[,&]\s*|\s+(?:and|x|with)\s+", re.IGNORECASE)
+_APOSTROPHES = re.compile(r"['\u2019]")
+_PUNCTUATION = re.compile(r"[^\w\s]")
+
+TITLE_WEIGHT = 0.6
+ARTIST_WEIGHT = 0.4
+
+
+def normalize_title(title):
+    """Lowercase title without feat./remaster/live tags or punctuation"""
+    title = _BRACKETED_NOISE.sub("", str(title or ""))
+    title = _DASH_NOISE.sub("", title)
+    title = _FEATURING.sub("", title)
+    return _clean(title)
+
+
+def normalize_artist(artist):
+    """
+    Lowercase primary artist, without featured artists or a leading 'the'
+    
+    For scoring only: "Simon & Garfunkel" becomes "simon". Use artist_key
+    for anything that identifies a track.
+    """
+    artist = _FEATURING.sub("", str(artist or ""))
+    artist = _ARTIST_SEPARATORS.split(artist)[0]
+    artist = _clean(artist)
+    return artist[4:] if artist.startswith("the ") else artist
+
+
+def artist_key(artist):
+    """
+    Full normalized artist credit, for cache keys and track identity
+    
+    Featured artists and a leading 'the' are dropped, but the credit is not
+    split, so "Simon & Garfunkel" and "Simon" stay distinct.
+    """
+    artist = _clean(_FEATURING.sub("", str(artist or "")))
+    return artist[4:] if artist.startswith("the ") else artist
+
+
+def similarity(a, b):
+    if not a or not b:
+        return 0.0
+    return SequenceMatcher(None, a, b).ratio()
+
+
+def match_score(item, track_name, artist):
+    """
+    How well a Spotify track item matches the recommended (title, artist)
+    
+    Returns:
+        Weighted string similarity in 0-1
+    """
+    title_score, artist_score = _similarities(item, track_name, artist)
+    return TITLE_WEIGHT * title_score + ARTIST_WEIGHT * artist_score
+
+
+def best_match(items, track_name, artist, threshold, artist_floor=SPOTIFY_ARTIST_MATCH_FLOOR):
+    """
+    Highest-scoring item that passes both gates, else None
+    
+    An item must reach `threshold` on the combined score and `artist_floor`
+    on its best artist similarity.
+    """
+    best_item, best_score = None, 0.0
+    for item in items:
+        title_score, artist_score = _similarities(item, track_name, artist)
+        if artist_score < artist_floor:
+            continue
+        score = TITLE_WEIGHT * title_score + ARTIST_WEIGHT * artist_score
+        if score > best_score:
+            best_item, best_score = item, score
+    return best_item if best_score >= threshold else None
+
+
+def _similarities(item, track_name, artist):
+    """(title similarity, best artist similarity) of a Spotify item"""
+    title_score = similarity(normalize_title(item.get("name")), normalize_title(track_name))
+    wanted_artist = normalize_artist(artist)
+    artist_score = max(
+        (similarity(normalize_artist(a.get("name")), wanted_artist) for a in item.get("artists", [])),
+        default=0.0
+    )
+    return title_score, artist_score
+
+
+def query_variants(rec):
+    """
+    Search queries to try in order, from the recommender's own query to
+    progressively relaxed ones
+    """
+    track_name = rec.get("track_name", "")
+    artist = rec.get("artist", "")
+    title = normalize_title(track_name)
+    primary_artist = normalize_artist(artist)
+    
+    variants = [
+        rec.get("spotify_search_query") or f"track:{track_name} artist:{artist}",
+        f'track:"{title}" artist:"{primary_artist}"',
+        f"{title} {primary_artist}",
+        title,
+    ]
+    
+    unique = []
+    for query in variants:
+        if query.strip() and query not in unique:
+            unique.append(query)
+    return unique
+
+
+def _clean(text):
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = _APOSTROPHES.sub("", text)
+    text = _PUNCTUATION.sub(" ", text)
+    return " ".join(text.split())
@@ -0,0 +1,308 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from agents.emotion_analyzer import build_emotion_chain, emotion_inputs
+from agents.taste_profiler import (
+    build_taste_chain,
+    taste_prompt_inputs,
+    profile_fingerprint,
+    get_cached_taste_profile,
+    remember_taste_profile,
+    with_audio_features,
+)
+from agents.music_recommender import (
+    build_recommender_chain,
+    recommender_inputs,
+    retrieve_known_songs,
+    user_heard_tracks,
+    without_heard,
+)
+from agents.taste_ranker import build_ranker_chain, ranker_inputs, restore_candidate_fields
+from config.settings import (
+    BATCH_SIZE,
+    BATCH_MAX_CONCURRENCY,
+    LYRICS_ENRICHMENT,
+    RANKER_MODE,
+    SONG_INDEX_ENABLED,
+)
+from services import tracing
+
+# Keys written to the output file for every processed request
+RESULT_KEYS = (
+    "id",
+    "user_id",
+    "emotion_analysis",
+    "taste_profile",
+    "universe_candidates",
+    "ranked_recommendations",
+    "errors",
+)
+
+
+def run_batch(input_path, output_path, batch_size=BATCH_SIZE, max_concurrency=BATCH_MAX_CONCURRENCY):
+    """
+    Run a JSONL file of (user_input, spotify_profile) requests through the agents
+    
+    Instead of one workflow run per request, requests are taken in chunks
+    of `batch_size` and every agent makes one `chain.batch` call per chunk
+    (emotion analysis and taste profiling side by side, then discovery,
+    then ranking), with at most `max_concurrency` LLM calls in flight.
+    
+    Results are appended to `output_path` after each chunk, and the output
+    file doubles as the checkpoint: ids already completed without errors
+    are skipped, so a crashed run picks up where it left off and failed
+    requests are retried. A retried request gets a new line; the last line
+    for an id is its current result. The pipeline stops after
+    ranking; nothing is resolved on Spotify or written to a playlist.
+    
+    Input lines:
+        {"id": "...", "user_input": "...", "spotify_profile": {...}}
+        ("id" defaults to the line number, "user_id" to the profile's)
+    
+    Args:
+        input_path: JSONL file of requests
+        output_path: JSONL file results are appended to
+        batch_size: Requests per chunk
+        max_concurrency: Upper bound on concurrent LLM calls per agent
+    
+    Returns:
+        Dict with processed/failed/skipped counts
+    """
+    completed = load_completed_ids(output_path)
+    counts = {"processed": 0, "failed": 0, "skipped": 0}
+    
+    def pending():
+        for request in read_requests(input_path):
+            if request["id"] in completed:
+                counts["skipped"] += 1
+            else:
+                yield request
+    
+    requests = pending()
+    
+    with open(output_path, "a", encoding="utf-8") as out:
+        while True:
+            chunk = list(islice(requests, batch_size))
+            if not chunk:
+                break
+            
+            print(f"📦 Processing {len(chunk)} requests "
+                  f"({counts['processed']} done, {counts['skipped']} skipped)...")
+            
+            for state in process_chunk(chunk, max_concurrency):
+                out.write(json.dumps({key: state.get(key) for key in RESULT_KEYS}, ensure_ascii=False) + "\n")
+                counts["processed"] += 1
+                counts["failed"] += int(bool(state["errors"]))
+            
+            # The output file is the checkpoint: make the chunk durable before moving on
+            out.flush()
+            os.fsync(out.fileno())
+    
+    print(f"✅ Batch finished: {counts['processed']} processed, "
+          f"{counts['failed']} with errors, {counts['skipped']} already done")
+    return counts
+
+
+def read_requests(input_path):
+    """Yield one state per JSONL line; malformed lines become failed states"""
+    with open(input_path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                profile = request["spotify_profile"]
+                yield _initial_state(
+                    str(request.get("id", line_number)),
+                    request["user_input"],
+                    request.get("user_id") or profile["user_id"],
+                    profile
+                )
+            except (ValueError, KeyError, TypeError) as e:
+                state = _initial_state(str(line_number), "", None, {})
+                state["errors"].append(f"Invalid request on line {line_number}: {e}")
+                yield state
+
+
+def load_completed_ids(output_path):
+    """
+    Ids written to `output_path` without errors
+    
+    Rows with errors are left out, so the next run retries them.
+    
+    A crash can leave a half-written last line; it is cut off so the
+    resumed run appends to a clean file.
+    """
+    if not os.path.exists(output_path):
+        return set()
+    
+    with open(output_path, "rb+") as f:
+        data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            f.truncate(end)
+    
+    completed = set()
+    for line in data[:end].decode("utf-8").splitlines():
+        if not line.strip():
+            continue
+        row = json.loads(line)
+        if row.get("errors"):
+            completed.discard(row["id"])
+        else:
+            completed.add(row["id"])
+    return completed
+
+
+def process_chunk(states, max_concurrency=BATCH_MAX_CONCURRENCY):
+    """Run one chunk of states through every agent, one batched call per agent"""
+    active = [s for s in states if not s["errors"]]
+    
+    # Emotion analysis and taste profiling are independent, as in the graph
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        emotions = tracing.submit(pool, _analyze_emotions, active, max_concurrency)
+        tastes = tracing.submit(pool, _profile_tastes, active, max_concurrency)
+        emotions.result()
+        tastes.result()
+    
+    _discover_music([s for s in active if not s["errors"]], max_concurrency)
+    _rank_recommendations([s for s in active if not s["errors"]], max_concurrency)
+    return states
+
+
+def _analyze_emotions(states, max_concurrency):
+    for state, emotion_analysis in _batch_stage(
+        "analyze_emotion", build_emotion_chain(), states, emotion_inputs, max_concurrency
+    ):
+        state["emotion_analysis"] = emotion_analysis
+
+
+def _profile_tastes(states, max_concurrency):
+    """Taste DNA for every state, reusing memoized profiles before batching"""
+    uncached = []
+    for state in states:
+        try:
+            prompt_inputs = taste_prompt_inputs(state["spotify_profile"])
+        except Exception as e:
+            state["errors"].append(f"Taste profiling failed: {e}")
+            continue
+        
+        fingerprint = profile_fingerprint(prompt_inputs)
+        cached_profile = get_cached_taste_profile(state["user_id"], fingerprint)
+        if cached_profile is not None:
+            state["taste_profile"] = cached_profile
+        else:
+            state["_taste_inputs"] = (prompt_inputs, fingerprint)
+            uncached.append(state)
+    
+    for state, taste_profile in _batch_stage(
+        "profile_taste", build_taste_chain(), uncached,
+        lambda s: s["_taste_inputs"][0], max_concurrency
+    ):
+        state["taste_profile"] = with_audio_features(taste_profile, state["spotify_profile"])
+        remember_taste_profile(state["user_id"], state["_taste_inputs"][1], state["taste_profile"])
+    
+    for state in uncached:
+        del state["_taste_inputs"]
+
+
+def _discover_music(states, max_concurrency):
+    retrieved = {}
+    
+    def prepare(state):
+        known = retrieve_known_songs(state["emotion_analysis"]) if SONG_INDEX_ENABLED else []
+        retrieved[id(state)] = known
+        return recommender_inputs(state, known)
+    
+    generated_all = []
+    for state, generated in _batch_stage(
+        "discover_music", build_recommender_chain(), states, prepare, max_concurrency
+    ):
+        candidates = without_heard(retrieved[id(state)] + generated, user_heard_tracks(state))
+        state["universe_candidates"] = candidates
+        # Only songs that survived the heard-tracks filter need lyrics
+        kept = {id(c) for c in candidates}
+        generated_all.extend(c for c in generated if id(c) in kept)
+    
+    if LYRICS_ENRICHMENT and generated_all:
+        # One pooled pass over the whole chunk instead of one per request
+        from services.lyrics_service import enrich_tracks_with_lyrics_context
+        enrich_tracks_with_lyrics_context(generated_all)
+
+
+def _rank_recommendations(states, max_concurrency):
+    if RANKER_MODE.lower() == "local":
+        from services.taste_ranking import rank_candidates_locally
+        
+        for state in states:
+            try:
+                state["ranked_recommendations"] = rank_candidates_locally(
+                    state["emotion_analysis"], state["taste_profile"], state["universe_candidates"], top_k=10
+                )
+            except Exception as e:
+                state["errors"].append(f"Ranking failed: {e}")
+        return
+    
+    def prepare(state):
+        return ranker_inputs(state["emotion_analysis"], state["taste_profile"], state["universe_candidates"])
+    
+    for state, ranked in _batch_stage(
+        "rank_recommendations", build_ranker_chain(), states, prepare, max_concurrency
+    ):
+        state["ranked_recommendations"] = restore_candidate_fields(ranked, state["universe_candidates"])
+
+
+def _batch_stage(node, chain, states, prepare, max_concurrency):
+    """
+    Call `chain.batch` once for all states and pair each state with its output
+    
+    Preparation and LLM failures are recorded on the state (and the state
+    left out of the result) rather than failing the whole chunk.
+    
+    Returns:
+        List of (state, output) for the states that succeeded
+    """
+    ready, inputs = [], []
+    for state in states:
+        try:
+            inputs.append(prepare(state))
+            ready.append(state)
+        except Exception as e:
+            state["errors"].append(f"{node} failed: {e}")
+    
+    if not inputs:
+        return []
+    
+    with tracing.span(node, kind="batch", size=len(inputs)):
+        outputs = chain.batch(
+            inputs,
+            # langgraph_node keeps per-node token accounting in line with graph runs
+            config={"max_concurrency": max_concurrency, "metadata": {"langgraph_node": node}},
+            return_exceptions=True
+        )
+    
+    succeeded = []
+    for state, output in zip(ready, outputs):
+        if isinstance(output, Exception):
+            state["errors"].append(f"{node} failed: {output}")
+        else:
+            succeeded.append((state, output))
+    
+    print(f"   ✓ {node}: {len(succeeded)}/{len(inputs)} succeeded")
+    return succeeded
+
+
+def _initial_state(request_id, user_input, user_id, spotify_profile):
+    return {
+        "id": request_id,
+        "user_input": user_input,
+        "user_id": user_id,
+        "spotify_profile": spotify_profile,
+        "emotion_analysis": {},
+        "taste_profile": {},
+        "universe_candidates": [],
+        "ranked_recommendations": [],
+        "errors": [],
+    }
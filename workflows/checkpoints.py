@@ -0,0 +1,141 @@
+import os
+import sqlite3
+import uuid
+
+from config.settings import CHECKPOINT_DB
+from services.cache import PersistentCache
+
+# "last" -> thread id of the most recent CLI run, for `main.py --resume`
+run_registry = PersistentCache("workflow_runs")
+
+
+def get_checkpointer(path=CHECKPOINT_DB):
+    """
+    SQLite-backed LangGraph checkpointer
+    
+    Every finished node writes a checkpoint for its thread, so a run that
+    fails later can continue from there instead of starting over. The
+    connection is shared across threads; SqliteSaver serializes access.
+    """
+    from langgraph.checkpoint.sqlite import SqliteSaver
+    
+    _ensure_parent_dir(path)
+    return SqliteSaver(sqlite3.connect(path, check_same_thread=False))
+
+
+def get_async_checkpointer(path=CHECKPOINT_DB):
+    """
+    Async SQLite checkpointer, for workflow.ainvoke
+    
+    SqliteSaver has no async methods, so async runs use AsyncSqliteSaver.
+    Returns an async context manager:
+    
+        async with get_async_checkpointer() as checkpointer:
+            workflow = create_soulsync_workflow(checkpointer=checkpointer)
+    """
+    from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+    
+    _ensure_parent_dir(path)
+    return AsyncSqliteSaver.from_conn_string(path)
+
+
+def _ensure_parent_dir(path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+
+def new_thread_id():
+    """Fresh thread id for a workflow run, remembered as the latest run"""
+    thread_id = uuid.uuid4().hex
+    run_registry.set("last", thread_id)
+    return thread_id
+
+
+def last_thread_id():
+    return run_registry.peek("last")
+
+
+def run_config(thread_id, spotify_client=None):
+    """Invoke config for one run: its checkpoint thread plus the session's client"""
+    configurable = {"thread_id": thread_id}
+    if spotify_client is not None:
+        configurable["spotify_client"] = spotify_client
+    return {"configurable": configurable}
+
+
+def resume_workflow(workflow, config):
+    """
+    Continue a checkpointed run from its last successful node
+    
+    - A run that stopped mid-graph (crash, exception, Ctrl-C) continues
+      with the nodes that had not finished.
+    - A run that finished with errors is replayed from the newest
+      checkpoint that had no errors yet, so only the failed step (and
+      whatever follows it) runs again.
+    - A run that finished cleanly is returned as is.
+    
+    Args:
+        workflow: Workflow compiled with a checkpointer
+        config: run_config() of the thread to resume
+    
+    Returns:
+        Final workflow state
+    """
+    snapshot = workflow.get_state(config)
+    if not snapshot.values:
+        raise ValueError(f"No checkpoint found for thread {config['configurable']['thread_id']}")
+    
+    if snapshot.next:
+        print(f"⏯️  Resuming at: {', '.join(snapshot.next)}")
+        return workflow.invoke(None, config)
+    
+    if not snapshot.values.get("errors"):
+        print("✅ This run already finished successfully")
+        return snapshot.values
+    
+    clean = next((s for s in workflow.get_state_history(config) if _is_clean(s)), None)
+    if clean is None:
+        raise ValueError("No successful step to resume from; start a new run")
+    
+    print(f"⏯️  Replaying from before: {', '.join(clean.next)}")
+    return workflow.invoke(None, _replay_config(config, clean))
+
+
+async def aresume_workflow(workflow, config):
+    """Async resume_workflow, for a workflow compiled with get_async_checkpointer()"""
+    snapshot = await workflow.aget_state(config)
+    if not snapshot.values:
+        raise ValueError(f"No checkpoint found for thread {config['configurable']['thread_id']}")
+    
+    if snapshot.next:
+        print(f"⏯️  Resuming at: {', '.join(snapshot.next)}")
+        return await workflow.ainvoke(None, config)
+    
+    if not snapshot.values.get("errors"):
+        print("✅ This run already finished successfully")
+        return snapshot.values
+    
+    clean = None
+    async for candidate in workflow.aget_state_history(config):
+        if _is_clean(candidate):
+            clean = candidate
+            break
+    if clean is None:
+        raise ValueError("No successful step to resume from; start a new run")
+    
+    print(f"⏯️  Replaying from before: {', '.join(clean.next)}")
+    return await workflow.ainvoke(None, _replay_config(config, clean))
+
+
+def _is_clean(snapshot):
+    """A checkpoint with pending nodes and no errors recorded yet"""
+    return bool(snapshot.next and snapshot.values and not snapshot.values.get("errors"))
+
+
+def _replay_config(config, snapshot):
+    """Run config pointing at `snapshot`, keeping the session's other settings"""
+    return {
+        **config,
+        "configurable": {**config["configurable"], **snapshot.config["configurable"]}
+    }
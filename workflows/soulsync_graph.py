@@ -1,52 +1,95 @@
-from langgraph.graph import StateGraph, END
+import asyncio
 from agents.state import AgentState
-from agents.emotion_analyzer import emotion_analyzer_agent
-from agents.taste_profiler import taste_profiler_agent
-from agents.music_recommender import music_recommender_agent
-from agents.taste_ranker import taste_ranker_agent
-from services.spotify_resolver import resolve_recommendations_to_spotify
-from services.spotify_service import create_spotify_playlist
-from auth.spotify_auth import get_spotify_client
+from config.settings import SONG_INDEX_ENABLED, SPECULATIVE_RESOLUTION
+from services.tracing import traced_node
 
+# LangGraph, LangChain, spotipy and the agents are imported where they are
+# first used, so importing this module (e.g. at CLI startup) stays cheap
 
-def create_soulsync_workflow():
+
+def create_soulsync_workflow(checkpointer=None):
     """
     Build the complete SoulSync workflow using LangGraph
     
     Flow:
     1. Emotion Analyzer → Analyzes user's emotional state
     2. Taste Profiler → Builds music taste DNA from Spotify data
+       (1 and 2 are independent and run in parallel)
     3. Music Recommender → Discovers therapeutic songs from universe
     4. Taste Ranker → Ranks by distance to user's taste
     5. Spotify Resolver → Resolves to actual Spotify tracks & creates playlist
     
+    With SPECULATIVE_RESOLUTION, every universe candidate is resolved on
+    Spotify while the ranker runs (4 and the prefetch join before 5), so
+    the final node mostly reuses lookups that already happened.
+    
+    Every node has a sync and an async implementation. `workflow.ainvoke`
+    is the supported way to run the graph: LLM calls are awaited and
+    Spotify/Genius go over async HTTP, so one event loop can serve many
+    sessions at once. `workflow.invoke` keeps working for simple scripts.
+    
+    For progressive output, stream with stream_mode=["updates", "custom"]:
+    every node's state update arrives as soon as it finishes, and the final
+    node emits a {"resolved_track": track} custom event for each song the
+    moment it is found on Spotify.
+    
+    Args:
+        checkpointer: Optional LangGraph checkpointer (see workflows.checkpoints);
+            runs then need a thread_id in config["configurable"] and can be
+            resumed after a failure
+    
     Returns:
         Compiled LangGraph workflow
     """
+    from langgraph.graph import StateGraph, START, END
+    from agents.emotion_analyzer import emotion_analyzer_agent, aemotion_analyzer_agent
+    from agents.taste_profiler import taste_profiler_agent, ataste_profiler_agent
+    from agents.music_recommender import music_recommender_agent, amusic_recommender_agent
+    from agents.taste_ranker import taste_ranker_agent, ataste_ranker_agent
     
     # Initialize the state graph
     workflow = StateGraph(AgentState)
     
-    # Add all agent nodes
-    workflow.add_node("analyze_emotion", emotion_analyzer_agent)
-    workflow.add_node("profile_taste", taste_profiler_agent)
-    workflow.add_node("discover_music", music_recommender_agent)
-    workflow.add_node("rank_recommendations", taste_ranker_agent)
-    workflow.add_node("resolve_spotify", resolve_and_create_playlist_node)
-    
-    # Define the flow (sequential execution)
-    workflow.set_entry_point("analyze_emotion")
-    workflow.add_edge("analyze_emotion", "profile_taste")
-    workflow.add_edge("profile_taste", "discover_music")
+    # Add all agent nodes, each wrapped in a tracing span
+    workflow.add_node("analyze_emotion", _node(
+        "analyze_emotion", emotion_analyzer_agent, aemotion_analyzer_agent))
+    workflow.add_node("profile_taste", _node(
+        "profile_taste", taste_profiler_agent, ataste_profiler_agent))
+    workflow.add_node("discover_music", _node(
+        "discover_music", music_recommender_agent, amusic_recommender_agent))
+    workflow.add_node("rank_recommendations", _node(
+        "rank_recommendations", taste_ranker_agent, ataste_ranker_agent))
+    workflow.add_node("resolve_spotify", _node(
+        "resolve_spotify", resolve_and_create_playlist_node, aresolve_and_create_playlist_node))
+    if SPECULATIVE_RESOLUTION:
+        workflow.add_node("prefetch_spotify", _node(
+            "prefetch_spotify", speculative_resolution_node, aspeculative_resolution_node))
+    
+    # Define the flow: emotion and taste branches fan out from the start
+    # and join before discovery, the rest is sequential
+    workflow.add_edge(START, "analyze_emotion")
+    workflow.add_edge(START, "profile_taste")
+    workflow.add_edge(["analyze_emotion", "profile_taste"], "discover_music")
     workflow.add_edge("discover_music", "rank_recommendations")
-    workflow.add_edge("rank_recommendations", "resolve_spotify")
+    if SPECULATIVE_RESOLUTION:
+        workflow.add_edge("discover_music", "prefetch_spotify")
+        workflow.add_edge(["rank_recommendations", "prefetch_spotify"], "resolve_spotify")
+    else:
+        workflow.add_edge("rank_recommendations", "resolve_spotify")
     workflow.add_edge("resolve_spotify", END)
     
     # Compile and return
-    return workflow.compile()
+    return workflow.compile(checkpointer=checkpointer)
+
+
+def _node(name, func, afunc):
+    """Graph node with sync and async implementations, each in a tracing span"""
+    from langchain_core.runnables import RunnableLambda
+    
+    return RunnableLambda(traced_node(name, func), afunc=traced_node(name, afunc), name=name)
 
 
-def resolve_and_create_playlist_node(state: AgentState) -> AgentState:
+def resolve_and_create_playlist_node(state: AgentState, config=None) -> AgentState:
     """
     Final node in the workflow:
     1. Resolves GPT's recommendations to actual Spotify tracks
@@ -54,27 +97,36 @@ def resolve_and_create_playlist_node(state: AgentState) -> AgentState:
     
     Args:
         state: Current AgentState with ranked_recommendations
+        config: Run config; may carry the session's spotify_client
     
     Returns:
-        Updated state with spotify_tracks and playlist_url
+        State update with spotify_tracks and playlist_url
     """
+    from auth.spotify_auth import get_session_spotify_client
+    from services.spotify_resolver import resolve_recommendations_to_spotify
+    from services.spotify_service import create_spotify_playlist
     
     print("\n🎧 Final Step: Creating your Spotify playlist...")
     
     try:
-        # Get authenticated Spotify client
-        spotify_client = get_spotify_client()
+        # Get the session's authenticated Spotify client
+        spotify_client = get_session_spotify_client(config)
         
         # Resolve recommendations to Spotify tracks
         print("\n📡 Searching for songs on Spotify...")
         spotify_tracks = resolve_recommendations_to_spotify(
             recommendations=state["ranked_recommendations"],
-            spotify_client=spotify_client
+            spotify_client=spotify_client,
+            speculative=state.get("speculative_tracks"),
+            on_resolved=_resolved_track_writer()
         )
         
         if not spotify_tracks:
             raise Exception("Could not resolve any tracks to Spotify")
         
+        if SONG_INDEX_ENABLED:
+            _index_resolved_candidates(state)
+        
         # Extract track IDs for playlist creation
         track_ids = [track["spotify_id"] for track in spotify_tracks]
         
@@ -84,20 +136,12 @@ def resolve_and_create_playlist_node(state: AgentState) -> AgentState:
             spotify_client=spotify_client,
             user_id=state["user_id"],
             tracks=track_ids,
-            emotion_context={
-                "primary_emotion": state["emotion_analysis"]["primary_emotion"],
-                "description": (
-                    f"A therapeutic journey from {state['emotion_analysis']['primary_emotion']} "
-                    f"to {state['emotion_analysis']['desired_outcome']}. "
-                    f"Curated by SoulSync based on your emotional needs and music taste."
-                )
-            }
+            emotion_context=_playlist_context(state)
         )
         
         print(f"✅ Playlist created successfully!")
         
         return {
-            **state,
             "spotify_tracks": spotify_tracks,
             "playlist_url": playlist_url
         }
@@ -108,8 +152,152 @@ def resolve_and_create_playlist_node(state: AgentState) -> AgentState:
         traceback.print_exc()
         
         return {
-            **state,
             "spotify_tracks": [],
             "playlist_url": "",
-            "errors": state.get("errors", []) + [f"Playlist creation failed: {str(e)}"]
-        }
\ No newline at end of file
+            "errors": [f"Playlist creation failed: {str(e)}"]
+        }
+
+
+async def aresolve_and_create_playlist_node(state: AgentState, config=None) -> AgentState:
+    """
+    Async resolve_and_create_playlist_node
+    
+    Searches and playlist calls go over async HTTP; only the occasional
+    token refresh and the song index update run on worker threads.
+    """
+    from auth.spotify_auth import get_session_spotify_client
+    from services.spotify_async import as_async_spotify
+    from services.spotify_resolver import aresolve_recommendations_to_spotify
+    from services.spotify_service import acreate_spotify_playlist
+    
+    print("\n🎧 Final Step: Creating your Spotify playlist...")
+    
+    try:
+        spotify_client = as_async_spotify(get_session_spotify_client(config))
+        
+        print("\n📡 Searching for songs on Spotify...")
+        spotify_tracks = await aresolve_recommendations_to_spotify(
+            recommendations=state["ranked_recommendations"],
+            spotify_client=spotify_client,
+            speculative=state.get("speculative_tracks"),
+            on_resolved=_resolved_track_writer()
+        )
+        
+        if not spotify_tracks:
+            raise Exception("Could not resolve any tracks to Spotify")
+        
+        if SONG_INDEX_ENABLED:
+            await asyncio.to_thread(_index_resolved_candidates, state)
+        
+        print("\n🎵 Creating playlist...")
+        playlist_url = await acreate_spotify_playlist(
+            spotify_client=spotify_client,
+            user_id=state["user_id"],
+            tracks=[track["spotify_id"] for track in spotify_tracks],
+            emotion_context=_playlist_context(state)
+        )
+        
+        print(f"✅ Playlist created successfully!")
+        
+        return {
+            "spotify_tracks": spotify_tracks,
+            "playlist_url": playlist_url
+        }
+        
+    except Exception as e:
+        print(f"❌ Error in playlist creation: {e}")
+        import traceback
+        traceback.print_exc()
+        
+        return {
+            "spotify_tracks": [],
+            "playlist_url": "",
+            "errors": [f"Playlist creation failed: {str(e)}"]
+        }
+
+
+def _resolved_track_writer():
+    """Callback emitting each resolved track as a custom stream event"""
+    from langgraph.config import get_stream_writer
+    
+    writer = get_stream_writer()
+    return lambda track: writer({"resolved_track": track})
+
+
+def _playlist_context(state):
+    """Emotion info used for the playlist name and description"""
+    emotion = state["emotion_analysis"]
+    return {
+        "primary_emotion": emotion["primary_emotion"],
+        "description": (
+            f"A therapeutic journey from {emotion['primary_emotion']} "
+            f"to {emotion['desired_outcome']}. "
+            f"Curated by SoulSync based on your emotional needs and music taste."
+        )
+    }
+
+
+def speculative_resolution_node(state: AgentState, config=None) -> AgentState:
+    """
+    Resolve all universe candidates on Spotify while the ranker runs
+    
+    Failures never fail the run: the final node simply falls back to
+    resolving the ranked songs itself.
+    
+    Returns:
+        State update with speculative_tracks
+    """
+    from auth.spotify_auth import get_session_spotify_client
+    from services.spotify_resolver import prefetch_candidates
+    
+    print("\n🔮 Speculatively resolving all candidates on Spotify...")
+    
+    try:
+        speculative_tracks = prefetch_candidates(
+            state["universe_candidates"],
+            get_session_spotify_client(config)
+        )
+        print(f"   ✓ Prefetched {len(speculative_tracks)} candidates")
+        return {
+            "speculative_tracks": speculative_tracks
+        }
+    except Exception as e:
+        print(f"   ✗ Speculative resolution failed: {e}")
+        return {
+            "speculative_tracks": {}
+        }
+
+
+async def aspeculative_resolution_node(state: AgentState, config=None) -> AgentState:
+    """Async speculative_resolution_node"""
+    from auth.spotify_auth import get_session_spotify_client
+    from services.spotify_async import as_async_spotify
+    from services.spotify_resolver import aprefetch_candidates
+    
+    print("\n🔮 Speculatively resolving all candidates on Spotify...")
+    
+    try:
+        speculative_tracks = await aprefetch_candidates(
+            state["universe_candidates"],
+            as_async_spotify(get_session_spotify_client(config))
+        )
+        print(f"   ✓ Prefetched {len(speculative_tracks)} candidates")
+        return {
+            "speculative_tracks": speculative_tracks
+        }
+    except Exception as e:
+        print(f"   ✗ Speculative resolution failed: {e}")
+        return {
+            "speculative_tracks": {}
+        }
+
+
+def _index_resolved_candidates(state):
+    """Remember this run's resolvable candidates for future retrieval"""
+    from services.song_index import index_resolved_songs
+    
+    try:
+        indexed = index_resolved_songs(state["universe_candidates"], state["emotion_analysis"])
+        print(f"   ✓ Indexed {indexed} songs for future sessions")
+    except Exception as e:
+        print(f"   ✗ Could not update song index: {e}")